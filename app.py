@@ -1,552 +1,335 @@
+"""Application factory for Vehicle Parking App.
+
+``create_app(config)`` builds a configured app with the ``controllers``
+blueprints registered. Building one opens no database connection and
+creates no tables, so test apps start in milliseconds and a preloading
+gunicorn master can fork workers that share its imported code
+copy-on-write::
+
+    flask init-db                 # create tables and the default admin, once
+    flask db upgrade              # apply schema migrations to an existing database
+    gunicorn -c gunicorn.conf.py  # serve "app:create_app()"
+    python app.py                 # development server
+"""
 from __future__ import annotations
 
 import os
-from dotenv import load_dotenv
-from datetime import datetime
-
-from flask import (
-    Flask,
-    flash,
-    redirect,
-    render_template,
-    request,
-    session,
-    url_for,
-)
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import check_password_hash, generate_password_hash
-from typing import Optional
+from typing import Any, Mapping, Optional
+
 import click
+from dotenv import load_dotenv
+from flask import Flask, current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+
+from services import auth, database
+from services.cache import cache
+from services.events import events
+from services.metrics import metrics
+from services.migrations import Migrator
+from services.passwords import passwords
+from services.profiling import instrumentation
+
+# Revision scripts, applied in order by ``flask db upgrade``
+migrator = Migrator(os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", "versions"))
 
 # ----------------------------------------------------------------------------
-# Flask & DB setup
+# Configuration
 # ----------------------------------------------------------------------------
-# Load variables from .env file if present
-load_dotenv()
-
-app = Flask(__name__)
-# NOTE: Change this key in production
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///parking.db")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+def _load_env_config(config) -> None:
+    """Read settings from the environment (and ``.env``) into ``config``."""
+    # NOTE: Change this key in production
+    config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
+    config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///parking.db")
+    config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Connection pool per worker; see services/database.py for sizing
+    config["DB_POOL_SIZE"] = int(os.getenv("DB_POOL_SIZE", "5"))
+    config["DB_MAX_OVERFLOW"] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    config["DB_POOL_TIMEOUT"] = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    config["DB_POOL_RECYCLE"] = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    config["DB_POOL_PRE_PING"] = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # SQLite pragmas applied to every new connection
+    config["SQLITE_JOURNAL_MODE"] = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    config["SQLITE_SYNCHRONOUS"] = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    config["SQLITE_MMAP_SIZE"] = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # How many lost spot claims a booking retries before giving up
+    config["BOOKING_CLAIM_ATTEMPTS"] = int(os.getenv("BOOKING_CLAIM_ATTEMPTS", "5"))
+    config["HISTORY_PAGE_SIZE"] = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+    # Keep the signed-in role in the session cookie, re-checked against the DB periodically
+    config["AUTH_SESSION_IDENTITY"] = os.getenv("AUTH_SESSION_IDENTITY", "true").lower() == "true"
+    config["AUTH_REVALIDATE_SECONDS"] = int(os.getenv("AUTH_REVALIDATE_SECONDS", "300"))
+    config["NOTIFICATION_FEED_SIZE"] = int(os.getenv("NOTIFICATION_FEED_SIZE", "10"))
+    # Listing/statistics cache: memory (default), redis or null
+    config["CACHE_BACKEND"] = os.getenv("CACHE_BACKEND", "memory")
+    config["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    config["CACHE_DEFAULT_TTL"] = int(os.getenv("CACHE_DEFAULT_TTL", "30"))
+    # Availability push: memory (per worker) or redis (relayed to all workers)
+    config["EVENTS_BACKEND"] = os.getenv("EVENTS_BACKEND", "memory")
+    config["EVENTS_REDIS_URL"] = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+    # Open streams per worker (each holds a thread), their lifetime, and the polling fallback
+    config["EVENTS_MAX_STREAMS"] = int(os.getenv("EVENTS_MAX_STREAMS", "4"))
+    config["EVENTS_STREAM_SECONDS"] = float(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+    config["EVENTS_POLL_SECONDS"] = int(os.getenv("EVENTS_POLL_SECONDS", "15"))
+    # How long a freed spot is held for the next waiter, and how often holds are swept
+    config["WAITLIST_HOLD_SECONDS"] = int(os.getenv("WAITLIST_HOLD_SECONDS", "600"))
+    config["WAITLIST_SWEEP_SECONDS"] = int(os.getenv("WAITLIST_SWEEP_SECONDS", "30"))
+    # Notification delivery: thread (in each worker), worker (`flask notify-worker`) or inline
+    config["NOTIFY_MODE"] = os.getenv("NOTIFY_MODE", "thread")
+    config["NOTIFY_BATCH_SIZE"] = int(os.getenv("NOTIFY_BATCH_SIZE", "100"))
+    config["NOTIFY_POLL_SECONDS"] = float(os.getenv("NOTIFY_POLL_SECONDS", "2"))
+    config["NOTIFY_MAX_ATTEMPTS"] = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+    # Password hashing cost; stored hashes made with other settings are upgraded on login
+    config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+    config["PASSWORD_SALT_LENGTH"] = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+    # Hashes run in a pool of this many threads per app process; 0 hashes inline.
+    # A larger process pool is opt-in, see services/passwords.py
+    config["PASSWORD_VERIFY_WORKERS"] = int(os.getenv("PASSWORD_VERIFY_WORKERS", "1"))
+    config["PASSWORD_VERIFY_EXECUTOR"] = os.getenv("PASSWORD_VERIFY_EXECUTOR", "thread")
+    config["PASSWORD_VERIFY_TIMEOUT"] = float(os.getenv("PASSWORD_VERIFY_TIMEOUT", "10"))
+    # Opt-in per-route timing, SQL accounting and sampled profiles; see services/profiling.py
+    config["INSTRUMENT"] = os.getenv("INSTRUMENT", "false").lower() == "true"
+    config["INSTRUMENT_SLOW_QUERY_MS"] = float(os.getenv("INSTRUMENT_SLOW_QUERY_MS", "100"))
+    config["INSTRUMENT_SLOW_REQUEST_MS"] = float(os.getenv("INSTRUMENT_SLOW_REQUEST_MS", "500"))
+    config["INSTRUMENT_N_PLUS_ONE"] = int(os.getenv("INSTRUMENT_N_PLUS_ONE", "5"))
+    config["INSTRUMENT_PROFILE_RATE"] = float(os.getenv("INSTRUMENT_PROFILE_RATE", "0"))
+    config["INSTRUMENT_PROFILE_DIR"] = os.getenv("INSTRUMENT_PROFILE_DIR", "")
+    # Prometheus /metrics; METRICS_DIR aggregates across gunicorn workers (services/metrics.py)
+    config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    config["METRICS_DIR"] = os.getenv("METRICS_DIR", "")
+    config["METRICS_FLUSH_SECONDS"] = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+    config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN", "")
+    # Minutes local time is ahead of UTC, for tariff time-of-day windows (330 = IST)
+    config["TARIFF_UTC_OFFSET"] = int(os.getenv("TARIFF_UTC_OFFSET", "0"))
 
-db = SQLAlchemy(app)
 
 # ----------------------------------------------------------------------------
-# Database models
+# Application factory
 # ----------------------------------------------------------------------------
-class User(db.Model):
-    """Users – both admin and normal users."""
-
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
-    full_name = db.Column(db.String(120))
-    address = db.Column(db.String(255))
-    pincode = db.Column(db.String(10))
-    is_admin = db.Column(db.Boolean, default=False)
-
-    reservations = db.relationship("Reservation", back_populates="user")
-
-    def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
-
-
-class ParkingLot(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
-    price_per_hour = db.Column(db.Float, nullable=False)
-    address = db.Column(db.String(200), nullable=False)
-    pincode = db.Column(db.String(10), nullable=False)
-    max_spots = db.Column(db.Integer, nullable=False)
-
-    spots = db.relationship("ParkingSpot", back_populates="lot", cascade="all, delete-orphan")
-
-
-class ParkingSpot(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)
-    status = db.Column(db.String(1), default="A")  # A = Available, O = Occupied
-
-    lot = db.relationship("ParkingLot", back_populates="spots")
-    reservation = db.relationship("Reservation", back_populates="spot", uselist=False)
-
-
-class Waitlist(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    notified = db.Column(db.Boolean, default=False)
-
-
-class Reservation(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    spot_id = db.Column(db.Integer, db.ForeignKey("parking_spot.id"), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    parked_at = db.Column(db.DateTime, default=datetime.utcnow)
-    left_at = db.Column(db.DateTime)
-
-    spot = db.relationship("ParkingSpot", back_populates="reservation")
-    user = db.relationship("User", back_populates="reservations")
-
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    """Build the app; ``config`` overrides settings read from the environment."""
+    # Load variables from .env file if present
+    load_dotenv()
+
+    app = Flask(__name__)
+    _load_env_config(app.config)
+    if config:
+        app.config.update(config)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", database.engine_options(app.config))
+
+    # The blueprints import the models, which import this module's services
+    from controllers import admin, api, auth as auth_views, metrics as metrics_views, user
+    from models import db
+
+    db.init_app(app)
+    database.init_app(app, db)
+    cache.init_app(app)
+    events.init_app(app)
+    passwords.init_app(app)
+    auth.init_app(app, auth_views.load_identity)
+    instrumentation.init_app(app, db)
+    metrics.init_app(app, db)
+
+    for blueprint in (auth_views.bp, admin.bp, user.bp, api.bp, metrics_views.bp):
+        app.register_blueprint(blueprint)
+    for command in (
+        init_db_cmd, db_cli, reconcile_counters_cmd, rollup_rebuild_cmd, billing_backfill_cmd,
+        tariff_reprice_cmd, waitlist_expire_cmd, notify_worker_cmd,
+    ):
+        app.cli.add_command(command)
+    return app
+
+
+def init_db() -> None:
+    """Create missing tables and the default admin user (idempotent).
+
+    A new database gets the current schema from the models and is stamped
+    with the newest migration; an existing one is migrated forward first,
+    so the revisions find the tables as they left them, and then gets any
+    table it still lacks.
+    """
+    from models import User, db
 
-class Notification(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"))
-    message = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    read = db.Column(db.Boolean, default=False)
+    if not inspect(db.engine).get_table_names():
+        db.create_all()
+        migrator.stamp(db.engine, "head")
+    else:
+        migrator.migrate(db.engine, "head")
+        db.create_all()
+    if User.query.filter_by(is_admin=True).first() is None:
+        admin = User(username=os.getenv("ADMIN_USERNAME", "admin"), is_admin=True)
+        admin.set_password(os.getenv("ADMIN_PASSWORD", "admin"))
+        db.session.add(admin)
+        db.session.commit()
+        current_app.logger.info("Default admin created (username=%r)", admin.username)
 
 
 # ----------------------------------------------------------------------------
-# Helper utilities
+# CLI helpers
 # ----------------------------------------------------------------------------
+@click.command("init-db")
+@with_appcontext
+def init_db_cmd():  # pragma: no cover
+    """Flask CLI: `flask init-db` to bootstrap database."""
 
-def bootstrap_database() -> None:
-    """Create tables + default admin if DB does not exist yet."""
+    init_db()
+    click.echo("Database initialized with default admin user.")
 
-    # All DB operations require an application context.
-    with app.app_context():
-        db.create_all()
 
-        # Ensure admin exists
-        admin = User.query.filter_by(is_admin=True).first()
-        if admin is None:
-            admin_username = os.getenv("ADMIN_USERNAME", "admin")
-            admin_password = os.getenv("ADMIN_PASSWORD", "admin")
-            admin = User(username=admin_username, is_admin=True)
-            admin.set_password(admin_password)
-            db.session.add(admin)
-            db.session.commit()
-            app.logger.info("Default admin created (username='admin', password='admin')")
-        # Nothing else
+db_cli = AppGroup("db", help="Schema migrations.")
 
 
-# ----------------------------------------------------------------------------
-# Routes – minimal set to verify skeleton works
-# ----------------------------------------------------------------------------
-@app.route("/")
-def index():
-    if "user_id" in session:
-        user = User.query.get(session["user_id"])
-        if user and user.is_admin:
-            return redirect(url_for("admin_dashboard"))
-        return redirect(url_for("user_dashboard"))
-    return render_template("login.html")
-
-
-@app.route("/login", methods=["POST"])
-def login():
-    username = request.form.get("username")
-    password = request.form.get("password")
-
-    user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
-        session["user_id"] = user.id
-        flash("Logged in successfully", "success")
-        if user.is_admin:
-            return redirect(url_for("admin_dashboard"))
-        return redirect(url_for("user_dashboard"))
-
-    flash("Invalid credentials", "danger")
-    return redirect(url_for("index"))
-
-
-@app.route("/logout")
-def logout():
-    session.pop("user_id", None)
-    flash("Logged out", "info")
-    return redirect(url_for("index"))
-
-
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    if request.method == "POST":
-        username = request.form.get("username")
-        password = request.form.get("password")
-        full_name = request.form.get("full_name")
-        address = request.form.get("address")
-        pincode = request.form.get("pincode")
-
-        if User.query.filter_by(username=username).first():
-            flash("Username already exists", "warning")
-            return redirect(url_for("register"))
-        user = User(username=username, full_name=full_name, address=address, pincode=pincode)
-        user.set_password(password)
-        db.session.add(user)
-        db.session.commit()
-        flash("Registration successful. Please log in.", "success")
-        return redirect(url_for("index"))
-    return render_template("register.html")
-
-
-@app.route("/admin")
-def admin_dashboard():
-    user = _get_current_user()
-    if not user or not user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-    lots = ParkingLot.query.all()
-    users = User.query.all()
-
-    # statistics for cards and chart
-    total_lots = ParkingLot.query.count()
-    total_spots = ParkingSpot.query.count()
-    occupied_spots = ParkingSpot.query.filter_by(status="O").count()
-    available_spots = total_spots - occupied_spots
-
-    # Build per-user lots used: dict[user_id] -> [distinct lot names]
-    # Single query to avoid N+1
-    rows = (
-        db.session.query(User.id, ParkingLot.name)
-        .join(Reservation, Reservation.user_id == User.id)
-        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
-        .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
-        .distinct()
-        .all()
-    )
-    user_lots = {}
-    for uid, lot_name in rows:
-        user_lots.setdefault(uid, []).append(lot_name)
-
-    return render_template(
-        "admin/dashboard.html",
-        user=user,
-        lots=lots,
-        users=users,
-        user_lots=user_lots,
-        total_lots=total_lots,
-        total_spots=total_spots,
-        occupied_spots=occupied_spots,
-        available_spots=available_spots,
-    )
+def _offline_dialect(name: Optional[str]):
+    """Dialect to render offline SQL for: ``name``, else the configured database's."""
+    url = make_url(f"{name}://") if name else make_url(current_app.config["SQLALCHEMY_DATABASE_URI"])
+    return url.get_dialect()()
 
 
-@app.route("/admin/lots/delete/<int:lot_id>", methods=["POST"])
-def admin_delete_lot(lot_id: int):
-    """Delete a parking lot, its spots, and related reservations (admin only)."""
-    user = _get_current_user()
-    if not user or not user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-
-    lot = ParkingLot.query.get_or_404(lot_id)
-
-    # Delete reservations tied to spots in this lot
-    spot_ids = [s.id for s in ParkingSpot.query.filter_by(lot_id=lot.id).all()]
-    if spot_ids:
-        Reservation.query.filter(Reservation.spot_id.in_(spot_ids), Reservation.left_at.is_(None)).update({Reservation.left_at: datetime.utcnow()}, synchronize_session=False)
-        Reservation.query.filter(Reservation.spot_id.in_(spot_ids)).delete(synchronize_session=False)
-
-    # Delete spots, then the lot
-    ParkingSpot.query.filter_by(lot_id=lot.id).delete(synchronize_session=False)
-    db.session.delete(lot)
-    db.session.commit()
-
-    flash("Parking lot deleted.", "success")
-    return redirect(url_for("admin_dashboard"))
-
-# -----------------------------------------------------------------------------
-# Admin – user management
-# -----------------------------------------------------------------------------
-@app.route("/admin/users")
-def admin_list_users():
-    user = _get_current_user()
-    if not user or not user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-
-    users = User.query.all()
-    return render_template("admin/users.html", user=user, users=users)
-
-
-@app.route("/admin/users/<int:user_id>/history")
-def admin_user_history(user_id: int):
-    user = _get_current_user()
-    if not user or not user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-
-    target = User.query.get_or_404(user_id)
-    history = (
-        Reservation.query
-        .filter_by(user_id=user_id)
-        .order_by(Reservation.parked_at.desc())
-        .all()
-    )
+@db_cli.command("upgrade")
+@click.argument("revision", default="head")
+@click.option("--sql", is_flag=True, help="Print the SQL instead of running it.")
+@click.option("--from", "start", default=None, help="Revision the database is at (offline; default: empty).")
+@click.option("--dialect", default=None, help="sqlite or postgresql (offline; default: the configured database).")
+@with_appcontext
+def db_upgrade_cmd(revision, sql, start, dialect):  # pragma: no cover
+    """Flask CLI: `flask db upgrade [REVISION]` to migrate the schema forward."""
+    if sql:
+        click.echo(migrator.script(_offline_dialect(dialect), start, revision))
+        return
+    from models import db
 
-    return render_template(
-        "admin/user_history.html",
-        user=user,
-        target=target,
-        history=history,
-    )
+    applied = migrator.migrate(db.engine, revision)
+    click.echo(f"Applied {', '.join(applied)}." if applied else "Already up to date.")
 
 
-@app.route("/admin/users/delete/<int:user_id>", methods=["POST"])
-def admin_delete_user(user_id: int):
-    user = _get_current_user()
-    if not user or not user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
+@db_cli.command("downgrade")
+@click.argument("revision")
+@click.option("--sql", is_flag=True, help="Print the SQL instead of running it.")
+@click.option("--from", "start", default="head", help="Revision the database is at (offline; default: head).")
+@click.option("--dialect", default=None, help="sqlite or postgresql (offline; default: the configured database).")
+@with_appcontext
+def db_downgrade_cmd(revision, sql, start, dialect):  # pragma: no cover
+    """Flask CLI: `flask db downgrade REVISION` (``base`` for none) to revert migrations."""
+    if sql:
+        click.echo(migrator.script(_offline_dialect(dialect), start, revision))
+        return
+    from models import db
 
-    target = User.query.get_or_404(user_id)
-    if target.is_admin:
-        flash("Cannot delete another admin user", "danger")
-        return redirect(url_for("admin_list_users"))
+    reverted = migrator.migrate(db.engine, revision)
+    click.echo(f"Reverted {', '.join(reverted)}." if reverted else "Nothing to revert.")
 
-    try:
-        Reservation.query.filter_by(user_id=user_id).delete()
-        db.session.delete(target)
-        db.session.commit()
-        flash("User deleted successfully", "success")
-    except Exception as e:
-        db.session.rollback()
-        flash("Failed to delete user: " + str(e), "danger")
-
-    return redirect(url_for("admin_list_users"))
-
-
-@app.route("/user")
-def user_dashboard():
-    user = _get_current_user()
-    if not user or user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-    # Data needed for dashboard
-    lots = ParkingLot.query.all()
-
-    active_reservation = Reservation.query.filter_by(
-        user_id=user.id,
-        left_at=None
-    ).first()
-
-    history = Reservation.query.filter_by(user_id=user.id).order_by(
-        Reservation.parked_at.desc()
-    ).all()
-
-    notifications = Notification.query.filter_by(user_id=user.id, read=False).order_by(Notification.created_at.desc()).all()
-
-    return render_template(
-        "user/dashboard.html",
-        user=user,
-        lots=lots,
-        active_reservation=active_reservation,
-        history=history,
-        notifications=notifications,
-    )
 
+@db_cli.command("current")
+@with_appcontext
+def db_current_cmd():  # pragma: no cover
+    """Flask CLI: `flask db current` to show the database's revision."""
+    from models import db
 
-# -----------------------------------------------------------------------------
-# User booking & release routes
-# -----------------------------------------------------------------------------
-@app.route("/user/book/<int:lot_id>")
-def book_parking(lot_id: int):
-    """Book parking in a specific lot."""
-    user = _get_current_user()
-    if not user or user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
+    with db.engine.connect() as connection:
+        click.echo(migrator.current(connection) or "base")
 
-    lot = ParkingLot.query.get_or_404(lot_id)
 
-    # If user already has active reservation
-    active_res = Reservation.query.filter_by(user_id=user.id, left_at=None).first()
-    if active_res:
-        flash("You already have an active reservation.", "warning")
-        return redirect(url_for("user_dashboard"))
+@db_cli.command("history")
+def db_history_cmd():  # pragma: no cover
+    """Flask CLI: `flask db history` to list the revisions, oldest first."""
+    for module in migrator.revisions:
+        click.echo(f"{module.down_revision or 'base'} -> {module.revision}: {module.__doc__.strip().splitlines()[0]}")
 
-    # Find an available spot in the lot
-    spot = ParkingSpot.query.filter_by(lot_id=lot_id, status="A").first()
-    if not spot:
-        flash("No available spots in this lot", "danger")
-        return redirect(url_for("user_dashboard"))
 
-    try:
-        res = Reservation(spot_id=spot.id, user_id=user.id)
-        db.session.add(res)
-        spot.status = "O"
-        db.session.commit()
-        flash("Parking booked successfully!", "success")
-    except Exception as e:
-        db.session.rollback()
-        flash(f"Failed to book parking: {e}", "danger")
-
-    return redirect(url_for("user_dashboard"))
-
-
-@app.route("/user/waitlist/<int:lot_id>")
-def join_waitlist(lot_id: int):
-    """Add current user to waitlist for a lot if full."""
-    user = _get_current_user()
-    if not user or user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-
-    # Already waitlisted?
-    existing = Waitlist.query.filter_by(lot_id=lot_id, user_id=user.id, notified=False).first()
-    if existing:
-        flash("You are already on the waitlist for this lot.", "info")
-        return redirect(url_for("user_dashboard"))
-
-    wl = Waitlist(lot_id=lot_id, user_id=user.id)
-    db.session.add(wl)
-    db.session.commit()
-    flash("You have been added to the waitlist. We will notify you when a spot opens up.", "success")
-    return redirect(url_for("user_dashboard"))
-
-
-@app.route("/user/release/<int:reservation_id>")
-def release_parking(reservation_id: int):
-    """Release a parking spot and calculate cost."""
-    user = _get_current_user()
-    if not user or user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
+@db_cli.command("stamp")
+@click.argument("revision", default="head")
+@with_appcontext
+def db_stamp_cmd(revision):  # pragma: no cover
+    """Flask CLI: `flask db stamp REVISION` to record a revision without running it."""
+    from models import db
 
-    try:
-        reservation = Reservation.query.filter_by(id=reservation_id, user_id=user.id, left_at=None).first_or_404()
-        duration = datetime.utcnow() - reservation.parked_at
-        hours = duration.total_seconds() / 3600
-        cost = round(hours * reservation.spot.lot.price_per_hour, 2)
+    migrator.stamp(db.engine, revision)
+    click.echo(f"Database stamped at {revision}.")
 
-        reservation.left_at = datetime.utcnow()
-        reservation.spot.status = "A"
-        db.session.commit()
 
-        # Notify earliest waitlisted user for this lot, if any
-        lot_id = reservation.spot.lot_id
-        wl = Waitlist.query.filter_by(lot_id=lot_id, notified=False).order_by(Waitlist.created_at.asc()).first()
-        if wl:
-            msg = f"A spot is now available at {reservation.spot.lot.name}. Book soon!"
-            note = Notification(user_id=wl.user_id, lot_id=lot_id, message=msg)
-            wl.notified = True
-            db.session.add(note)
-            db.session.commit()
-
-        flash(f"Parking spot released successfully! Total cost: ₹{cost}", "success")
-    except Exception as e:
-        db.session.rollback()
-        flash(f"Failed to release parking: {e}", "danger")
-
-    return redirect(url_for("user_dashboard"))
-
-
-@app.route("/user/notifications/read/<int:notif_id>", methods=["POST"])
-def mark_notification_read(notif_id: int):
-    user = _get_current_user()
-    if not user or user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-    note = Notification.query.get_or_404(notif_id)
-    if note.user_id != user.id:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("user_dashboard"))
-    note.read = True
-    db.session.commit()
-    return redirect(url_for("user_dashboard"))
-
-
-@app.route("/admin/add", methods=["GET", "POST"])
-def admin_add_parking_lot():
-    """Add a new parking lot via admin interface."""
-    user = _get_current_user()
-    if not user or not user.is_admin:
-        flash("Unauthorized", "danger")
-        return redirect(url_for("index"))
-
-    if request.method == "POST":
-        name = request.form.get("name")
-        address = request.form.get("address")
-        pincode = request.form.get("pincode")
-        price_per_hour = float(request.form.get("price_per_hour"))
-        max_spots = int(request.form.get("max_spots"))
-
-        lot = ParkingLot(
-            name=name,
-            address=address,
-            pincode=pincode,
-            price_per_hour=price_per_hour,
-            max_spots=max_spots,
-        )
-        db.session.add(lot)
-        db.session.commit()
+@click.command("reconcile-counters")
+@with_appcontext
+def reconcile_counters_cmd():  # pragma: no cover
+    """Flask CLI: `flask reconcile-counters` to rebuild lot occupancy counters."""
+    from controllers.admin import reconcile_lot_counters
 
-        # Create parking spots
-        for _ in range(max_spots):
-            spot = ParkingSpot(lot_id=lot.id)
-            db.session.add(spot)
-        db.session.commit()
+    reconcile_lot_counters()
+    cache.invalidate("lots", "stats")
+    click.echo("Lot occupancy counters reconciled.")
 
-        flash("Parking lot created successfully!", "success")
-        return redirect(url_for("admin_dashboard"))
 
-    return render_template("admin/add_lot.html", user=user)
+@click.command("rollup-rebuild")
+@with_appcontext
+def rollup_rebuild_cmd():  # pragma: no cover
+    """Flask CLI: `flask rollup-rebuild` to backfill usage rollup tables."""
+    from controllers.api import rebuild_usage_rollups
 
-# -----------------------------------------------------------------------------
-# Statistics API for scalable UI consumption
-@app.route("/api/stats/reservations")
-def api_reservation_stats():
-    """Return reservation counts per lot.
+    count = rebuild_usage_rollups()
+    cache.invalidate("stats")
+    click.echo(f"Usage rollups rebuilt from {count} reservations.")
 
-    Query params:
-      - user_id (optional): if provided, filter reservations for that user only.
-    Response format:
-      {
-        "labels": [lot names...],
-        "counts": [counts aligned to labels]
-      }
-    """
-    user_id = request.args.get("user_id", type=int)
 
-    # Build base query: join Reservation -> ParkingSpot -> ParkingLot
-    from sqlalchemy import func
+@click.command("billing-backfill")
+@with_appcontext
+def billing_backfill_cmd():  # pragma: no cover
+    """Flask CLI: `flask billing-backfill` to store costs of stays released before 0003."""
+    from controllers.api import backfill_reservation_costs
 
-    q = (
-        db.session.query(ParkingLot.name, func.count(Reservation.id))
-        .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
-        .outerjoin(Reservation, Reservation.spot_id == ParkingSpot.id)
+    count = backfill_reservation_costs()
+    cache.invalidate("stats")
+    click.echo(f"Costs stored for {count} reservations.")
+
+
+@click.command("tariff-reprice")
+@click.option("--lot", "lot_ids", type=int, multiple=True, help="Only this lot (repeatable; default: all).")
+@click.option("--since", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Stays released on or after this date.")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), default=None, help="Stays released before this date.")
+@click.option("--dry-run", is_flag=True, help="Report what would change without writing it.")
+@with_appcontext
+def tariff_reprice_cmd(lot_ids, since, until, dry_run):  # pragma: no cover
+    """Flask CLI: `flask tariff-reprice` to re-bill released stays under the current tariffs."""
+    from controllers.api import rebuild_usage_rollups, reprice_reservations
+    from services.billing import to_rupees
+
+    totals = reprice_reservations(list(lot_ids) or None, since, until, dry_run=dry_run)
+    click.echo(
+        f"{totals['changed']} of {totals['stays']} stays {'would change' if dry_run else 'repriced'}: "
+        f"₹{to_rupees(totals['before'])} -> ₹{to_rupees(totals['after'])}."
     )
+    if totals["changed"] and not dry_run:
+        rebuild_usage_rollups()
+        cache.invalidate("stats")
+        click.echo("Usage rollups rebuilt.")
 
-    if user_id:
-        q = q.filter(Reservation.user_id == user_id)
-
-    q = q.group_by(ParkingLot.id).order_by(ParkingLot.name.asc())
-
-    rows = q.all()
-    labels = [r[0] for r in rows]
-    counts = [int(r[1] or 0) for r in rows]
 
-    return {"labels": labels, "counts": counts}
-
-# ----------------------------------------------------------------------------
-# Context & utilities
-# ----------------------------------------------------------------------------
+@click.command("waitlist-expire")
+@with_appcontext
+def waitlist_expire_cmd():  # pragma: no cover
+    """Flask CLI: `flask waitlist-expire` to cascade expired waitlist holds now."""
+    from controllers.user import commit_freed, waitlist_queue
 
-def _get_current_user():
-    uid = session.get("user_id")
-    return User.query.get(uid) if uid else None
+    freed = waitlist_queue.expire(limit=None)
+    commit_freed(freed)
+    click.echo(f"Expired holds cascaded; {len(freed)} spots returned to the free pool.")
 
 
-# ----------------------------------------------------------------------------
-# CLI helpers
-# ----------------------------------------------------------------------------
-@app.cli.command("init-db")
-def init_db_cmd():  # pragma: no cover
-    """Flask CLI: `flask init-db` to bootstrap database."""
+@click.command("notify-worker")
+@with_appcontext
+def notify_worker_cmd():  # pragma: no cover
+    """Flask CLI: `flask notify-worker` to deliver queued notifications until stopped."""
+    from controllers.user import notifier
 
-    bootstrap_database()
-    click.echo("Database initialized with default admin user.")
+    click.echo("Delivering notifications; Ctrl+C to stop.")
+    try:
+        notifier.run_forever()
+    except KeyboardInterrupt:
+        pass
 
 
 # ----------------------------------------------------------------------------
 # Main entry
 # ----------------------------------------------------------------------------
 if __name__ == "__main__":
-    bootstrap_database()
-    app.run(debug=True)
+    # Tables are created by `flask init-db`, not on every start
+    create_app().run(debug=True)
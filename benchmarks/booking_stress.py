@@ -0,0 +1,161 @@
+"""Concurrency stress run for ``book_parking``.
+
+Fires many parallel bookings at a single lot through the Flask test client
+and checks that no spot was ever handed to two active reservations, and no
+user holds two::
+
+    python benchmarks/booking_stress.py --spots 500 --users 2000 --threads 32
+    python benchmarks/booking_stress.py --processes 4 --threads 8
+    python benchmarks/booking_stress.py --clicks 3  # every user double-clicks
+
+Each process builds its own app against one shared SQLite file, so ``--processes`` > 1 also exercises cross-worker races on top of the
+per-process free list.
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _create_app(db_url: str):
+    """An app bound to ``db_url``, and the models module."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import models
+    from app import create_app
+
+    return create_app({"SQLALCHEMY_DATABASE_URI": db_url}), models
+
+
+def seed(db_url: str, spots: int, users: int) -> None:
+    """Create one lot with ``spots`` spots and ``users`` plain users."""
+    app, m = _create_app(db_url)
+    with app.app_context():
+        m.db.drop_all()
+        m.db.create_all()
+        lot = m.ParkingLot(
+            name="Stress Lot",
+            address="Benchmark Rd",
+            pincode="000000",
+            price_per_hour=10.0,
+            max_spots=spots,
+            available_spots=spots,
+            occupied_spots=0,
+        )
+        m.db.session.add(lot)
+        m.db.session.flush()
+        m.db.session.execute(
+            m.ParkingSpot.__table__.insert(),
+            [{"lot_id": lot.id, "status": "A"} for _ in range(spots)],
+        )
+        # Logins are bypassed, so the hash only has to be well-formed
+        m.db.session.execute(
+            m.User.__table__.insert(),
+            [
+                {"username": f"stress{i}", "password_hash": "x", "is_admin": False}
+                for i in range(users)
+            ],
+        )
+        m.db.session.commit()
+
+
+def _book_many(args) -> int:
+    """Book once for each user id in ``user_ids``; return requests sent."""
+    db_url, lot_id, user_ids, threads = args
+    app, _ = _create_app(db_url)
+    from controllers.user import warm_free_spots
+
+    with app.app_context():
+        warm_free_spots()
+
+    def book(uid: int) -> None:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = uid
+        client.get(f"/user/book/{lot_id}")
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(book, user_ids))
+    return len(user_ids)
+
+
+def verify(db_url: str) -> dict:
+    app, m = _create_app(db_url)
+    from sqlalchemy import func
+
+    with app.app_context():
+        active = m.Reservation.query.filter(m.Reservation.left_at.is_(None))
+        def doubled(column) -> int:
+            return (
+                m.db.session.query(column)
+                .filter(m.Reservation.left_at.is_(None))
+                .group_by(column)
+                .having(func.count(m.Reservation.id) > 1)
+                .count()
+            )
+
+        occupied = m.ParkingSpot.query.filter_by(status="O").count()
+        lot = m.ParkingLot.query.first()
+        return {
+            "bookings": active.count(),
+            "double_allocations": doubled(m.Reservation.spot_id),
+            "double_bookings": doubled(m.Reservation.user_id),
+            "occupied_spots": occupied,
+            "lot_counter_occupied": lot.occupied_spots,
+        }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spots", type=int, default=500)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--clicks", type=int, default=1, help="concurrent booking requests per user")
+    parser.add_argument("--db", help="database URL (default: temporary SQLite file)")
+    opts = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="parking-stress-")
+    db_url = opts.db or f"sqlite:///{os.path.join(tmpdir, 'stress.db')}"
+    seed(db_url, opts.spots, opts.users)
+
+    # user ids are 1..users because the seed starts from an empty table
+    # Repeated clicks sit next to each other, so they race one another
+    user_ids = [uid for uid in range(1, opts.users + 1) for _ in range(opts.clicks)]
+    chunks = [user_ids[i::opts.processes] for i in range(opts.processes)]
+    jobs = [(db_url, 1, chunk, opts.threads) for chunk in chunks]
+
+    started = time.perf_counter()
+    if opts.processes == 1:
+        sent = _book_many(jobs[0])
+    else:
+        with mp.get_context("spawn").Pool(opts.processes) as pool:
+            sent = sum(pool.map(_book_many, jobs))
+    elapsed = time.perf_counter() - started
+
+    result = verify(db_url)
+    print(f"requests sent        : {sent}")
+    print(f"elapsed              : {elapsed:.2f}s")
+    print(f"requests/sec         : {sent / elapsed:.1f}")
+    print(f"bookings/sec         : {result['bookings'] / elapsed:.1f}")
+    for key, value in result.items():
+        print(f"{key:<21}: {value}")
+
+    ok = (
+        result["double_allocations"] == result["double_bookings"] == 0
+        and result["bookings"] == result["occupied_spots"] == result["lot_counter_occupied"]
+        and result["bookings"] <= opts.spots
+    )
+    print("OK" if ok else "FAILED: spot allocation is inconsistent")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Seed a synthetic city: lots, spots, users and years of reservation history.
+
+Builds a database the lifecycle benchmarks can run against, with enough
+history that the dashboards, history pages and ``/api/stats`` do realistic
+work::
+
+    python benchmarks/city.py --db sqlite:////tmp/city.db --lots 50 --spots 100 --users 5000 --years 2
+    python benchmarks/city.py --db postgresql://localhost/parking_bench
+
+Every user is ``driver<N>`` and the admin is ``admin``, all with the
+password given by ``--password``. ``--occupancy`` of the spots are taken by
+an active reservation, one user each. The tables are recreated, the usage
+rollups rebuilt, the lot counters reconciled and the database stamped with
+the newest migration, as ``flask init-db`` would leave it.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BATCH = 50_000
+PASSWORD = "parking"
+
+
+def seed_city(
+    lots: int = 20,
+    spots: int = 50,
+    users: int = 1000,
+    years: float = 1.0,
+    turnover: float = 0.5,
+    occupancy: float = 0.3,
+    password: str = PASSWORD,
+    seed: int = 0,
+) -> dict:
+    """Recreate the schema of the current app's database and fill it.
+
+    ``turnover`` is finished stays per spot per day over the last
+    ``years``. Call inside an app context; returns the row counts.
+    """
+    import models as m
+    from app import migrator
+    from controllers.admin import reconcile_lot_counters
+    from controllers.api import rebuild_usage_rollups
+    from services.billing import stay_cost
+    from services.passwords import passwords
+
+    rng = random.Random(seed)
+    db = m.db
+    db.drop_all()
+    db.create_all()
+    migrator.stamp(db.engine, "head")
+
+    # One hash for everybody: hashing thousands of passwords is not the point
+    password_hash = passwords.hash(password)
+    db.session.execute(m.User.__table__.insert(), [
+        {"username": "admin", "password_hash": password_hash, "is_admin": True},
+        *(
+            {"username": f"driver{i}", "password_hash": password_hash, "is_admin": False,
+             "full_name": f"Driver {i}", "address": f"{i} Synthetic St", "pincode": f"{560000 + i % 100}"}
+            for i in range(1, users + 1)
+        ),
+    ])
+    prices = [float(rng.choice((20, 30, 40, 50, 60))) for _ in range(lots)]
+    db.session.execute(m.ParkingLot.__table__.insert(), [
+        {
+            "name": f"Lot {i}", "address": f"{i} Benchmark Rd", "pincode": f"{560000 + i % 100}",
+            "price_per_hour": prices[i - 1],
+            "max_spots": spots, "available_spots": spots, "occupied_spots": 0,
+        }
+        for i in range(1, lots + 1)
+    ])
+    total_spots = lots * spots
+    # Lot i owns spot ids (i - 1) * spots + 1 .. i * spots
+    db.session.execute(m.ParkingSpot.__table__.insert(), [
+        {"lot_id": (i - 1) // spots + 1, "status": "A"} for i in range(1, total_spots + 1)
+    ])
+
+    now = datetime.utcnow().replace(microsecond=0)
+    span = int(years * 365 * 24 * 60)
+    history = int(total_spots * turnover * years * 365)
+    batch = []
+    for _ in range(history):
+        parked = now - timedelta(minutes=rng.randrange(span))
+        left = min(parked + timedelta(minutes=rng.randint(15, 600)), now)
+        spot_id = rng.randint(1, total_spots)
+        batch.append({
+            "spot_id": spot_id,
+            # user ids start at 2: the admin is 1
+            "user_id": rng.randint(2, users + 1),
+            "parked_at": parked,
+            "left_at": left,
+            "cost_paise": stay_cost(parked, left, prices[(spot_id - 1) // spots]),
+        })
+        if len(batch) == BATCH:
+            db.session.execute(m.Reservation.__table__.insert(), batch)
+            batch.clear()
+    if batch:
+        db.session.execute(m.Reservation.__table__.insert(), batch)
+
+    # The people parked right now: distinct users on distinct spots
+    parked_now = min(int(total_spots * occupancy), users)
+    taken = rng.sample(range(1, total_spots + 1), parked_now)
+    drivers = rng.sample(range(2, users + 2), parked_now)
+    for start in range(0, parked_now, BATCH):
+        db.session.execute(m.Reservation.__table__.insert(), [
+            {"spot_id": spot_id, "user_id": user_id, "parked_at": now - timedelta(minutes=rng.randint(5, 300))}
+            for spot_id, user_id in zip(taken[start:start + BATCH], drivers[start:start + BATCH])
+        ])
+        db.session.execute(
+            m.ParkingSpot.__table__.update()
+            .where(m.ParkingSpot.id.in_(taken[start:start + BATCH]))
+            .values(status="O")
+        )
+    db.session.commit()
+
+    reconcile_lot_counters()
+    rebuild_usage_rollups()
+    return {"lots": lots, "spots": total_spots, "users": users, "history": history, "parked": parked_now}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """The city-size options, shared by the benchmarks that seed one."""
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=50, help="spots per lot")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=float, default=1.0, help="years of finished reservations")
+    parser.add_argument("--turnover", type=float, default=0.5, help="finished stays per spot per day")
+    parser.add_argument("--occupancy", type=float, default=0.3, help="share of spots taken right now")
+    parser.add_argument("--password", default=PASSWORD)
+    parser.add_argument("--seed", type=int, default=0, help="random seed, for repeatable cities")
+
+
+def city_options(opts: argparse.Namespace) -> dict:
+    return {
+        key: getattr(opts, key)
+        for key in ("lots", "spots", "users", "years", "turnover", "occupancy", "password", "seed")
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="database URL to (re)create")
+    add_arguments(parser)
+    opts = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": opts.db})
+    started = time.perf_counter()
+    with app.app_context():
+        counts = seed_city(**city_options(opts))
+    print(", ".join(f"{key}={value}" for key, value in counts.items()), f"in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
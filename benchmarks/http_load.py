@@ -0,0 +1,167 @@
+"""Multi-process HTTP load against gunicorn, per-route p50/p95/p99 and throughput.
+
+Drives the lifecycle flow of ``lifecycle.py`` over real HTTP, from several
+client processes with several virtual users each, so the server, its
+workers and the database pool are part of the measurement::
+
+    # seed a city, start gunicorn on it (gunicorn.conf.py), load it, stop it
+    python benchmarks/http_load.py --processes 4 --vus 8 --rounds 10
+    python benchmarks/http_load.py --workers 4 --lots 50 --users 5000 --years 2
+
+    # or load a server that is already running on a seeded database
+    python benchmarks/city.py --db postgresql://localhost/parking_bench
+    python benchmarks/http_load.py --url http://127.0.0.1:8000 --processes 8
+
+Each virtual user keeps one keep-alive connection and its own session
+cookie. Redirects are not followed, so every route is timed on its own.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import multiprocessing as mp
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from lifecycle import ROOT, Recorder, add_arguments, report, summarize, walk
+
+
+class HttpClient:
+    """The flow's client interface over one keep-alive HTTP connection."""
+
+    def __init__(self, base_url: str) -> None:
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookies = {}
+        self.connection: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, data=None) -> Tuple[int, str]:
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body, headers)
+                response = self.connection.getresponse()
+                text = response.read().decode("utf-8", "replace")
+                break
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all("Set-Cookie") or ():
+            name, _, value = header.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value
+        return response.status, text
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+
+
+def _load(args) -> dict:
+    """One client process: ``vus`` virtual users in threads; returns its samples."""
+    base_url, index, vus, rounds, password = args
+    recorder = Recorder()
+
+    def virtual_user(n: int) -> None:
+        client = HttpClient(base_url)
+        try:
+            walk(client, recorder, f"vu{os.getpid()}x{n}", password, rounds, random.Random(index * 10_000 + n))
+        finally:
+            client.close()
+
+    with ThreadPoolExecutor(max_workers=vus) as pool:
+        list(pool.map(virtual_user, range(vus)))
+    return recorder.dump()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(db_url: str, workers: Optional[int]) -> Tuple[subprocess.Popen, str]:
+    """Start ``gunicorn -c gunicorn.conf.py`` on ``db_url``; wait until it answers."""
+    port = _free_port()
+    bind = f"127.0.0.1:{port}"
+    env = dict(os.environ, DATABASE_URL=db_url, GUNICORN_BIND=bind)
+    if workers:
+        env["GUNICORN_WORKERS"] = str(workers)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port)):
+                return server, f"http://{bind}"
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start within 60s")
+
+
+def main() -> int:
+    from city import add_arguments as add_city_arguments, city_options, seed_city
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="load this running server instead of starting gunicorn")
+    parser.add_argument("--db", help="database URL to seed and serve (default: temporary SQLite file)")
+    parser.add_argument("--workers", type=int, help="gunicorn workers (default: gunicorn.conf.py's)")
+    parser.add_argument("--processes", type=int, default=2, help="client processes")
+    add_arguments(parser)
+    add_city_arguments(parser)
+    opts = parser.parse_args()
+
+    server = None
+    base_url = opts.url
+    if base_url is None:
+        from app import create_app
+
+        db_url = opts.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="parking-load-"), "city.db")
+        with create_app({"SQLALCHEMY_DATABASE_URI": db_url}).app_context():
+            counts = seed_city(**city_options(opts))
+        print("city:", ", ".join(f"{key}={value}" for key, value in counts.items()))
+        server, base_url = start_gunicorn(db_url, opts.workers)
+
+    try:
+        jobs = [(base_url, i, opts.vus, opts.rounds, opts.password) for i in range(opts.processes)]
+        recorder = Recorder()
+        started = time.perf_counter()
+        with mp.get_context("spawn").Pool(opts.processes) as pool:
+            for data in pool.imap_unordered(_load, jobs):
+                recorder.merge(data)
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    summary = summarize(recorder, elapsed)
+    report(summary, elapsed, opts.json)
+    return 1 if any(row["errors"] for row in summary.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""Booking-lifecycle latency through the Flask test client.
+
+Seeds a synthetic city (see ``city.py``), then has virtual users walk the
+whole lifecycle concurrently -- register, log in, list lots, and a number
+of rounds of book -> dashboard -> release -> ``/api/stats`` -- timing every
+request. Reports p50/p95/p99 latency and throughput per route::
+
+    python benchmarks/lifecycle.py --vus 16 --rounds 5
+    python benchmarks/lifecycle.py --db postgresql://localhost/parking_bench --lots 50 --years 2
+    python benchmarks/lifecycle.py --json before.json   # keep for comparison
+
+The test client runs the app in this process, so the numbers exclude the
+HTTP server and network; ``http_load.py`` drives the same flow through
+gunicorn. The flow and the report are shared by both.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+RELEASE_LINK = re.compile(r"/user/release/(\d+)")
+
+
+class Recorder:
+    """Per-route latency samples (ms) and error counts, shared by threads."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, route: str, ms: float, ok: bool) -> None:
+        with self._lock:
+            self.samples[route].append(ms)
+            if not ok:
+                self.errors[route] += 1
+
+    def merge(self, data: dict) -> None:
+        """Fold in another recorder's :meth:`dump` (e.g. from a worker process)."""
+        with self._lock:
+            for route, values in data["samples"].items():
+                self.samples[route].extend(values)
+            for route, count in data["errors"].items():
+                self.errors[route] += count
+
+    def dump(self) -> dict:
+        return {"samples": dict(self.samples), "errors": dict(self.errors)}
+
+
+def timed(recorder: Recorder, route: str, client, method: str, path: str, data=None) -> Tuple[int, str]:
+    """Send one request through ``client`` and record it under ``route``."""
+    started = time.perf_counter()
+    status, body = client.request(method, path, data)
+    recorder.add(route, (time.perf_counter() - started) * 1000, status < 400)
+    return status, body
+
+
+def walk(client, recorder: Recorder, username: str, password: str, rounds: int, rng: random.Random) -> None:
+    """One virtual user's lifecycle: register, log in, then book/release ``rounds`` times."""
+    timed(recorder, "POST /register", client, "POST", "/register", {
+        "username": username, "password": password, "full_name": username,
+        "address": "1 Load Test Rd", "pincode": "560001",
+    })
+    timed(recorder, "POST /login", client, "POST", "/login", {"username": username, "password": password})
+    status, body = timed(recorder, "GET /api/lots", client, "GET", "/api/lots")
+    lot_ids = [lot["id"] for lot in json.loads(body)] if status == 200 else []
+    if not lot_ids:
+        return
+    for _ in range(rounds):
+        timed(recorder, "GET /user/book/<lot>", client, "GET", f"/user/book/{rng.choice(lot_ids)}")
+        _, body = timed(recorder, "GET /user", client, "GET", "/user")
+        release = RELEASE_LINK.search(body)
+        if release:
+            timed(recorder, "GET /user/release/<id>", client, "GET", release.group(0))
+        timed(recorder, "GET /api/stats", client, "GET", "/api/stats")
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, dict]:
+    """``route -> {count, errors, rps, p50, p95, p99, max}``, latencies in ms."""
+
+    def pct(values: List[float], q: int) -> float:
+        if len(values) < 2:
+            return values[0]
+        return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+    summary = {}
+    for route, values in recorder.samples.items():
+        summary[route] = {
+            "count": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "rps": len(values) / elapsed,
+            "p50": pct(values, 50),
+            "p95": pct(values, 95),
+            "p99": pct(values, 99),
+            "max": max(values),
+        }
+    return summary
+
+
+def report(summary: Dict[str, dict], elapsed: float, json_path: Optional[str] = None) -> None:
+    total = sum(row["count"] for row in summary.values())
+    print(f"{'route':<24} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for route, row in sorted(summary.items()):
+        print(
+            f"{route:<24} {row['count']:>6} {row['errors']:>6} {row['rps']:>8.1f} "
+            f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f} {row['max']:>8.1f}"
+        )
+    print(f"{total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s")
+    if json_path:
+        with open(json_path, "w") as fh:
+            json.dump({"elapsed": elapsed, "routes": summary}, fh, indent=2)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options of the flow itself, shared with ``http_load.py``."""
+    parser.add_argument("--vus", type=int, default=8, help="concurrent virtual users (per process)")
+    parser.add_argument("--rounds", type=int, default=5, help="book/release rounds per virtual user")
+    parser.add_argument("--json", help="also write the per-route summary to this file")
+
+
+class TestClient:
+    """The flow's client interface over ``app.test_client()``."""
+
+    def __init__(self, app) -> None:
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, data=None) -> Tuple[int, str]:
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data(as_text=True)
+
+
+def main() -> int:
+    from city import add_arguments as add_city_arguments, city_options, seed_city
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database URL (default: temporary SQLite file)")
+    add_arguments(parser)
+    add_city_arguments(parser)
+    opts = parser.parse_args()
+
+    from app import create_app
+
+    db_url = opts.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="parking-lifecycle-"), "city.db")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": db_url})
+    with app.app_context():
+        counts = seed_city(**city_options(opts))
+    print("city:", ", ".join(f"{key}={value}" for key, value in counts.items()))
+
+    recorder = Recorder()
+    serial = itertools.count()
+
+    def virtual_user(_) -> None:
+        n = next(serial)
+        walk(TestClient(app), recorder, f"vu{os.getpid()}x{n}", opts.password, opts.rounds, random.Random(n))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=opts.vus) as pool:
+        list(pool.map(virtual_user, range(opts.vus)))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(recorder, elapsed)
+    report(summary, elapsed, opts.json)
+    return 1 if any(row["errors"] for row in summary.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
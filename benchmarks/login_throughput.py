@@ -0,0 +1,110 @@
+"""Login throughput per app process for each password-verification mode.
+
+Signs users in through the Flask test client from ``--threads`` concurrent
+clients, with verification inline, in a thread pool and in a process pool
+of ``--workers`` each, and reports logins per second::
+
+    python benchmarks/login_throughput.py --logins 200 --threads 8 --workers 4
+    python benchmarks/login_throughput.py --method scrypt:32768:8:1
+
+Inline verification serialises logins on the request's thread; the pools
+should scale with ``--workers`` up to the number of cores. It also checks
+that a hash made with other settings is upgraded on the next login.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "logins.db")
+os.environ["NOTIFY_MODE"] = "worker"
+sys.path.insert(0, ROOT)
+
+import models as m  # noqa: E402
+from app import create_app  # noqa: E402
+from services.passwords import passwords  # noqa: E402
+
+app = create_app()
+
+PASSWORD = "correct horse battery staple"
+
+
+def configure(**settings) -> None:
+    app.config.update(settings)
+    passwords.init_app(app)
+
+
+def seed(users: int) -> None:
+    with app.app_context():
+        m.db.drop_all()
+        m.db.create_all()
+        # One hash shared by every user: seeding should not dominate the run
+        stored = passwords.hash(PASSWORD)
+        m.db.session.execute(
+            m.User.__table__.insert(),
+            [{"username": f"u{i}", "password_hash": stored, "is_admin": False} for i in range(users)],
+        )
+        m.db.session.commit()
+
+
+def _login(i: int) -> bool:
+    with app.test_client() as client:
+        resp = client.post("/login", data={"username": f"u{i}", "password": PASSWORD})
+        return resp.status_code == 302 and resp.headers["Location"].endswith("/user")
+
+
+def run(logins: int, threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        ok = sum(pool.map(_login, range(logins)))
+    elapsed = time.perf_counter() - started
+    if ok != logins:
+        raise SystemExit(f"only {ok}/{logins} logins succeeded")
+    return logins / elapsed
+
+
+def check_rehash() -> bool:
+    """A user hashed with a cheaper method is upgraded by signing in."""
+    with app.app_context():
+        user = m.db.session.get(m.User, 1)
+        old = app.config["PASSWORD_HASH_METHOD"]
+        configure(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000", PASSWORD_VERIFY_WORKERS=0)
+        user.set_password(PASSWORD)
+        m.db.session.commit()
+        configure(PASSWORD_HASH_METHOD=old)
+    _login(0)
+    with app.app_context():
+        stored = m.db.session.get(m.User, 1).password_hash
+        return not passwords.needs_rehash(stored) and passwords.verify(stored, PASSWORD)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="pool size")
+    parser.add_argument("--method", default=app.config["PASSWORD_HASH_METHOD"])
+    opts = parser.parse_args()
+
+    configure(PASSWORD_HASH_METHOD=opts.method, PASSWORD_VERIFY_WORKERS=0)
+    seed(opts.logins)
+    print(f"{opts.method}, {opts.logins} logins from {opts.threads} clients, {os.cpu_count()} CPUs")
+    print(f"{'mode':>8}  {'workers':>7}  {'logins/s':>9}")
+    for kind, workers in (("inline", 0), ("thread", opts.workers), ("process", opts.workers)):
+        configure(PASSWORD_VERIFY_WORKERS=workers, PASSWORD_VERIFY_EXECUTOR=kind)
+        run(min(opts.logins, opts.threads), opts.threads)  # warm the pool up
+        print(f"{kind:>8}  {workers:>7}  {run(opts.logins, opts.threads):>9.1f}")
+    passwords.shutdown()
+
+    rehashed = check_rehash()
+    print(f"rehash on login: {'ok' if rehashed else 'FAILED'}")
+    return 0 if rehashed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
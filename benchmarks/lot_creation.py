@@ -0,0 +1,78 @@
+"""Lot creation time: per-spot ORM adds versus the bulk insert path.
+
+    python benchmarks/lot_creation.py --sizes 100 1000 10000
+
+The ORM variant reproduces the old ``admin_add_parking_lot`` loop (one
+``ParkingSpot`` object per spot, two commits); the bulk variant is the
+current single-transaction ``executemany`` used by the admin views.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "lots.db")
+sys.path.insert(0, ROOT)
+
+import models as m  # noqa: E402
+from app import create_app  # noqa: E402
+from controllers.admin import _insert_spots  # noqa: E402
+
+app = create_app()
+
+
+def _new_lot(spots: int):
+    return m.ParkingLot(
+        name="Bench Lot", address="Benchmark Rd", pincode="000000",
+        price_per_hour=20.0, max_spots=spots, available_spots=spots, occupied_spots=0,
+    )
+
+
+def create_orm(spots: int) -> None:
+    lot = _new_lot(spots)
+    m.db.session.add(lot)
+    m.db.session.commit()
+    for _ in range(spots):
+        m.db.session.add(m.ParkingSpot(lot_id=lot.id))
+    m.db.session.commit()
+
+
+def create_bulk(spots: int) -> None:
+    lot = _new_lot(spots)
+    m.db.session.add(lot)
+    m.db.session.flush()
+    _insert_spots(lot.id, spots)
+    m.db.session.commit()
+
+
+def timed(fn, spots: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        m.db.drop_all()
+        m.db.create_all()
+        started = time.perf_counter()
+        fn(spots)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    opts = parser.parse_args()
+
+    print(f"{'spots':>7}  {'orm ms':>9}  {'bulk ms':>9}  {'speedup':>7}")
+    with app.app_context():
+        for size in opts.sizes:
+            orm = timed(create_orm, size, opts.repeat)
+            bulk = timed(create_bulk, size, opts.repeat)
+            print(f"{size:>7}  {orm:>9.1f}  {bulk:>9.1f}  {orm / bulk:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Revenue per lot over a date range: the per-row float loop against SQL sums.
+
+Seeds a city (see ``city.py``) and computes the revenue of every lot for
+the last ``--days`` days and for the whole history, three ways:
+
+* ``float loop``: every stay loaded and priced in Python with float math,
+  the way release, the history pages and the API used to price them,
+* ``exact loop``: the same rows priced with ``services.billing.stay_cost``,
+* ``sql``: ``services.billing.revenue``, one ``SUM ... GROUP BY`` over the
+  costs stored at release, on the ``ix_reservation_billed`` index::
+
+    python benchmarks/revenue.py
+    python benchmarks/revenue.py --lots 50 --spots 100 --years 4   # ~3.6M stays
+    python benchmarks/revenue.py --db postgresql://localhost/parking_bench
+
+Fails if the SQL sums differ by a single paisa from the exact loop; the
+float loop's drift from the exact amounts is reported.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from city import add_arguments, city_options, seed_city
+
+
+def float_loop(m, start):
+    """Rupees per lot, priced row by row in floats."""
+    totals = defaultdict(float)
+    for lot_id, parked_at, left_at, price in _stays(m, start):
+        totals[lot_id] += round((left_at - parked_at).total_seconds() / 3600 * price, 2)
+    return dict(totals)
+
+
+def exact_loop(m, start):
+    """Paise per lot, priced row by row with the billing module."""
+    from services.billing import stay_cost
+
+    totals = defaultdict(int)
+    for lot_id, parked_at, left_at, price in _stays(m, start):
+        totals[lot_id] += stay_cost(parked_at, left_at, price)
+    return dict(totals)
+
+
+def sql_sum(m, start):
+    """Paise per lot, summed by the database from the stored costs."""
+    from services.billing import revenue
+
+    rows = revenue(m.db.session, m.Reservation.__table__, m.ParkingSpot.__table__, start=start, by="lot")
+    return {lot_id: paise for lot_id, _, paise in rows}
+
+
+def _stays(m, start):
+    R, S, L = m.Reservation, m.ParkingSpot, m.ParkingLot
+    query = (
+        m.db.session.query(S.lot_id, R.parked_at, R.left_at, L.price_per_hour)
+        .join(S, R.spot_id == S.id)
+        .join(L, S.lot_id == L.id)
+        .filter(R.left_at.isnot(None))
+    )
+    if start is not None:
+        query = query.filter(R.left_at >= start)
+    return query.yield_per(50_000)
+
+
+def best_of(repeat: int, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database URL to seed (default: temporary SQLite file)")
+    parser.add_argument("--days", type=int, default=30, help="length of the recent range")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per method; the best is reported")
+    add_arguments(parser)
+    opts = parser.parse_args()
+
+    import models as m
+    from app import create_app
+
+    db_url = opts.db or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="parking-revenue-"), "city.db")
+    ok = True
+    with create_app({"SQLALCHEMY_DATABASE_URI": db_url}).app_context():
+        started = time.perf_counter()
+        counts = seed_city(**city_options(opts))
+        print("city:", ", ".join(f"{key}={value}" for key, value in counts.items()),
+              f"in {time.perf_counter() - started:.1f}s")
+
+        ranges = [(f"last {opts.days} days", datetime.utcnow() - timedelta(days=opts.days)), ("all history", None)]
+        for label, start in ranges:
+            stays = _stays(m, start).count()
+            float_s, floats = best_of(opts.repeat, float_loop, m, start)
+            exact_s, exact = best_of(opts.repeat, exact_loop, m, start)
+            sql_s, summed = best_of(opts.repeat, sql_sum, m, start)
+
+            matches = summed == exact
+            ok = ok and matches
+            drift = sum(abs(round(floats.get(lot, 0.0) * 100) - paise) for lot, paise in exact.items())
+            print(f"\n{label}: {stays} stays in {len(exact)} lots, {sum(exact.values()) / 100:.2f} rupees")
+            print(f"  {'float loop':<11} {float_s * 1000:9.1f}ms  drift {drift} paise")
+            print(f"  {'exact loop':<11} {exact_s * 1000:9.1f}ms")
+            print(f"  {'sql':<11} {sql_s * 1000:9.1f}ms  {float_s / sql_s:6.1f}x the float loop"
+                  f"  {'exact' if matches else 'MISMATCH with the exact loop'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""Latency of the ``/api/stats`` aggregation as reservation history grows.
+
+Seeds an in-memory SQLite database with increasing numbers of historical
+reservations and times :func:`controllers.api.collect_statistics`::
+
+    python benchmarks/stats_latency.py --sizes 10000 100000 1000000
+
+With SQL-side ``GROUP BY`` the work done in Python is O(lots + 24); what
+growth remains is the database's own scan of the reservation table, not
+ORM hydration or the old O(reservations x lots) Python loops.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import Flask  # noqa: E402
+
+from controllers.api import collect_statistics  # noqa: E402
+from models import ParkingLot, ParkingSpot, Reservation, User, db  # noqa: E402
+
+LOTS = 50
+SPOTS_PER_LOT = 100
+
+
+def build_app() -> Flask:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    return app
+
+
+def seed(count: int) -> None:
+    db.drop_all()
+    db.create_all()
+    db.session.add(User(username="bench", password_hash="x"))
+    db.session.execute(
+        ParkingLot.__table__.insert(),
+        [
+            {
+                "name": f"Lot {i}",
+                "price_per_hour": 20.0 + i,
+                "address": "Benchmark Rd",
+                "pincode": "000000",
+                "max_spots": SPOTS_PER_LOT,
+                "available_spots": SPOTS_PER_LOT,
+                "occupied_spots": 0,
+            }
+            for i in range(LOTS)
+        ],
+    )
+    db.session.execute(
+        ParkingSpot.__table__.insert(),
+        [{"lot_id": i % LOTS + 1, "status": "A"} for i in range(LOTS * SPOTS_PER_LOT)],
+    )
+    start = datetime(2023, 1, 1)
+    batch = []
+    for _ in range(count):
+        parked = start + timedelta(minutes=random.randrange(2 * 365 * 24 * 60))
+        batch.append(
+            {
+                "spot_id": random.randint(1, LOTS * SPOTS_PER_LOT),
+                "user_id": 1,
+                "parked_at": parked,
+                "left_at": parked + timedelta(minutes=random.randint(5, 600)),
+            }
+        )
+        if len(batch) == 50_000:
+            db.session.execute(Reservation.__table__.insert(), batch)
+            batch.clear()
+    if batch:
+        db.session.execute(Reservation.__table__.insert(), batch)
+    db.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    opts = parser.parse_args()
+
+    app = build_app()
+    print(f"{'reservations':>12}  {'best ms':>9}  {'mean ms':>9}")
+    with app.app_context():
+        for size in opts.sizes:
+            seed(size)
+            timings = []
+            for _ in range(opts.repeat):
+                started = time.perf_counter()
+                collect_statistics()
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{size:>12}  {min(timings):>9.2f}  {sum(timings) / len(timings):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
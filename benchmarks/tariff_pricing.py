@@ -0,0 +1,109 @@
+"""Cost of pricing a stay against compiled tariff schedules.
+
+Builds random schedules of increasing size (windows on random weekdays,
+times and occupancy tiers) and prices stays of increasing length two ways:
+
+* ``walk``: step through the stay one minute at a time, looking up the
+  window in force, the way a schedule read straight from its rows is
+  evaluated,
+* ``compiled``: ``services.tariffs.Schedule.price``, two binary searches
+  over the precompiled weekly curve::
+
+    python benchmarks/tariff_pricing.py
+    python benchmarks/tariff_pricing.py --windows 1 10 100 1000 --stays 1000 --walk-stays 1
+
+The compiled cost should stay flat as stays grow and grow only with the
+logarithm of the schedule size. Fails if the two ever disagree by a paisa.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.billing import to_paise  # noqa: E402
+from services.tariffs import DAY, Window, compile_schedule  # noqa: E402
+
+BASE_PRICE = 30.0
+LENGTHS = [("1 hour", timedelta(hours=1)), ("1 day", timedelta(days=1)), ("1 week", timedelta(days=7))]
+
+
+def random_windows(count: int, rng: random.Random):
+    return [
+        Window(
+            rng.randint(1, 127),
+            rng.randrange(DAY),
+            rng.randrange(DAY + 1),
+            rng.choice((0, 0, 50, 80)),
+            rng.randrange(1000, 20000),
+        )
+        for _ in range(count)
+    ]
+
+
+def walk(windows, parked_at: datetime, left_at: datetime, occupancy: int) -> int:
+    """Reference pricing: the window in force, minute by minute."""
+    ranked = sorted(enumerate(windows), key=lambda item: (item[1].min_occupancy, item[0]))
+    micros_total = 0  # paise-per-hour micros
+    cursor = parked_at
+    while cursor < left_at:
+        minute = cursor.weekday() * DAY + cursor.hour * 60 + cursor.minute
+        rate = to_paise(BASE_PRICE)
+        for _, window in ranked:
+            if window.min_occupancy <= occupancy and any(a <= minute < b for a, b in window.intervals()):
+                rate = window.price_paise
+        step_end = min(cursor.replace(second=0, microsecond=0) + timedelta(minutes=1), left_at)
+        delta = step_end - cursor
+        micros_total += rate * ((delta.days * 86_400 + delta.seconds) * 10**6 + delta.microseconds)
+        cursor = step_end
+    hour = 3600 * 10**6
+    return (2 * micros_total + hour) // (2 * hour)
+
+
+def per_call_us(fn, stays) -> float:
+    started = time.perf_counter()
+    for parked_at, left_at, occupancy in stays:
+        fn(parked_at, left_at, occupancy)
+    return (time.perf_counter() - started) / len(stays) * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--stays", type=int, default=100, help="stays priced per cell")
+    parser.add_argument("--walk-stays", type=int, default=2, help="stays priced by the minute walk per cell")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ok = True
+    print(f"{'windows':>8} {'compile ms':>11} {'stay':>8} {'walk us':>11} {'compiled us':>12}")
+    for count in args.windows:
+        windows = random_windows(count, rng)
+        started = time.perf_counter()
+        schedule = compile_schedule(BASE_PRICE, windows)
+        compile_ms = (time.perf_counter() - started) * 1000
+        for label, length in LENGTHS:
+            stays = []
+            for _ in range(args.stays):
+                parked_at = datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(365 * 86_400))
+                stays.append((parked_at, parked_at + length, rng.choice((0, 60, 90))))
+            compiled_us = per_call_us(schedule.price, stays)
+            sample = stays[: args.walk_stays]
+            walk_us = per_call_us(lambda p, l, o: walk(windows, p, l, o), sample)
+            for parked_at, left_at, occupancy in sample:
+                if walk(windows, parked_at, left_at, occupancy) != schedule.price(parked_at, left_at, occupancy):
+                    ok = False
+                    print(f"MISMATCH: {count} windows, stay {parked_at} - {left_at} at {occupancy}%")
+            print(f"{count:>8} {compile_ms:>11.1f} {label:>8} {walk_us:>11.0f} {compiled_us:>12.2f}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
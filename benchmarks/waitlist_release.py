@@ -0,0 +1,119 @@
+"""Release and hold-expiry throughput as a lot's waitlist grows.
+
+Fills one lot, queues ``N`` waiters behind it and times the two hot paths
+of the waitlist engine: a release that puts a hold on the vacated spot for
+the head of the queue, and an expiry sweep that cascades each lapsed hold
+to the next waiter::
+
+    python benchmarks/waitlist_release.py --waiters 10 1000 10000
+
+Both read the head of the queue from the ``(lot_id, notified, created_at,
+id)`` index, so latency per operation and SQL statements per operation
+should stay flat across sizes; a run fails if the statement count grows.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ["DATABASE_URL"] = "sqlite://"
+# Queued notifications stay in the outbox; no dispatcher thread skews the numbers
+os.environ["NOTIFY_MODE"] = "worker"
+sys.path.insert(0, ROOT)
+
+import models as m  # noqa: E402
+from app import create_app  # noqa: E402
+from controllers.user import waitlist_queue  # noqa: E402
+from services.querycount import count_queries  # noqa: E402
+
+app = create_app()
+
+SPOTS = 200
+
+
+def seed(waiters: int) -> None:
+    """One full lot of ``SPOTS`` spots with ``waiters`` users queued for it."""
+    m.db.drop_all()
+    m.db.create_all()
+    m.db.session.add(m.ParkingLot(
+        name="Busy Lot", address="Queue Rd", pincode="000000", price_per_hour=20.0,
+        max_spots=SPOTS, available_spots=0, occupied_spots=SPOTS,
+    ))
+    m.db.session.execute(
+        m.User.__table__.insert(),
+        [{"username": f"u{i}", "password_hash": "x", "is_admin": False} for i in range(waiters)],
+    )
+    m.db.session.execute(
+        m.ParkingSpot.__table__.insert(), [{"lot_id": 1, "status": "O"}] * SPOTS
+    )
+    start = datetime(2024, 1, 1)
+    m.db.session.execute(
+        m.Waitlist.__table__.insert(),
+        [
+            {"lot_id": 1, "user_id": i + 1, "created_at": start + timedelta(seconds=i), "notified": False}
+            for i in range(waiters)
+        ],
+    )
+    m.db.session.commit()
+
+
+def measure(waiters: int) -> dict:
+    engine = m.db.engine
+    seed(waiters)
+    # Leave a waiter behind every hold so each expiry cascades
+    ops = min(SPOTS, waiters // 2)
+
+    # Release: every vacated spot goes on hold for the current head
+    started = time.perf_counter()
+    with count_queries(engine) as counter:
+        for spot_id in range(1, ops + 1):
+            assert waitlist_queue.release(1, spot_id, "Busy Lot")
+            m.db.session.commit()
+    release_s = time.perf_counter() - started
+    release_q = len(counter)
+
+    # Expiry: every hold lapses and cascades to the next waiter
+    later = datetime.utcnow() + timedelta(days=1)
+    started = time.perf_counter()
+    with count_queries(engine) as counter:
+        waitlist_queue.expire(now=later, limit=None)
+        m.db.session.commit()
+    expire_s = time.perf_counter() - started
+    expire_q = len(counter) - 1  # less the sweep's own SELECT
+
+    return {
+        "release_ms": release_s / ops * 1000,
+        "release_q": release_q / ops,
+        "expire_ms": expire_s / ops * 1000,
+        "expire_q": expire_q / ops,
+        "per_sec": ops / release_s,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--waiters", type=int, nargs="+", default=[10, 1_000, 10_000, 50_000])
+    opts = parser.parse_args()
+
+    print(f"{'waiters':>8}  {'release ms':>10}  {'q/release':>9}  {'releases/s':>10}  {'expire ms':>9}  {'q/expire':>8}")
+    query_counts = set()
+    with app.app_context():
+        for waiters in opts.waiters:
+            r = measure(waiters)
+            query_counts.add((round(r["release_q"], 2), round(r["expire_q"], 2)))
+            print(
+                f"{waiters:>8}  {r['release_ms']:>10.3f}  {r['release_q']:>9.2f}  "
+                f"{r['per_sec']:>10.0f}  {r['expire_ms']:>9.3f}  {r['expire_q']:>8.2f}"
+            )
+    if len(query_counts) > 1:
+        print("statements per operation grow with the waitlist")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1 @@
-"""Controller package: blueprints for admin and user functionality."""
+"""Controller package: blueprints for sign-in, admin, user and API functionality."""
@@ -1,61 +1,287 @@
 """Admin controllers for Vehicle Parking App."""
 from __future__ import annotations
 
+import math
 from datetime import datetime
+from typing import List, Tuple
 
-from flask import Blueprint, flash, redirect, render_template, request, url_for
-from flask_login import current_user
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy import func
 
-from models import db, ParkingLot, ParkingSpot, User, Reservation
+from controllers.api import lot_listing, publish_availability, reservations_with_lot, tariff_book
+from controllers.user import waitlist_queue
+from models import (
+    db,
+    LotUsageDaily,
+    LotUsageHourly,
+    Notification,
+    NotificationOutbox,
+    ParkingLot,
+    ParkingSpot,
+    Reservation,
+    Tariff,
+    User,
+    Waitlist,
+)
+from services.allocator import free_spots
+from services.auth import admin_required, current_identity
+from services.billing import to_paise
+from services.cache import cache
+from services.events import events
+from services.pagination import keyset_page
+from services.profiling import instrumentation
+from services.tariffs import DAYS, Window
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
 
 
-@bp.route("/")
+def _reservation_counts() -> dict:
+    """Map ``user_id`` -> number of reservations, in one GROUP BY (cached)."""
+
+    def load() -> dict:
+        rows = (
+            db.session.query(Reservation.user_id, func.count(Reservation.id))
+            .group_by(Reservation.user_id)
+            .all()
+        )
+        return dict(rows)
+
+    return cache.get_or_set("reservations", "counts_by_user", load)
+
+
+def _user_lots() -> dict:
+    """Map ``user_id`` -> distinct names of the lots they parked in (cached)."""
+
+    def load() -> dict:
+        # Single query to avoid N+1
+        rows = (
+            db.session.query(User.id, ParkingLot.name)
+            .join(Reservation, Reservation.user_id == User.id)
+            .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+            .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+            .distinct()
+            .all()
+        )
+        user_lots = {}
+        for uid, lot_name in rows:
+            user_lots.setdefault(uid, []).append(lot_name)
+        return user_lots
+
+    return cache.get_or_set("reservations", "lots_by_user", load)
+
+
+def _insert_spots(lot_id: int, count: int) -> None:
+    """Bulk-insert ``count`` free spots with a single executemany."""
+    if count > 0:
+        db.session.execute(
+            ParkingSpot.__table__.insert(),
+            [{"lot_id": lot_id, "status": "A"}] * count,
+        )
+
+
+def resize_lot(lot: ParkingLot, new_max: int) -> None:
+    """Grow or shrink a lot's capacity with set-based updates (caller commits).
+
+    Growing reactivates retired spots before inserting new ones; shrinking
+    retires the highest-numbered free spots. Spots are retired rather than
+    deleted so past reservations keep pointing at them, and occupied spots
+    are never retired – a shrink below what is free raises ``ValueError``.
+    """
+    delta = new_max - lot.max_spots
+    if delta > 0:
+        retired = (
+            db.select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot.id, ParkingSpot.status == "R")
+            .order_by(ParkingSpot.id.asc())
+            .limit(delta)
+        )
+        reactivated = (
+            ParkingSpot.query
+            .filter(ParkingSpot.id.in_(retired))
+            .update({ParkingSpot.status: "A"}, synchronize_session=False)
+        )
+        _insert_spots(lot.id, delta - reactivated)
+    elif delta < 0:
+        free = (
+            db.select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot.id, ParkingSpot.status == "A")
+            .order_by(ParkingSpot.id.desc())
+            .limit(-delta)
+        )
+        retired = (
+            ParkingSpot.query
+            .filter(ParkingSpot.id.in_(free), ParkingSpot.status == "A")
+            .update({ParkingSpot.status: "R"}, synchronize_session=False)
+        )
+        if retired < -delta:
+            raise ValueError(f"only {retired} free spots can be retired from this lot")
+
+    lot.max_spots = new_max
+    lot.available_spots = ParkingLot.available_spots + delta
+
+
+def _purge_lot(lot_id: int) -> None:
+    """Delete a lot and everything hanging off it with set-based statements.
+
+    Child rows are matched through subqueries rather than a Python list of
+    spot ids, so memory use and bind-parameter count stay constant however
+    many spots the lot has. The caller commits.
+    """
+    lot_spots = db.select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id)
+    Reservation.query.filter(Reservation.spot_id.in_(lot_spots)).delete(synchronize_session=False)
+    for model in (Waitlist, Notification, NotificationOutbox, LotUsageHourly, LotUsageDaily, Tariff, ParkingSpot):
+        model.query.filter_by(lot_id=lot_id).delete(synchronize_session=False)
+    ParkingLot.query.filter_by(id=lot_id).delete(synchronize_session=False)
+
+
+def _purge_user(user_id: int) -> List[Tuple[int, int]]:
+    """Delete a user with their reservations, waitlist entries and notifications.
+
+    Spots held for the user on a waitlist, and the spot of their active
+    reservation, are passed to the next waiter or freed first. Returns the
+    freed ``(lot_id, spot_id)`` pairs so the caller can hand them back to
+    the allocator after committing.
+    """
+    freed = waitlist_queue.withdraw(user_id)
+    active = (
+        db.session.query(ParkingSpot.lot_id, ParkingSpot.id, ParkingLot.name)
+        .join(Reservation, Reservation.spot_id == ParkingSpot.id)
+        .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+        .filter(Reservation.user_id == user_id, Reservation.left_at.is_(None))
+        .all()
+    )
+    for lot_id, spot_id, lot_name in active:
+        if not waitlist_queue.release(lot_id, spot_id, lot_name):
+            freed.append((lot_id, spot_id))
+
+    # delete dependent rows first to maintain FK constraints
+    for model in (Reservation, Waitlist, Notification, NotificationOutbox):
+        model.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    User.query.filter_by(id=user_id).delete(synchronize_session=False)
+    return freed
+
+
+def reconcile_lot_counters() -> None:
+    """Recompute every lot's occupancy counters from its spot rows.
+
+    The counters are maintained incrementally by booking/release; this is
+    the escape hatch for drift (manual DB edits, legacy rows, crashes).
+    """
+
+    def _count(*statuses: str):
+        return (
+            db.select(func.count(ParkingSpot.id))
+            .where(ParkingSpot.lot_id == ParkingLot.id, ParkingSpot.status.in_(statuses))
+            .scalar_subquery()
+        )
+
+    # Spots held for a waiter are not bookable by anyone else: count them occupied
+    db.session.execute(
+        db.update(ParkingLot).values(
+            available_spots=_count("A"),
+            occupied_spots=_count("O", "H"),
+        )
+    )
+    db.session.commit()
+
+
+@bp.route("")
+@admin_required
 def dashboard():
     """Admin dashboard showing all parking lots with statistics."""
-    lots = ParkingLot.query.all()
+    lots = lot_listing()
     users = User.query.all()
 
-    # Statistics for dashboard cards and charts
-    total_lots = ParkingLot.query.count()
-    total_spots = ParkingSpot.query.count()
-    occupied_spots = ParkingSpot.query.filter_by(status="O").count()
-    available_spots = total_spots - occupied_spots
+    # Statistics for dashboard cards and charts, from the per-lot counters
+    total_lots = len(lots)
+    occupied_spots = sum(lot["occupied_spots"] for lot in lots)
+    available_spots = sum(lot["available_spots"] for lot in lots)
+    total_spots = occupied_spots + available_spots
 
     return render_template(
         "admin/dashboard.html",
+        user=current_identity(),
         lots=lots,
         users=users,
+        user_lots=_user_lots(),
+        reservation_counts=_reservation_counts(),
         total_lots=total_lots,
         total_spots=total_spots,
         occupied_spots=occupied_spots,
         available_spots=available_spots,
     )
 
+
+@bp.route("/cache/stats")
+@admin_required(json=True)
+def cache_stats():
+    """Cache hit/miss counters of this worker, for monitoring."""
+    return cache.stats()
+
+
+@bp.route("/instrumentation")
+@admin_required(json=True)
+def instrumentation_stats():
+    """Per-route timing and SQL totals of this worker (with ``INSTRUMENT`` on)."""
+    return instrumentation.stats()
+
 # ------------------------------------------------------------------
 # User management
 # ------------------------------------------------------------------
 @bp.route("/users")
+@admin_required
 def list_users():
     """List all users for admin management."""
     users = User.query.all()
-    return render_template("admin/users.html", users=users)
+    return render_template(
+        "admin/users.html",
+        user=current_identity(),
+        users=users,
+        reservation_counts=_reservation_counts(),
+    )
 
 
-@bp.route("/users/delete/<int:user_id>", methods=["POST"])  # pragma: no cover
+@bp.route("/users/<int:user_id>/history")
+@admin_required
+def user_history(user_id: int):
+    """One page of a user's reservation history."""
+    target = User.query.get_or_404(user_id)
+    cursor = request.args.get("cursor")
+    history, next_cursor = keyset_page(
+        reservations_with_lot().filter_by(user_id=user_id),
+        Reservation.parked_at,
+        Reservation.id,
+        cursor,
+        current_app.config["HISTORY_PAGE_SIZE"],
+    )
+
+    return render_template(
+        "admin/user_history.html",
+        user=current_identity(),
+        target=target,
+        history=history,
+        cursor=cursor,
+        next_cursor=next_cursor,
+    )
+
+
+@bp.route("/users/delete/<int:user_id>", methods=["POST"])
+@admin_required
 def delete_user(user_id: int):
     """Delete a user and related reservations."""
-    user = User.query.get_or_404(user_id)
-    if user.is_admin:
+    target = User.query.get_or_404(user_id)
+    if target.is_admin:
         flash("Cannot delete an admin user", "danger")
         return redirect(url_for("admin.list_users"))
 
     try:
-        # delete reservations first to maintain FK constraints
-        Reservation.query.filter_by(user_id=user_id).delete()
-        db.session.delete(user)
+        freed = _purge_user(user_id)
         db.session.commit()
+        for lot_id, spot_id in freed:
+            free_spots.push(lot_id, spot_id)
+        cache.invalidate("lots", "reservations", "stats")
+        if freed:
+            publish_availability(*{lot_id for lot_id, _ in freed})
         flash("User deleted successfully", "success")
     except Exception as e:
         db.session.rollback()
@@ -63,8 +289,11 @@ def delete_user(user_id: int):
 
     return redirect(url_for("admin.list_users"))
 
-
+# ------------------------------------------------------------------
+# Parking lot management
+# ------------------------------------------------------------------
 @bp.route("/add", methods=["GET", "POST"], endpoint="add_parking_lot")
+@admin_required
 def add_parking_lot():
     """Add a new parking lot."""
     if request.method == "POST":
@@ -82,36 +311,144 @@ def add_parking_lot():
             pincode=pincode,
             price_per_hour=price_per_hour,
             max_spots=max_spots,
+            available_spots=max_spots,
+            occupied_spots=0,
         )
         db.session.add(lot)
-        db.session.commit()
+        db.session.flush()
 
-        # Create spots for this lot
-        for i in range(1, max_spots + 1):
-            spot = ParkingSpot(lot_id=lot.id)
-            db.session.add(spot)
+        # Create spots for this lot in bulk, in the same transaction
+        _insert_spots(lot.id, max_spots)
         db.session.commit()
+        cache.invalidate("lots", "reservations", "stats")
+        publish_availability(lot.id)
 
         flash("Parking lot created successfully!", "success")
         return redirect(url_for("admin.dashboard"))
 
-    return render_template("admin/add_lot.html")
+    return render_template("admin/add_lot.html", user=current_identity())
 
-# ------------------------------------------------------------------
-# Parking lot deletion
-# ------------------------------------------------------------------
-@bp.route("/lots/delete/<int:lot_id>", methods=["POST"])  # pragma: no cover
+
+@bp.route("/lots/<int:lot_id>/resize", methods=["POST"])
+@admin_required
+def resize(lot_id: int):
+    """Change a lot's capacity by bulk-adding or retiring free spots."""
+    lot = ParkingLot.query.get_or_404(lot_id)
+    new_max = request.form.get("max_spots", type=int)
+    if new_max is None or new_max < 0:
+        flash("Enter a valid number of spots.", "warning")
+        return redirect(url_for("admin.dashboard"))
+
+    try:
+        resize_lot(lot, new_max)
+        db.session.commit()
+        flash(f"{lot.name} now has {new_max} spots.", "success")
+    except ValueError as e:
+        db.session.rollback()
+        flash(f"Cannot resize lot: {e}", "danger")
+    free_spots.drop(lot_id)
+    cache.invalidate("lots", "stats")
+    publish_availability(lot_id)
+    return redirect(url_for("admin.dashboard"))
+
+
+@bp.route("/lots/<int:lot_id>/spots")
+@admin_required(json=True)
+def lot_spots(lot_id: int):
+    """Return a lot's spot statuses, fetched lazily by the dashboard."""
+    rows = (
+        db.session.query(ParkingSpot.id, ParkingSpot.status)
+        .filter(ParkingSpot.lot_id == lot_id)
+        .order_by(ParkingSpot.id.asc())
+        .all()
+    )
+    return {"spots": [{"id": sid, "status": status} for sid, status in rows]}
+
+
+def _minutes(value: str, field: str) -> int:
+    """``"HH:MM"`` (00:00 to 23:59) to minutes after midnight."""
+    hours, sep, minutes = value.strip().partition(":")
+    if not (sep and hours.isdecimal() and len(minutes) == 2 and minutes.isdecimal()):
+        raise ValueError(f"{field} must be a time like 08:30")
+    if not (0 <= int(hours) <= 23 and 0 <= int(minutes) <= 59):
+        raise ValueError(f"{field} {value!r} is not a time of day")
+    return int(hours) * 60 + int(minutes)
+
+
+def _whole(value: str, field: str, low: int, high: int) -> int:
+    if not value.strip().isdecimal() or not low <= int(value) <= high:
+        raise ValueError(f"{field} must be a whole number from {low} to {high}")
+    return int(value)
+
+
+def _tariff_from_form(form) -> Window:
+    """Validate the add-tariff form; ``ValueError`` says what is wrong."""
+    days = 0
+    for day in form.getlist("days"):
+        days |= 1 << _whole(day, "days", 0, len(DAYS) - 1)
+    if not days:
+        raise ValueError("pick at least one day")
+    min_occupancy = _whole(form.get("min_occupancy") or "0", "occupancy", 0, 100)
+    try:
+        price = float(form.get("price_per_hour", ""))
+    except ValueError:
+        raise ValueError("the price must be a number") from None
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("the price must be zero or more")
+    start = _minutes(form.get("start", ""), "the start")
+    end = _minutes(form.get("end", ""), "the end")
+    return Window(days, start, end, min_occupancy, to_paise(price))
+
+
+@bp.route("/lots/<int:lot_id>/tariffs", methods=["GET", "POST"])
+@admin_required
+def tariffs(lot_id: int):
+    """A lot's time-of-day and occupancy price windows; POST adds one."""
+    lot = ParkingLot.query.get_or_404(lot_id)
+    if request.method == "POST":
+        try:
+            window = _tariff_from_form(request.form)
+        except ValueError as e:
+            flash(f"Cannot add tariff: {e}", "danger")
+        else:
+            db.session.add(Tariff(lot_id=lot_id, **window._asdict()))
+            tariff_book.changed(lot_id)
+            db.session.commit()
+            flash("Tariff added.", "success")
+        return redirect(url_for("admin.tariffs", lot_id=lot_id))
+
+    # What each occupancy tier is charged right now
+    schedule = tariff_book.schedule(lot)
+    now = datetime.utcnow()
+    rates_now = [(tier, schedule.rate_at(now, tier)) for tier in schedule.tiers]
+    return render_template(
+        "admin/tariffs.html", user=current_identity(), lot=lot, days=DAYS, rates_now=rates_now
+    )
+
+
+@bp.route("/lots/<int:lot_id>/tariffs/<int:tariff_id>/delete", methods=["POST"])
+@admin_required
+def delete_tariff(lot_id: int, tariff_id: int):
+    """Remove one window from a lot's schedule."""
+    if Tariff.query.filter_by(id=tariff_id, lot_id=lot_id).delete(synchronize_session=False):
+        tariff_book.changed(lot_id)
+        db.session.commit()
+        flash("Tariff removed.", "success")
+    return redirect(url_for("admin.tariffs", lot_id=lot_id))
+
+
+@bp.route("/lots/delete/<int:lot_id>", methods=["POST"])
+@admin_required
 def delete_lot(lot_id: int):
     """Delete a parking lot and its spots/reservations."""
-    lot = ParkingLot.query.get_or_404(lot_id)
+    ParkingLot.query.get_or_404(lot_id)
     try:
-        # Delete reservations linked to spots in this lot
-        spot_ids = [s.id for s in lot.spots]
-        if spot_ids:
-            Reservation.query.filter(Reservation.spot_id.in_(spot_ids)).delete(synchronize_session=False)
-        # Deleting the lot cascades delete spots (defined in model)
-        db.session.delete(lot)
+        # Reservations, waitlist, notifications, rollups and spots, then the lot
+        _purge_lot(lot_id)
         db.session.commit()
+        free_spots.drop(lot_id)
+        cache.invalidate("lots", "reservations", "stats")
+        events.publish("lot_removed", {"lot_id": lot_id})
         flash("Parking lot deleted successfully", "success")
     except Exception as e:
         db.session.rollback()
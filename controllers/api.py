@@ -1,16 +1,37 @@
 """API endpoints for Vehicle Parking App."""
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Dict, Any
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional
 
-from flask import Blueprint, jsonify, request
-from flask_login import login_required, current_user
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+from sqlalchemy import bindparam, extract, func
+from sqlalchemy.orm import joinedload
 
-from models import db, ParkingLot, ParkingSpot, Reservation
+from models import (
+    db,
+    LotUsageDaily,
+    LotUsageHourly,
+    Notification,
+    ParkingLot,
+    ParkingSpot,
+    Reservation,
+    Tariff,
+)
+from services.auth import admin_required, current_identity, login_required, user_required
+from services.billing import revenue, stay_cost, to_rupees
+from services.cache import cache
+from services.events import events, sse_format, stream
+from services.pagination import keyset_page
+from services.rollups import rebuild_rollups
+from services.tariffs import TariffBook
 
 bp = Blueprint("api", __name__, url_prefix="/api")
 
+# Compiled tariff schedules of every lot, shared by release and re-pricing
+tariff_book = TariffBook(db, ParkingLot, Tariff)
+
 
 def format_reservation(reservation: Reservation) -> Dict[str, Any]:
     """Format a reservation for API response."""
@@ -24,9 +45,7 @@ def format_reservation(reservation: Reservation) -> Dict[str, Any]:
         "left_at": reservation.left_at and reservation.left_at.isoformat(),
         "duration_hours": reservation.left_at and 
             round((reservation.left_at - reservation.parked_at).total_seconds() / 3600, 2),
-        "cost": reservation.left_at and 
-            round((reservation.left_at - reservation.parked_at).total_seconds() / 3600 * 
-                  reservation.spot.lot.price_per_hour, 2)
+        "cost": reservation.left_at and float(reservation.cost),
     }
 
 
@@ -39,21 +58,96 @@ def format_parking_lot(lot: ParkingLot) -> Dict[str, Any]:
         "pincode": lot.pincode,
         "price_per_hour": lot.price_per_hour,
         "max_spots": lot.max_spots,
-        "available_spots": len([s for s in lot.spots if s.status == "A"]),
-        "occupied_spots": len([s for s in lot.spots if s.status == "O"])
+        "available_spots": lot.available_spots,
+        "occupied_spots": lot.occupied_spots
     }
 
 
+def lot_listing() -> List[Dict[str, Any]]:
+    """Every lot with its occupancy counters, as cacheable plain dicts."""
+    return cache.get_or_set(
+        "lots", "listing",
+        lambda: [format_parking_lot(lot) for lot in ParkingLot.query.order_by(ParkingLot.id)],
+    )
+
+
+def reservations_with_lot():
+    """Reservation query that eager-loads spot and lot in the same SELECT.
+
+    Every list view renders ``res.spot.lot``; without this each row costs
+    two extra lazy-load queries.
+    """
+    return Reservation.query.options(
+        joinedload(Reservation.spot).joinedload(ParkingSpot.lot)
+    )
+
+
+def publish_availability(*lot_ids: int) -> None:
+    """Push the committed counters of ``lot_ids`` to ``/api/lots/stream``."""
+    rows = (
+        db.session.query(ParkingLot.id, ParkingLot.available_spots, ParkingLot.occupied_spots)
+        .filter(ParkingLot.id.in_(lot_ids))
+        .all()
+    )
+    for lot_id, available, occupied in rows:
+        events.publish(
+            "availability",
+            {"lot_id": lot_id, "available_spots": available, "occupied_spots": occupied},
+        )
+
+
 @bp.route("/lots", methods=["GET"])
-@login_required
+@login_required(json=True)
 def get_parking_lots():
     """Get all parking lots."""
-    lots = ParkingLot.query.all()
-    return jsonify([format_parking_lot(lot) for lot in lots])
+    return jsonify(lot_listing())
+
+
+@bp.route("/lots/stream", methods=["GET"])
+@login_required(json=True)
+def stream_parking_lots():
+    """Server-Sent Events feed of per-lot availability.
+
+    Sends one ``snapshot`` of every lot, then an ``availability`` event
+    whenever a booking, release or resize changes a lot's counters. Each
+    open stream holds a worker thread, so a worker serves at most
+    ``EVENTS_MAX_STREAMS`` of them and answers further ones ``503``
+    (clients poll ``/api/lots`` instead), and every stream ends after
+    ``EVENTS_STREAM_SECONDS`` for the browser to reconnect.
+    """
+    config = current_app.config
+    # Subscribe before taking the snapshot so no change slips between them
+    sub = events.subscribe(limit=config["EVENTS_MAX_STREAMS"])
+    if sub is None:
+        response = jsonify({"error": "Too many live streams, poll /api/lots instead"})
+        response.headers["Retry-After"] = str(config["EVENTS_POLL_SECONDS"])
+        return response, 503
+    snapshot = [
+        {"id": lot_id, "available_spots": available, "occupied_spots": occupied}
+        for lot_id, available, occupied in db.session.query(
+            ParkingLot.id, ParkingLot.available_spots, ParkingLot.occupied_spots
+        ).order_by(ParkingLot.id)
+    ]
+    lifetime = config["EVENTS_STREAM_SECONDS"]
+
+    def generate():
+        # Reconnect at a random point of the next few seconds, not all at once
+        yield f"retry: {random.randint(1000, 5000)}\n\n"
+        yield sse_format("snapshot", snapshot)
+        yield from stream(sub, lifetime=lifetime)
+
+    response = Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Frees the slot even if the body is never iterated
+    response.call_on_close(sub.close)
+    return response
 
 
 @bp.route("/lots/<int:lot_id>", methods=["GET"])
-@login_required
+@login_required(json=True)
 def get_parking_lot(lot_id: int):
     """Get a specific parking lot."""
     lot = ParkingLot.query.get_or_404(lot_id)
@@ -61,7 +155,7 @@ def get_parking_lot(lot_id: int):
 
 
 @bp.route("/lots/<int:lot_id>/spots", methods=["GET"])
-@login_required
+@login_required(json=True)
 def get_parking_spots(lot_id: int):
     """Get all spots for a parking lot."""
     lot = ParkingLot.query.get_or_404(lot_id)
@@ -79,46 +173,391 @@ def get_parking_spots(lot_id: int):
 
 
 @bp.route("/history", methods=["GET"])
-@login_required
+@login_required(json=True)
 def get_user_history():
-    """Get user's parking history."""
-    history = Reservation.query.filter_by(user_id=current_user.id)\
-        .order_by(Reservation.parked_at.desc())\
+    """Get one page of the user's parking history, newest first.
+
+    Query params: ``cursor`` (from the previous page) and ``limit``
+    (default ``HISTORY_PAGE_SIZE``, at most 100). The next page, if any, is
+    advertised in a ``Link: <...>; rel="next"`` header.
+    """
+    default_limit = current_app.config.get("HISTORY_PAGE_SIZE", 20)
+    limit = min(max(request.args.get("limit", default_limit, type=int), 1), 100)
+    query = reservations_with_lot().filter_by(user_id=current_identity().id)
+    history, next_cursor = keyset_page(
+        query, Reservation.parked_at, Reservation.id, request.args.get("cursor"), limit
+    )
+    response = jsonify([format_reservation(res) for res in history])
+    if next_cursor:
+        next_url = url_for("api.get_user_history", cursor=next_cursor, limit=limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def unread_count(user_id: int) -> int:
+    """Unread notifications of a user, counted on the (user_id, read) index."""
+    return Notification.query.filter_by(user_id=user_id, read=False).count()
+
+
+def notification_feed(user_id: int, cursor: Optional[str], limit: int, unread_only: bool = True):
+    """One newest-first page of a user's notifications: ``(rows, next_cursor)``."""
+    query = Notification.query.filter_by(user_id=user_id)
+    if unread_only:
+        query = query.filter_by(read=False)
+    return keyset_page(query, Notification.created_at, Notification.id, cursor, limit)
+
+
+@bp.route("/notifications", methods=["GET"])
+@user_required(json=True)
+def get_notifications():
+    """Page through the user's notifications, newest first.
+
+    Query params: ``cursor``, ``limit`` (default ``NOTIFICATION_FEED_SIZE``,
+    at most 100) and ``all=1`` to include read ones.
+    """
+    user = current_identity()
+    default_limit = current_app.config.get("NOTIFICATION_FEED_SIZE", 10)
+    limit = min(max(request.args.get("limit", default_limit, type=int), 1), 100)
+    rows, next_cursor = notification_feed(
+        user.id, request.args.get("cursor"), limit, unread_only=request.args.get("all") != "1"
+    )
+    return jsonify({
+        "notifications": [
+            {
+                "id": n.id,
+                "lot_id": n.lot_id,
+                "message": n.message,
+                "created_at": n.created_at.isoformat(),
+                "read": n.read,
+            }
+            for n in rows
+        ],
+        "next_cursor": next_cursor,
+        "unread": unread_count(user.id),
+    })
+
+
+@bp.route("/notifications/read", methods=["POST"])
+@user_required(json=True)
+def mark_notifications_read():
+    """Mark many notifications read in one ``UPDATE``.
+
+    JSON body: ``{"ids": [...]}`` (at most 500) or ``{"before": "<ISO
+    timestamp>"}`` for everything created up to that moment – pass the time
+    the feed was rendered so notifications that arrived since stay unread.
+    """
+    user = current_identity()
+    payload = request.get_json(silent=True) or {}
+    query = Notification.query.filter_by(user_id=user.id, read=False)
+    if "ids" in payload:
+        ids = payload["ids"]
+        if not isinstance(ids, list) or len(ids) > 500 or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids must be a list of at most 500 integers"}), 400
+        query = query.filter(Notification.id.in_(ids))
+    elif "before" in payload:
+        try:
+            before = datetime.fromisoformat(str(payload["before"]))
+        except ValueError:
+            return jsonify({"error": "before must be an ISO 8601 timestamp"}), 400
+        if before.tzinfo is not None:
+            # Stored timestamps are naive UTC
+            before = before.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.filter(Notification.created_at <= before)
+    else:
+        return jsonify({"error": "Provide ids or before"}), 400
+    updated = query.update({Notification.read: True}, synchronize_session=False)
+    db.session.commit()
+    return jsonify({"updated": updated, "unread": unread_count(user.id)})
+
+
+def collect_statistics() -> Dict[str, Any]:
+    """Aggregate parking statistics from the usage rollup tables.
+
+    Completed stays come from ``lot_usage_daily``/``lot_usage_hourly``
+    (one row per lot per bucket); only the small set of still-active
+    reservations is counted from the raw table.
+    """
+    lots = ParkingLot.query.order_by(ParkingLot.id).all()
+
+    # Completed bookings and revenue (paise) per lot
+    completed = {
+        lot_id: (int(bookings), int(paise))
+        for lot_id, bookings, paise in (
+            db.session.query(
+                LotUsageDaily.lot_id,
+                func.sum(LotUsageDaily.bookings),
+                func.sum(LotUsageDaily.revenue_paise),
+            )
+            .group_by(LotUsageDaily.lot_id)
+        )
+    }
+
+    # Reservations still in progress, per lot
+    active = dict(
+        db.session.query(ParkingSpot.lot_id, func.count(Reservation.id))
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .filter(Reservation.left_at.is_(None))
+        .group_by(ParkingSpot.lot_id)
         .all()
-    return jsonify([format_reservation(res) for res in history])
+    )
 
+    # Completed bookings bucketed by the hour of day they started
+    hour_of_day = extract("hour", LotUsageHourly.bucket)
+    usage_by_hour = {hour: 0 for hour in range(24)}
+    for hour, count in (
+        db.session.query(hour_of_day, func.sum(LotUsageHourly.bookings))
+        .group_by(hour_of_day)
+    ):
+        usage_by_hour[int(hour)] = int(count)
 
-@bp.route("/stats", methods=["GET"])
-@login_required
-def get_statistics():
-    """Get parking statistics."""
-    # Get all reservations
-    reservations = Reservation.query.all()
-    
-    # Calculate statistics
-    stats = {
-        "total_parking_lots": ParkingLot.query.count(),
-        "total_spots": ParkingSpot.query.count(),
-        "total_bookings": len(reservations),
-        "active_bookings": len([r for r in reservations if not r.left_at]),
-        "revenue": round(sum(
-            (r.left_at - r.parked_at).total_seconds() / 3600 * 
-            r.spot.lot.price_per_hour
-            for r in reservations if r.left_at
-        ), 2),
-        "usage_by_hour": {
-            hour: len([r for r in reservations 
-                      if r.parked_at.hour == hour and r.left_at])
-            for hour in range(24)
-        },
+    def bookings(lot_id: int) -> int:
+        return completed.get(lot_id, (0, 0))[0] + int(active.get(lot_id, 0))
+
+    return {
+        "total_parking_lots": len(lots),
+        "total_spots": sum(lot.available_spots + lot.occupied_spots for lot in lots),
+        "total_bookings": sum(b for b, _ in completed.values()) + sum(active.values()),
+        "active_bookings": sum(active.values()),
+        "revenue": float(to_rupees(sum(paise for _, paise in completed.values()))),
+        "usage_by_hour": usage_by_hour,
         "top_lots": [
             {
                 "lot": format_parking_lot(lot),
-                "bookings": len([r for r in reservations 
-                                if r.spot.lot_id == lot.id])
+                "bookings": bookings(lot.id),
             }
-            for lot in ParkingLot.query.all()
-        ]
+            for lot in lots
+        ],
     }
-    
-    return jsonify(stats)
+
+
+def rebuild_usage_rollups() -> int:
+    """Backfill the hourly/daily usage rollups from closed reservations."""
+    rows = (
+        db.session.query(
+            ParkingSpot.lot_id,
+            Reservation.parked_at,
+            Reservation.left_at,
+            Reservation.cost_paise,
+            ParkingLot.price_per_hour,
+        )
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .filter(Reservation.left_at.isnot(None))
+        .order_by(ParkingSpot.lot_id)
+        .yield_per(10_000)
+    )
+    stays = (
+        (lot_id, parked_at, left_at, stay_cost(parked_at, left_at, price) if cost is None else cost)
+        for lot_id, parked_at, left_at, cost, price in rows
+    )
+    count = rebuild_rollups(
+        db.session, LotUsageHourly.__table__, LotUsageDaily.__table__, stays
+    )
+    db.session.commit()
+    return count
+
+
+def backfill_reservation_costs(batch: int = 10_000) -> int:
+    """Store the cost of closed reservations released before costs were kept.
+
+    Those stays are priced at their lot's current rate, the only one known.
+    Works through them in id order, one committed batch at a time; returns
+    the number of reservations filled in.
+    """
+    table = Reservation.__table__
+    update = (
+        table.update()
+        .where(table.c.id == bindparam("reservation_id"))
+        .values(cost_paise=bindparam("cost"))
+    )
+    done = last_id = 0
+    while True:
+        rows = (
+            db.session.query(
+                Reservation.id, Reservation.parked_at, Reservation.left_at, ParkingLot.price_per_hour
+            )
+            .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+            .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+            .filter(
+                Reservation.left_at.isnot(None),
+                Reservation.cost_paise.is_(None),
+                Reservation.id > last_id,
+            )
+            .order_by(Reservation.id)
+            .limit(batch)
+            .all()
+        )
+        if not rows:
+            return done
+        db.session.execute(update, [
+            {"reservation_id": rid, "cost": stay_cost(parked_at, left_at, price)}
+            for rid, parked_at, left_at, price in rows
+        ])
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1][0]
+
+
+def reprice_reservations(
+    lot_ids: Optional[List[int]] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    dry_run: bool = False,
+    batch: int = 10_000,
+) -> Dict[str, int]:
+    """Recompute the cost of closed reservations under the current tariffs.
+
+    Covers stays released in ``[start, end)`` in ``lot_ids`` (all lots by
+    default), one committed batch at a time in id order, and writes back
+    only the costs that changed. The usage rollups are left as they were;
+    rebuild them afterwards. Returns ``stays``, ``changed``, and the total
+    ``before``/``after`` in paise.
+    """
+    lots = {lot.id: lot for lot in ParkingLot.query}
+    table = Reservation.__table__
+    update = (
+        table.update()
+        .where(table.c.id == bindparam("reservation_id"))
+        .values(cost_paise=bindparam("cost"))
+    )
+    query = (
+        db.session.query(
+            Reservation.id,
+            ParkingSpot.lot_id,
+            Reservation.parked_at,
+            Reservation.left_at,
+            Reservation.occupancy_pct,
+            Reservation.cost_paise,
+        )
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .filter(Reservation.left_at.isnot(None))
+    )
+    if lot_ids:
+        query = query.filter(ParkingSpot.lot_id.in_(lot_ids))
+    if start is not None:
+        query = query.filter(Reservation.left_at >= start)
+    if end is not None:
+        query = query.filter(Reservation.left_at < end)
+
+    totals = {"stays": 0, "changed": 0, "before": 0, "after": 0}
+    last_id = 0
+    while True:
+        rows = query.filter(Reservation.id > last_id).order_by(Reservation.id).limit(batch).all()
+        if not rows:
+            return totals
+        changes = []
+        for rid, lot_id, parked_at, left_at, occupancy, old in rows:
+            lot = lots[lot_id]
+            if old is None:
+                old = stay_cost(parked_at, left_at, lot.price_per_hour)
+            new = tariff_book.price(lot, parked_at, left_at, occupancy)
+            totals["before"] += old
+            totals["after"] += new
+            if new != old:
+                changes.append({"reservation_id": rid, "cost": new})
+        totals["stays"] += len(rows)
+        totals["changed"] += len(changes)
+        if changes and not dry_run:
+            db.session.execute(update, changes)
+            db.session.commit()
+        last_id = rows[-1][0]
+
+
+@bp.route("/stats", methods=["GET"])
+@login_required(json=True)
+def get_statistics():
+    """Get parking statistics."""
+    return jsonify(cache.get_or_set("stats", "summary", collect_statistics))
+
+
+@bp.route("/stats/revenue", methods=["GET"])
+@admin_required(json=True)
+def get_revenue():
+    """Revenue billed between two dates, per lot or per day.
+
+    Query params (all optional):
+      - from, to: ISO dates, both inclusive; open-ended when left out
+      - lot: a lot id, repeatable, to restrict the sum to those lots
+      - by: ``lot`` (default) or ``day``
+    """
+    start = request.args.get("from", type=date.fromisoformat)
+    end = request.args.get("to", type=date.fromisoformat)
+    lot_ids = request.args.getlist("lot", type=int) or None
+    by = request.args.get("by", "lot")
+    if by not in ("lot", "day"):
+        return jsonify({"error": "by must be 'lot' or 'day'"}), 400
+
+    rows = revenue(
+        db.session,
+        Reservation.__table__,
+        ParkingSpot.__table__,
+        start=start and datetime.combine(start, datetime.min.time()),
+        end=end and datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        lot_ids=lot_ids,
+        by=by,
+    )
+    return jsonify({
+        "from": start and start.isoformat(),
+        "to": end and end.isoformat(),
+        "by": by,
+        "stays": sum(stays for _, stays, _ in rows),
+        "revenue": float(to_rupees(sum(paise for _, _, paise in rows))),
+        "rows": [
+            {by: key, "stays": stays, "revenue": float(to_rupees(paise))}
+            for key, stays, paise in rows
+        ],
+    })
+
+
+@bp.route("/stats/daily", methods=["GET"])
+@login_required(json=True)
+def get_daily_usage():
+    """Completed bookings per day for the last ``days`` days (default 30)."""
+    days = request.args.get("days", default=30, type=int)
+    since = datetime.utcnow().date() - timedelta(days=days)
+    rows = (
+        db.session.query(LotUsageDaily.bucket, func.sum(LotUsageDaily.bookings))
+        .filter(LotUsageDaily.bucket >= since)
+        .group_by(LotUsageDaily.bucket)
+        .order_by(LotUsageDaily.bucket)
+        .all()
+    )
+    return jsonify({
+        "labels": [day.isoformat() for day, _ in rows],
+        "bookings": [int(count) for _, count in rows],
+    })
+
+
+@bp.route("/stats/reservations", methods=["GET"])
+def reservation_stats():
+    """Return reservation counts per lot.
+
+    Query params:
+      - user_id (optional): if provided, filter reservations for that user only.
+    Response format:
+      {
+        "labels": [lot names...],
+        "counts": [counts aligned to labels]
+      }
+    """
+    user_id = request.args.get("user_id", type=int)
+
+    def load() -> dict:
+        # Build base query: join Reservation -> ParkingSpot -> ParkingLot
+        q = (
+            db.session.query(ParkingLot.name, func.count(Reservation.id))
+            .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)
+            .outerjoin(Reservation, Reservation.spot_id == ParkingSpot.id)
+        )
+
+        if user_id:
+            q = q.filter(Reservation.user_id == user_id)
+
+        q = q.group_by(ParkingLot.id).order_by(ParkingLot.name.asc())
+
+        rows = q.all()
+        labels = [r[0] for r in rows]
+        counts = [int(r[1] or 0) for r in rows]
+        return {"labels": labels, "counts": counts}
+
+    return jsonify(cache.get_or_set("reservations", f"per_lot:{user_id or 'all'}", load))
@@ -0,0 +1,90 @@
+"""Sign-in, sign-out and registration controllers for Vehicle Parking App."""
+from __future__ import annotations
+
+from typing import Optional
+
+from flask import Blueprint, flash, redirect, render_template, request, url_for
+
+from models import db, User
+from services.auth import Identity, current_identity, forget_identity, remember_identity
+from services.passwords import HasherBusy, passwords
+
+bp = Blueprint("auth", __name__)
+
+
+def load_identity(user_id: int) -> Optional[Identity]:
+    """Id and role of a user, without loading the rest of the row."""
+    row = db.session.query(User.id, User.is_admin).filter_by(id=user_id).first()
+    return Identity(row.id, bool(row.is_admin)) if row else None
+
+
+@bp.route("/")
+def index():
+    user = current_identity()
+    if user:
+        if user.is_admin:
+            return redirect(url_for("admin.dashboard"))
+        return redirect(url_for("user.dashboard"))
+    return render_template("login.html")
+
+
+@bp.route("/login", methods=["POST"])
+def login():
+    username = request.form.get("username")
+    password = request.form.get("password")
+
+    user = User.query.filter_by(username=username).first()
+    try:
+        verified = user is not None and user.check_password(password)
+    except HasherBusy:
+        flash("Too many sign-ins right now, please try again in a moment", "warning")
+        return redirect(url_for("auth.index"))
+    if verified:
+        if passwords.needs_rehash(user.password_hash):
+            # Hashing settings changed since this hash was made; upgrade it
+            # now that we know the password (or on a later, quieter login)
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except HasherBusy:
+                pass
+        remember_identity(user.id, user.is_admin)
+        flash("Logged in successfully", "success")
+        if user.is_admin:
+            return redirect(url_for("admin.dashboard"))
+        return redirect(url_for("user.dashboard"))
+
+    flash("Invalid credentials", "danger")
+    return redirect(url_for("auth.index"))
+
+
+@bp.route("/logout")
+def logout():
+    forget_identity()
+    flash("Logged out", "info")
+    return redirect(url_for("auth.index"))
+
+
+@bp.route("/register", methods=["GET", "POST"])
+def register():
+    if request.method == "POST":
+        username = request.form.get("username")
+        password = request.form.get("password")
+        full_name = request.form.get("full_name")
+        address = request.form.get("address")
+        pincode = request.form.get("pincode")
+
+        if User.query.filter_by(username=username).first():
+            flash("Username already exists", "warning")
+            return redirect(url_for("auth.register"))
+        user = User(username=username, full_name=full_name, address=address, pincode=pincode)
+        try:
+            user.set_password(password)
+        except HasherBusy:
+            flash("Too many sign-ups right now, please try again in a moment", "warning")
+            return redirect(url_for("auth.register"))
+        db.session.add(user)
+        db.session.commit()
+        flash("Registration successful. Please log in.", "success")
+        return redirect(url_for("auth.index"))
+    return render_template("register.html")
@@ -0,0 +1,51 @@
+"""Prometheus scrape endpoint for Vehicle Parking App."""
+from __future__ import annotations
+
+import hmac
+
+from flask import Blueprint, Response, abort, request
+from sqlalchemy import func
+
+from models import db, ParkingLot, Waitlist
+from services.metrics import metrics
+
+bp = Blueprint("metrics", __name__)
+
+
+def _lot_gauges():
+    """Occupancy and waitlist depth per lot, read when scraped.
+
+    The lot counters are maintained by booking and release, and the queue
+    depth is one GROUP BY on the waitlist index, so a scrape costs two
+    small queries however long the history grows.
+    """
+    lots = db.session.query(
+        ParkingLot.id, ParkingLot.name, ParkingLot.occupied_spots, ParkingLot.available_spots
+    ).all()
+    waiting = dict(
+        db.session.query(Waitlist.lot_id, func.count(Waitlist.id))
+        .filter_by(notified=False)
+        .group_by(Waitlist.lot_id)
+    )
+    occupied = {(str(lot_id), name): used for lot_id, name, used, _ in lots}
+    available = {(str(lot_id), name): free for lot_id, name, _, free in lots}
+    depth = {(str(lot_id), name): waiting.get(lot_id, 0) for lot_id, name, _, _ in lots}
+    labels = ("lot", "name")
+    return [
+        ("parking_spots_occupied", "gauge", "Spots occupied or held for a waiter.", labels, occupied),
+        ("parking_spots_available", "gauge", "Spots free to book.", labels, available),
+        ("parking_waitlist_depth", "gauge", "Users waiting for a spot.", labels, depth),
+    ]
+
+
+@bp.route("/metrics")
+def scrape():
+    """All metrics in the Prometheus text exposition format."""
+    if not metrics.enabled:
+        abort(404)
+    if metrics.token:
+        supplied = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(supplied, f"Bearer {metrics.token}"):
+            abort(401)
+    body = metrics.render(_lot_gauges())
+    return Response(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
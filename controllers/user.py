@@ -2,124 +2,305 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import List, Optional, Tuple
 
-from flask import Blueprint, flash, redirect, render_template, url_for
-from flask_login import current_user
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy.exc import IntegrityError
 
-from models import db, ParkingLot, ParkingSpot, Reservation
+from controllers.api import (
+    lot_listing,
+    notification_feed,
+    publish_availability,
+    reservations_with_lot,
+    tariff_book,
+    unread_count,
+)
+from models import (
+    db,
+    LotUsageDaily,
+    LotUsageHourly,
+    Notification,
+    NotificationOutbox,
+    ParkingLot,
+    ParkingSpot,
+    Reservation,
+    Waitlist,
+)
+from services.allocator import AllocationContention, free_spots
+from services.auth import current_identity, user_required
+from services.billing import to_rupees
+from services.cache import cache
+from services.metrics import metrics
+from services.notify import OutboxDispatcher
+from services.pagination import keyset_page
+from services.rollups import record_stay
+from services.waitlist import WaitlistEngine
 
 bp = Blueprint("user", __name__, url_prefix="/user")
 
+# Per-lot waitlist queues with spot holds; notifications go through the outbox
+waitlist_queue = WaitlistEngine(db, ParkingLot, ParkingSpot, Waitlist, NotificationOutbox)
+notifier = OutboxDispatcher(db, NotificationOutbox, Notification)
+bp.record_once(lambda state: notifier.init_app(state.app))
 
-@bp.route("/")
+
+def _free_spot_ids(lot_id: int, after: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+    """Free spot ids of a lot in id order, answered from the (lot_id, status) index.
+
+    ``after``/``limit`` read just a window of them, above a lost claim.
+    """
+    rows = db.session.query(ParkingSpot.id).filter_by(lot_id=lot_id, status="A")
+    if after is not None:
+        rows = rows.filter(ParkingSpot.id > after)
+    rows = rows.order_by(ParkingSpot.id).limit(limit)
+    return [spot_id for (spot_id,) in rows]
+
+
+def _claim_spot(spot_id: int) -> Optional[int]:
+    """Atomically mark a spot occupied; ``None`` if another booking won it.
+
+    The ``WHERE status = 'A'`` guard turns the check-and-set into one
+    statement, so two workers can never both take the same spot.
+    """
+    claimed = (
+        ParkingSpot.query
+        .filter_by(id=spot_id, status="A")
+        .update({ParkingSpot.status: "O"}, synchronize_session=False)
+    )
+    return spot_id if claimed else None
+
+
+def _active_conflict(error: IntegrityError) -> Optional[str]:
+    """Which one-active-stay index ``error`` hit: ``"user"``, ``"spot"`` or ``None``.
+
+    PostgreSQL names the index; SQLite names the indexed column.
+    """
+    message = str(error.orig)
+    for kind in ("user", "spot"):
+        if f"uq_reservation_active_{kind}" in message or f"reservation.{kind}_id" in message:
+            return kind
+    return None
+
+
+def warm_free_spots() -> None:
+    """Load every lot's free spot ids into this worker's allocator.
+
+    Optional: a lot that was never loaded is read from the database on its
+    first booking.
+    """
+    by_lot = {lot_id: [] for (lot_id,) in db.session.query(ParkingLot.id)}
+    rows = db.session.query(ParkingSpot.lot_id, ParkingSpot.id).filter_by(status="A")
+    for lot_id, spot_id in rows:
+        by_lot.setdefault(lot_id, []).append(spot_id)
+    free_spots.clear()
+    for lot_id, spot_ids in by_lot.items():
+        free_spots.load(lot_id, spot_ids)
+
+
+def commit_freed(freed: List[Tuple[int, int]]) -> None:
+    """Commit, then return ``freed`` spots to the allocator and dashboards."""
+    db.session.commit()
+    for lot_id, spot_id in freed:
+        free_spots.push(lot_id, spot_id)
+    if freed:
+        cache.invalidate("lots", "stats")
+        publish_availability(*{lot_id for lot_id, _ in freed})
+
+
+@bp.before_app_request
+def _sweep_waitlist_holds():
+    """Cascade expired waitlist holds, at most once per sweep interval."""
+    try:
+        freed = waitlist_queue.maybe_expire(current_app.config["WAITLIST_SWEEP_SECONDS"])
+        commit_freed(freed)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Waitlist hold sweep failed")
+
+
+@bp.route("")
+@user_required
 def dashboard():
     """User dashboard showing available parking lots and booking history."""
-    # Get all available parking lots
-    lots = ParkingLot.query.all()
-    
-    # Get user's active reservation
-    active_reservation = None
-    if current_user.is_authenticated:
-        active_reservation = Reservation.query.filter_by(
-            user_id=current_user.id,
-            left_at=None
-        ).first()
-
-    # Get user's reservation history
-    history = Reservation.query.filter_by(
-        user_id=current_user.id
-    ).order_by(Reservation.parked_at.desc()).all()
+    user = current_identity()
+    lots = lot_listing()
+
+    active_reservation = reservations_with_lot().filter_by(
+        user_id=user.id,
+        left_at=None
+    ).first()
+
+    # Get one page of the user's reservation history
+    cursor = request.args.get("cursor")
+    history, next_cursor = keyset_page(
+        reservations_with_lot().filter_by(user_id=user.id),
+        Reservation.parked_at,
+        Reservation.id,
+        cursor,
+        current_app.config["HISTORY_PAGE_SIZE"],
+    )
+
+    # Newest unread notifications only; the rest stay behind the API feed
+    notifications, more = notification_feed(user.id, None, current_app.config["NOTIFICATION_FEED_SIZE"])
+    unread = unread_count(user.id) if more else len(notifications)
 
     return render_template(
         "user/dashboard.html",
+        user=user,
         lots=lots,
         active_reservation=active_reservation,
-        history=history
+        history=history,
+        cursor=cursor,
+        next_cursor=next_cursor,
+        notifications=notifications,
+        unread_count=unread,
+        rendered_at=datetime.utcnow(),
+        holds=waitlist_queue.holds_for(user.id),
     )
 
 
 @bp.route("/book/<int:lot_id>")
+@user_required
 def book_parking(lot_id: int):
     """Book parking in a specific lot."""
-    if not current_user.is_authenticated:
-        flash("Please login to book parking", "warning")
-        return redirect(url_for("index"))
+    user = current_identity()
 
     lot = ParkingLot.query.get_or_404(lot_id)
-    
-    # Check if user already has an active reservation
-    active_reservation = Reservation.query.filter_by(
-        user_id=current_user.id,
-        left_at=None
-    ).first()
-    
-    if active_reservation:
-        flash("You already have an active reservation.", "warning")
-        return redirect(url_for("user.dashboard"))
-
-    # Find first available spot by ascending spot id (1,2,3...)
-    available_spot = (
-        ParkingSpot.query
-        .filter_by(lot_id=lot_id, status="A")
-        .order_by(ParkingSpot.id.asc())
-        .first()
-    )
-
-    if not available_spot:
-        flash("No spots available in this lot", "danger")
-        return redirect(url_for("user.dashboard"))
 
+    spot_id = held = None
     try:
-        # Create reservation
-        reservation = Reservation(
-            spot_id=available_spot.id,
-            user_id=current_user.id
+        # A spot held for this user off the waitlist is already counted as
+        # occupied; otherwise claim the lowest free spot, retrying lost races
+        held = waitlist_queue.claim(lot_id, user.id)
+        spot_id = held or free_spots.allocate(
+            lot_id,
+            _free_spot_ids,
+            _claim_spot,
+            max_attempts=current_app.config["BOOKING_CLAIM_ATTEMPTS"],
         )
-        db.session.add(reservation)
-        
-        # Update spot status to occupied
-        available_spot.status = "O"
-        
+        if spot_id is None:
+            metrics.booking_failures.inc(reason="full")
+            flash("No available spots in this lot", "danger")
+            return redirect(url_for("user.dashboard"))
+
+        # The unique active-stay indexes turn away a second booking here, so
+        # there is no separate check for an existing reservation
+        db.session.add(Reservation(spot_id=spot_id, user_id=user.id, occupancy_pct=lot.occupancy))
+        db.session.flush()
+        if held is None:
+            ParkingLot.shift_occupancy(lot_id, 1)
+        # Parked now: leave other queues and pass on any other holds
+        freed = waitlist_queue.withdraw(user.id)
         db.session.commit()
+        cache.invalidate("lots", "reservations", "stats")
+        publish_availability(lot_id)
+        metrics.bookings.inc(lot=lot_id)
+        commit_freed(freed)
         flash("Parking booked successfully!", "success")
+    except AllocationContention:
+        db.session.rollback()
+        metrics.booking_failures.inc(reason="contention")
+        flash("Spots in this lot are being booked right now, please try again.", "warning")
+    except IntegrityError as e:
+        db.session.rollback()
+        conflict = _active_conflict(e)
+        metrics.booking_failures.inc(reason={"user": "already_active", "spot": "contention"}.get(conflict, "error"))
+        if conflict == "spot":
+            # The spot row said free but a stay is still open on it; reload
+            # the lot's free list from the database rather than reuse it
+            free_spots.drop(lot_id)
+            flash("Spots in this lot are being booked right now, please try again.", "warning")
+        else:
+            if held is None:
+                free_spots.push(lot_id, spot_id)
+            if conflict == "user":
+                flash("You already have an active reservation.", "warning")
+            else:
+                flash(f"Failed to book parking: {e}", "danger")
     except Exception as e:
         db.session.rollback()
-        flash("Failed to book parking: " + str(e), "danger")
+        metrics.booking_failures.inc(reason="error")
+        if spot_id is not None and held is None:
+            free_spots.push(lot_id, spot_id)
+        flash(f"Failed to book parking: {e}", "danger")
+
+    return redirect(url_for("user.dashboard"))
+
 
+@bp.route("/waitlist/<int:lot_id>")
+@user_required
+def join_waitlist(lot_id: int):
+    """Add current user to waitlist for a lot if full."""
+    user = current_identity()
+
+    if Reservation.query.filter_by(user_id=user.id, left_at=None).first():
+        flash("You already have an active reservation.", "warning")
+        return redirect(url_for("user.dashboard"))
+
+    # Already waitlisted?
+    if not waitlist_queue.join(lot_id, user.id):
+        flash("You are already on the waitlist for this lot.", "info")
+        return redirect(url_for("user.dashboard"))
+    db.session.commit()
+    metrics.waitlist_joins.inc(lot=lot_id)
+    flash("You have been added to the waitlist. We will notify you when a spot opens up.", "success")
     return redirect(url_for("user.dashboard"))
 
 
 @bp.route("/release/<int:reservation_id>")
+@user_required
 def release_parking(reservation_id: int):
-    """Release a parking spot."""
-    if not current_user.is_authenticated:
-        flash("Please login to release parking", "warning")
-        return redirect(url_for("index"))
+    """Release a parking spot and calculate cost."""
+    user = current_identity()
 
     try:
-        reservation = Reservation.query.filter_by(
-            id=reservation_id,
-            user_id=current_user.id,
-            left_at=None
+        reservation = reservations_with_lot().filter_by(
+            id=reservation_id, user_id=user.id, left_at=None
         ).first_or_404()
 
-        # Calculate duration
-        duration = datetime.utcnow() - reservation.parked_at
-        hours = duration.total_seconds() / 3600
-        cost = round(hours * reservation.spot.lot.price_per_hour, 2)
-
-        # Update reservation
+        # Bill the stay once, at release; the stored cost is what history shows
+        spot = reservation.spot
         reservation.left_at = datetime.utcnow()
-        
-        # Update spot status to available
-        spot = ParkingSpot.query.get(reservation.spot_id)
-        spot.status = "A"
-        
+        cost = tariff_book.price(spot.lot, reservation.parked_at, reservation.left_at, reservation.occupancy_pct)
+        reservation.cost_paise = cost
+
+        # Hold the spot for the head of the lot's waitlist, or free it
+        held = waitlist_queue.release(spot.lot_id, spot.id, spot.lot.name)
+
+        # Fold the closed stay into the usage rollups
+        record_stay(
+            db.session,
+            LotUsageHourly.__table__,
+            LotUsageDaily.__table__,
+            spot.lot_id,
+            reservation.parked_at,
+            reservation.left_at,
+            cost,
+        )
         db.session.commit()
-        
-        flash(f"Parking spot released successfully! Total cost: ₹{cost}", "success")
+        metrics.releases.inc(lot=spot.lot_id)
+        if not held:
+            free_spots.push(spot.lot_id, spot.id)
+            cache.invalidate("lots", "stats")
+            publish_availability(spot.lot_id)
+        else:
+            cache.invalidate("stats")
+
+        flash(f"Parking spot released successfully! Total cost: ₹{to_rupees(cost)}", "success")
     except Exception as e:
         db.session.rollback()
-        flash("Failed to release parking: " + str(e), "danger")
+        flash(f"Failed to release parking: {e}", "danger")
 
     return redirect(url_for("user.dashboard"))
+
+
+@bp.route("/notifications/read/<int:notif_id>", methods=["POST"])
+@user_required
+def mark_notification_read(notif_id: int):
+    user = current_identity()
+    # Scoped to the user's own rows, so no separate ownership lookup
+    Notification.query.filter_by(id=notif_id, user_id=user.id).update(
+        {Notification.read: True}, synchronize_session=False
+    )
+    db.session.commit()
+    return redirect(url_for("user.dashboard"))
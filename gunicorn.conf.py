@@ -0,0 +1,52 @@
+"""Gunicorn settings for Vehicle Parking App: ``gunicorn -c gunicorn.conf.py``.
+
+The app is built once in the master (``preload_app``) and forked, so
+workers share its imported code and data copy-on-write. Building it opens
+no database connections, so no socket is shared across the fork.
+
+Every open ``/api/lots/stream`` connection holds one of its worker's
+threads until it ends, so a worker serves at most ``EVENTS_MAX_STREAMS``
+of them (keep it well below ``GUNICORN_THREADS``) and closes each after
+``EVENTS_STREAM_SECONDS``; dashboards turned away poll ``/api/lots``.
+For many more live dashboards than that, serve the stream from a separate
+process with an async worker class (``gevent``/``eventlet``) rather than
+raising the cap.
+
+With ``METRICS_DIR`` set, workers share their Prometheus metrics through
+that directory; it is emptied when the server starts so totals restart
+from zero with the server, as they would in a single process, and each
+exited worker's file is folded into the totals of the dead ones.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "app:create_app()"
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+# Shared by ordinary requests and up to EVENTS_MAX_STREAMS live streams
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = True
+
+
+def on_starting(server):
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir:
+        from services.metrics import clear_directory
+
+        clear_directory(metrics_dir)
+
+
+def child_exit(server, worker):
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir:
+        from services.metrics import compact
+
+        compact(metrics_dir, worker.pid)
+
+
+def pre_fork(server, worker):
+    # Objects already in the master are never collected again, so the
+    # collector does not touch (and un-share) their pages in each worker
+    gc.freeze()
@@ -0,0 +1,70 @@
+"""Occupancy counters, waitlist holds, the notification outbox and usage rollups.
+
+Brings a database created by the original single-file app up to the
+schema the later revisions build on. Databases created with ``create_all``
+since may already have some of it: tables are created and columns added
+only where missing. The lot counters are backfilled from the spot rows, as
+``flask reconcile-counters`` does; the rollup tables start empty, so run
+``flask rollup-rebuild`` once the upgrade is done. On SQLite, databases
+whose ``waitlist.held_spot_id`` was created with its foreign key cannot be
+downgraded past this revision.
+"""
+import sqlalchemy as sa
+
+revision = "0000"
+down_revision = None
+
+COUNTERS = """
+UPDATE parking_lot SET
+    available_spots = (SELECT COUNT(*) FROM parking_spot
+                       WHERE parking_spot.lot_id = parking_lot.id AND parking_spot.status = 'A'),
+    occupied_spots = (SELECT COUNT(*) FROM parking_spot
+                      WHERE parking_spot.lot_id = parking_lot.id AND parking_spot.status IN ('O', 'H'))
+"""
+
+
+def _usage_table(op, name, bucket_type):
+    op.create_table(
+        name,
+        sa.Column("lot_id", sa.Integer, sa.ForeignKey("parking_lot.id"), primary_key=True),
+        sa.Column("bucket", bucket_type, primary_key=True),
+        sa.Column("bookings", sa.Integer, nullable=False),
+        sa.Column("occupied_minutes", sa.Float, nullable=False),
+        sa.Column("revenue", sa.Float, nullable=False),
+    )
+
+
+def upgrade(op):
+    zero = sa.text("0")
+    op.add_column("parking_lot", sa.Column("available_spots", sa.Integer, nullable=False, server_default=zero),
+                  if_not_exists=True)
+    op.add_column("parking_lot", sa.Column("occupied_spots", sa.Integer, nullable=False, server_default=zero),
+                  if_not_exists=True)
+    op.execute(COUNTERS)
+    # Plain integer: SQLite cannot drop a column that carries a constraint
+    op.add_column("waitlist", sa.Column("held_spot_id", sa.Integer, nullable=True), if_not_exists=True)
+    op.add_column("waitlist", sa.Column("hold_expires_at", sa.DateTime, nullable=True), if_not_exists=True)
+    op.create_table(
+        "notification_outbox",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("lot_id", sa.Integer, sa.ForeignKey("parking_lot.id")),
+        sa.Column("message", sa.String(255), nullable=False),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("available_at", sa.DateTime, nullable=False),
+        sa.Column("attempts", sa.Integer, nullable=False),
+        sa.Column("claim_token", sa.String(32)),
+        sa.Column("last_error", sa.String(255)),
+    )
+    _usage_table(op, "lot_usage_hourly", sa.DateTime)
+    _usage_table(op, "lot_usage_daily", sa.Date)
+
+
+def downgrade(op):
+    op.drop_table("lot_usage_daily")
+    op.drop_table("lot_usage_hourly")
+    op.drop_table("notification_outbox")
+    op.drop_column("waitlist", "hold_expires_at")
+    op.drop_column("waitlist", "held_spot_id")
+    op.drop_column("parking_lot", "occupied_spots")
+    op.drop_column("parking_lot", "available_spots")
@@ -0,0 +1,36 @@
+"""Hot-path indexes: composite lookups and partial indexes on active stays.
+
+Databases created before the models declared indexes only have their
+primary keys, so every booking, dashboard and waitlist query scanned its
+table. ``IF NOT EXISTS`` makes this a no-op for indexes already there.
+"""
+
+revision = "0001"
+down_revision = "0000"
+
+ACTIVE = "left_at IS NULL"
+
+INDEXES = [
+    # (name, table, columns, where)
+    ("ix_parking_spot_lot_status", "parking_spot", ["lot_id", "status"], None),
+    ("ix_reservation_user_parked", "reservation", ["user_id", "parked_at", "id"], None),
+    ("ix_reservation_spot", "reservation", ["spot_id"], None),
+    ("ix_reservation_active_user", "reservation", ["user_id"], ACTIVE),
+    ("ix_reservation_active_spot", "reservation", ["spot_id"], ACTIVE),
+    ("ix_waitlist_lot_queue", "waitlist", ["lot_id", "notified", "created_at", "id"], None),
+    ("ix_waitlist_hold_expires", "waitlist", ["hold_expires_at"], None),
+    ("ix_waitlist_user", "waitlist", ["user_id", "lot_id"], None),
+    ("ix_notification_user_read", "notification", ["user_id", "read", "created_at", "id"], None),
+    ("ix_notification_outbox_due", "notification_outbox", ["available_at", "id"], None),
+    ("ix_notification_outbox_claim", "notification_outbox", ["claim_token"], None),
+]
+
+
+def upgrade(op):
+    for name, table, columns, where in INDEXES:
+        op.create_index(name, table, columns, where=where)
+
+
+def downgrade(op):
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table)
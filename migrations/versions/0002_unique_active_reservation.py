@@ -0,0 +1,26 @@
+"""One active reservation per user and per spot, as unique partial indexes.
+
+Replaces the plain partial indexes of 0001, so booking can rely on the
+database rejecting a second active stay instead of checking first. The
+upgrade fails, and changes nothing, if a user or spot already has more
+than one reservation with ``left_at IS NULL``; close the extra stays first.
+"""
+
+revision = "0002"
+down_revision = "0001"
+
+ACTIVE = "left_at IS NULL"
+
+
+def upgrade(op):
+    op.create_index("uq_reservation_active_user", "reservation", ["user_id"], unique=True, where=ACTIVE)
+    op.create_index("uq_reservation_active_spot", "reservation", ["spot_id"], unique=True, where=ACTIVE)
+    op.drop_index("ix_reservation_active_user", "reservation")
+    op.drop_index("ix_reservation_active_spot", "reservation")
+
+
+def downgrade(op):
+    op.create_index("ix_reservation_active_user", "reservation", ["user_id"], where=ACTIVE)
+    op.create_index("ix_reservation_active_spot", "reservation", ["spot_id"], where=ACTIVE)
+    op.drop_index("uq_reservation_active_user", "reservation")
+    op.drop_index("uq_reservation_active_spot", "reservation")
@@ -0,0 +1,24 @@
+"""Stored cost of each reservation, in paise, and the index revenue sums use.
+
+``cost_paise`` is set when a stay is released (see ``services.billing``).
+Stays released before this revision have none; fill them in with
+``flask billing-backfill``, which prices them at their lot's current rate.
+The index, partial on released stays, covers revenue by release date and
+lot without touching the table rows.
+"""
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+
+
+def upgrade(op):
+    op.add_column("reservation", sa.Column("cost_paise", sa.Integer, nullable=True))
+    op.create_index(
+        "ix_reservation_billed", "reservation", ["left_at", "spot_id", "cost_paise"], where="left_at IS NOT NULL"
+    )
+
+
+def downgrade(op):
+    op.drop_index("ix_reservation_billed", "reservation")
+    op.drop_column("reservation", "cost_paise")
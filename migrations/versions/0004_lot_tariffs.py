@@ -0,0 +1,36 @@
+"""Tariff windows per lot, their version counter and the occupancy at booking.
+
+``tariff`` holds each lot's priced time-of-day and occupancy windows (see
+``services.tariffs``); ``parking_lot.tariff_version`` is bumped with every
+change to them so each worker knows when to recompile a lot's schedule.
+``reservation.occupancy_pct`` records how full the lot was when a stay was
+booked, which picks its tariff tier; existing stays have none and are
+priced at the lowest tier.
+"""
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+
+
+def upgrade(op):
+    op.create_table(
+        "tariff",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("lot_id", sa.Integer, sa.ForeignKey("parking_lot.id"), nullable=False),
+        sa.Column("days", sa.Integer, nullable=False),
+        sa.Column("start_minute", sa.Integer, nullable=False),
+        sa.Column("end_minute", sa.Integer, nullable=False),
+        sa.Column("min_occupancy", sa.Integer, nullable=False),
+        sa.Column("price_paise", sa.Integer, nullable=False),
+    )
+    op.create_index("ix_tariff_lot", "tariff", ["lot_id"])
+    op.add_column("parking_lot", sa.Column("tariff_version", sa.Integer, nullable=False, server_default=sa.text("0")))
+    op.add_column("reservation", sa.Column("occupancy_pct", sa.Integer, nullable=True))
+
+
+def downgrade(op):
+    op.drop_column("reservation", "occupancy_pct")
+    op.drop_column("parking_lot", "tariff_version")
+    op.drop_index("ix_tariff_lot", "tariff")
+    op.drop_table("tariff")
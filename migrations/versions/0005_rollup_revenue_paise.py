@@ -0,0 +1,27 @@
+"""Usage rollups keep revenue in integer paise instead of float rupees.
+
+``revenue_paise`` replaces the ``revenue`` column of ``lot_usage_hourly``
+and ``lot_usage_daily``; existing buckets are converted to the nearest
+paisa. Run ``flask rollup-rebuild`` afterwards to split them again exactly
+from the stored reservation costs.
+"""
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+
+TABLES = ("lot_usage_hourly", "lot_usage_daily")
+
+
+def upgrade(op):
+    for table in TABLES:
+        op.add_column(table, sa.Column("revenue_paise", sa.Integer, nullable=False, server_default=sa.text("0")))
+        op.execute(f"UPDATE {table} SET revenue_paise = CAST(ROUND(revenue * 100) AS INTEGER)")
+        op.drop_column(table, "revenue")
+
+
+def downgrade(op):
+    for table in TABLES:
+        op.add_column(table, sa.Column("revenue", sa.Float, nullable=False, server_default=sa.text("0")))
+        op.execute(f"UPDATE {table} SET revenue = revenue_paise / 100.0")
+        op.drop_column(table, "revenue_paise")
@@ -2,9 +2,13 @@
 from __future__ import annotations
 
 from datetime import datetime
+from decimal import Decimal
+from typing import Optional
 
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import check_password_hash, generate_password_hash
+
+from services.billing import stay_cost, to_rupees
+from services.passwords import passwords
 
 # Create the SQLAlchemy instance (initialised later in app factory)
 db: SQLAlchemy = SQLAlchemy()
@@ -15,6 +19,12 @@ __all__ = [
     "ParkingLot",
     "ParkingSpot",
     "Reservation",
+    "Waitlist",
+    "Notification",
+    "NotificationOutbox",
+    "LotUsageHourly",
+    "LotUsageDaily",
+    "Tariff",
 ]
 
 
@@ -23,7 +33,7 @@ class User(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     full_name = db.Column(db.String(120))
     address = db.Column(db.String(255))
     pincode = db.Column(db.String(10))
@@ -35,10 +45,10 @@ class User(db.Model):
     # Convenience helpers
     # ---------------------------------------------------------------------
     def set_password(self, password: str) -> None:  # pragma: no cover
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash(password)
 
     def check_password(self, password: str) -> bool:  # pragma: no cover
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify(self.password_hash, password)
 
 
 class ParkingLot(db.Model):
@@ -48,25 +58,189 @@ class ParkingLot(db.Model):
     address = db.Column(db.String(200), nullable=False)
     pincode = db.Column(db.String(10), nullable=False)
     max_spots = db.Column(db.Integer, nullable=False)
+    # Maintained occupancy counters so listings never have to load every spot
+    available_spots = db.Column(db.Integer, nullable=False, default=0)
+    occupied_spots = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped with every change to the lot's tariffs (services.tariffs)
+    tariff_version = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
 
     spots = db.relationship("ParkingSpot", back_populates="lot", cascade="all, delete-orphan")
+    tariffs = db.relationship("Tariff", order_by="Tariff.id", cascade="all, delete-orphan")
+
+    @property
+    def occupancy(self) -> int:
+        """Percent of the lot's spots occupied or held for a waiter."""
+        total = self.available_spots + self.occupied_spots
+        return self.occupied_spots * 100 // total if total else 100
+
+    @classmethod
+    def shift_occupancy(cls, lot_id: int, delta: int) -> None:
+        """Move ``delta`` spots from available to occupied (negative to release).
+
+        Issued as a single ``UPDATE`` with column arithmetic so concurrent
+        bookings in the same lot never overwrite each other's counts.
+        """
+        cls.query.filter_by(id=lot_id).update(
+            {
+                cls.available_spots: cls.available_spots - delta,
+                cls.occupied_spots: cls.occupied_spots + delta,
+            },
+            synchronize_session=False,
+        )
 
 
 class ParkingSpot(db.Model):
+    # Serves the free-spot lookups of the booking path
+    __table_args__ = (db.Index("ix_parking_spot_lot_status", "lot_id", "status"),)
+
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)
-    status = db.Column(db.String(1), default="A")  # A = Available, O = Occupied
+    status = db.Column(db.String(1), default="A")  # A = Available, O = Occupied, H = Held for a waiter, R = Retired
 
     lot = db.relationship("ParkingLot", back_populates="spots")
     reservation = db.relationship("Reservation", back_populates="spot", uselist=False)
 
 
+# Partial-index predicates for reservations still in progress, and released
+_ACTIVE = db.text("left_at IS NULL")
+_RELEASED = db.text("left_at IS NOT NULL")
+
+
 class Reservation(db.Model):
+    __table_args__ = (
+        # Keyset pagination of a user's history on (parked_at, id)
+        db.Index("ix_reservation_user_parked", "user_id", "parked_at", "id"),
+        # Reservations of a spot (lot deletion, spot -> reservation joins)
+        db.Index("ix_reservation_spot", "spot_id"),
+        # At most one active stay per user and per spot, enforced by the
+        # database; partial, so the ever-growing history stays out of them
+        db.Index(
+            "uq_reservation_active_user", "user_id",
+            unique=True, sqlite_where=_ACTIVE, postgresql_where=_ACTIVE,
+        ),
+        db.Index(
+            "uq_reservation_active_spot", "spot_id",
+            unique=True, sqlite_where=_ACTIVE, postgresql_where=_ACTIVE,
+        ),
+        # Revenue by release date and lot, answered from the index alone
+        db.Index(
+            "ix_reservation_billed", "left_at", "spot_id", "cost_paise",
+            sqlite_where=_RELEASED, postgresql_where=_RELEASED,
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.Integer, db.ForeignKey("parking_spot.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     parked_at = db.Column(db.DateTime, default=datetime.utcnow)
     left_at = db.Column(db.DateTime)
+    # How full the lot was when booked, in percent; picks the tariff tier
+    occupancy_pct = db.Column(db.Integer)
+    # What the stay was billed, in paise, fixed at release (services.billing)
+    cost_paise = db.Column(db.Integer)
 
     spot = db.relationship("ParkingSpot", back_populates="reservation")
     user = db.relationship("User", back_populates="reservations")
+
+    @property
+    def cost(self) -> Optional[Decimal]:
+        """Rupees billed for the stay, or ``None`` while it is active."""
+        if self.left_at is None:
+            return None
+        if self.cost_paise is None:
+            # Released before costs were stored and not backfilled yet
+            return to_rupees(stay_cost(self.parked_at, self.left_at, self.spot.lot.price_per_hour))
+        return to_rupees(self.cost_paise)
+
+
+class Waitlist(db.Model):
+    # Head-of-queue lookup per lot, the sweep for expired holds, and a
+    # user's own entries (joining, holds, withdrawal)
+    __table_args__ = (
+        db.Index("ix_waitlist_lot_queue", "lot_id", "notified", "created_at", "id"),
+        db.Index("ix_waitlist_hold_expires", "hold_expires_at"),
+        db.Index("ix_waitlist_user", "user_id", "lot_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    notified = db.Column(db.Boolean, default=False)
+    # Set while a freed spot is held for this waiter (see services.waitlist)
+    held_spot_id = db.Column(db.Integer, db.ForeignKey("parking_spot.id"))
+    hold_expires_at = db.Column(db.DateTime)
+
+
+class Notification(db.Model):
+    # Unread count and newest-first feed of one user
+    __table_args__ = (db.Index("ix_notification_user_read", "user_id", "read", "created_at", "id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"))
+    message = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read = db.Column(db.Boolean, default=False)
+
+
+class NotificationOutbox(db.Model):
+    """Notifications waiting for delivery (see services.notify)."""
+
+    __tablename__ = "notification_outbox"
+    # Dispatchers claim due rows oldest first, then fetch them by claim token
+    __table_args__ = (
+        db.Index("ix_notification_outbox_due", "available_at", "id"),
+        db.Index("ix_notification_outbox_claim", "claim_token"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"))
+    message = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    claim_token = db.Column(db.String(32))
+    last_error = db.Column(db.String(255))
+
+
+class LotUsageHourly(db.Model):
+    """Per-lot usage rolled up by hour (see services.rollups)."""
+
+    __tablename__ = "lot_usage_hourly"
+
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)  # start of the hour
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    occupied_minutes = db.Column(db.Float, nullable=False, default=0.0)
+    revenue_paise = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+
+
+class LotUsageDaily(db.Model):
+    """Per-lot usage rolled up by calendar day (see services.rollups)."""
+
+    __tablename__ = "lot_usage_daily"
+
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), primary_key=True)
+    bucket = db.Column(db.Date, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    occupied_minutes = db.Column(db.Float, nullable=False, default=0.0)
+    revenue_paise = db.Column(db.Integer, nullable=False, default=0, server_default=db.text("0"))
+
+
+class Tariff(db.Model):
+    """One priced window of a lot's weekly schedule (see services.tariffs)."""
+
+    __table_args__ = (db.Index("ix_tariff_lot", "lot_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)
+    # Weekdays as a bitmask, Monday = 1 ... Sunday = 64
+    days = db.Column(db.Integer, nullable=False, default=127)
+    # Minutes after local midnight; an end at or before the start runs past midnight
+    start_minute = db.Column(db.Integer, nullable=False)
+    end_minute = db.Column(db.Integer, nullable=False)
+    # Applies to stays booked with the lot at least this full, in percent
+    min_occupancy = db.Column(db.Integer, nullable=False, default=0)
+    price_paise = db.Column(db.Integer, nullable=False)
@@ -0,0 +1 @@
+"""Service package: in-process helpers shared by the app and controllers."""
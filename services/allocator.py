@@ -0,0 +1,123 @@
+"""Per-lot free-spot allocator for Vehicle Parking App.
+
+Each worker process keeps a min-heap of free spot ids per lot so booking
+pops the lowest free id in O(log n) instead of scanning the lot's spots.
+The heap is only a hint: the database stays the source of truth, so every
+candidate is taken through ``claim`` – an atomic conditional update – and a
+lost claim means another worker got there first. The next id on the heap
+is then tried, up to a bounded number of lost races. Rereading the whole
+lot after every loss would cost a query the size of the lot per retry and
+send every racing worker back to the same lowest id, so a heap that runs
+dry after a loss is refilled with a small window of free ids above the
+lost one, read from the ``(lot_id, status)`` index; only a heap that is
+empty to begin with is reloaded in full.
+"""
+from __future__ import annotations
+
+import heapq
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+
+__all__ = ["AllocationContention", "FreeSpotIndex", "free_spots"]
+
+T = TypeVar("T")
+
+
+class AllocationContention(Exception):
+    """Raised when every claim attempt lost a race to another booking."""
+
+
+class FreeSpotIndex:
+    """Thread-safe mapping of ``lot_id`` -> min-heap of free spot ids."""
+
+    def __init__(self) -> None:
+        self._heaps: Dict[int, List[int]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, lot_id: int, spot_ids: Iterable[int]) -> None:
+        """Replace the free list of ``lot_id`` with ``spot_ids``."""
+        heap = list(spot_ids)
+        heapq.heapify(heap)
+        with self._lock:
+            self._heaps[lot_id] = heap
+
+    def pop(self, lot_id: int) -> Optional[int]:
+        """Remove and return the lowest free spot id, or ``None``."""
+        with self._lock:
+            heap = self._heaps.get(lot_id)
+            return heapq.heappop(heap) if heap else None
+
+    def extend(self, lot_id: int, spot_ids: Iterable[int]) -> None:
+        """Add ``spot_ids`` to the free list of ``lot_id``, loading it if needed."""
+        with self._lock:
+            heap = self._heaps.setdefault(lot_id, [])
+            for spot_id in spot_ids:
+                heapq.heappush(heap, spot_id)
+
+    def push(self, lot_id: int, spot_id: int) -> None:
+        """Return a spot to the free list (no-op for lots not yet loaded)."""
+        with self._lock:
+            heap = self._heaps.get(lot_id)
+            if heap is not None:
+                heapq.heappush(heap, spot_id)
+
+    def drop(self, lot_id: int) -> None:
+        """Forget a lot entirely, e.g. after it was deleted."""
+        with self._lock:
+            self._heaps.pop(lot_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heaps.clear()
+
+    def allocate(
+        self,
+        lot_id: int,
+        load_free_ids: Callable[..., Iterable[int]],
+        claim: Callable[[int], Optional[T]],
+        max_attempts: int = 5,
+        window: int = 32,
+    ) -> Optional[T]:
+        """Claim the lowest free spot of ``lot_id``.
+
+        ``claim(spot_id)`` must atomically mark the spot taken in the
+        database and return it, or ``None`` if it was no longer free.
+        ``load_free_ids(lot_id, after=None, limit=None)`` returns free spot
+        ids in ascending order, only those above ``after`` and at most
+        ``limit`` of them when given.
+
+        A lost claim moves on to the next id on the heap; once the heap is
+        exhausted after a loss it is refilled with up to ``window`` free
+        ids above the lost one. An empty heap is reloaded in full once
+        before the lot counts as full (``None``). Raises
+        :class:`AllocationContention` after ``max_attempts`` lost claims.
+        """
+        reloaded = False
+        last_lost: Optional[int] = None
+        lost = 0
+        while True:
+            spot_id = self.pop(lot_id)
+            if spot_id is None:
+                if last_lost is not None:
+                    # Racing workers took what we knew of; look just above
+                    refill = list(load_free_ids(lot_id, after=last_lost, limit=window))
+                    last_lost = None
+                    if refill:
+                        self.extend(lot_id, refill)
+                        continue
+                if reloaded:
+                    return None
+                self.load(lot_id, load_free_ids(lot_id))
+                reloaded = True
+                continue
+            claimed = claim(spot_id)
+            if claimed is not None:
+                return claimed
+            lost += 1
+            if lost >= max_attempts:
+                raise AllocationContention(f"lot {lot_id}: {lost} claims lost")
+            last_lost = spot_id
+
+
+# Process-wide instance shared by all routes of this worker
+free_spots = FreeSpotIndex()
@@ -0,0 +1,138 @@
+"""Request-scoped identity and route guards for Vehicle Parking App.
+
+Routes only ever need the signed-in user's id and role, so instead of
+loading the ``User`` row at the top of every view the identity is resolved
+once per request and kept on ``flask.g``. With ``AUTH_SESSION_IDENTITY``
+on (the default) the role also travels in the signed session cookie and
+the database is consulted only every ``AUTH_REVALIDATE_SECONDS``, which
+bounds how long a deleted or demoted account keeps its old access.
+
+Views declare who may call them::
+
+    @app.route("/admin")
+    @admin_required
+    def admin_dashboard(): ...
+
+    @app.route("/admin/lots/<int:lot_id>/spots")
+    @admin_required(json=True)
+    def admin_lot_spots(lot_id): ...
+
+A refused HTML request is flashed and redirected to the login page; a
+``json=True`` view answers ``{"error": "Unauthorized"}`` with 403.
+"""
+from __future__ import annotations
+
+import time
+from functools import partial, wraps
+from typing import Callable, NamedTuple, Optional
+
+from flask import current_app, flash, g, redirect, session, url_for
+
+__all__ = [
+    "Identity",
+    "admin_required",
+    "current_identity",
+    "forget_identity",
+    "init_app",
+    "login_required",
+    "remember_identity",
+    "user_required",
+]
+
+
+class Identity(NamedTuple):
+    id: int
+    is_admin: bool
+
+
+_loader: Optional[Callable[[int], Optional[Identity]]] = None
+
+
+def init_app(app, load_identity: Callable[[int], Optional[Identity]]) -> None:
+    """Register how to load ``Identity(id, is_admin)`` for a user id."""
+    global _loader
+    _loader = load_identity
+    app.config.setdefault("AUTH_SESSION_IDENTITY", True)
+    app.config.setdefault("AUTH_REVALIDATE_SECONDS", 300)
+    # Where refused HTML requests are sent
+    app.config.setdefault("AUTH_LOGIN_VIEW", "auth.index")
+    # ``g`` outlives a request when an app context was already pushed
+    # (CLI, tests), so start every request unresolved
+    app.before_request(_reset_identity)
+
+
+def _reset_identity() -> None:
+    g.pop("identity", None)
+
+
+def remember_identity(user_id: int, is_admin: bool) -> Identity:
+    """Sign ``user_id`` in for this session (call on login)."""
+    identity = Identity(user_id, bool(is_admin))
+    session["user_id"] = identity.id
+    # [id, is_admin, checked_at]; trusted only while it matches user_id
+    session["auth"] = [identity.id, identity.is_admin, int(time.time())]
+    g.identity = identity
+    return identity
+
+
+def forget_identity() -> None:
+    """Sign the session out (call on logout)."""
+    for key in ("user_id", "auth"):
+        session.pop(key, None)
+    g.identity = None
+
+
+def current_identity() -> Optional[Identity]:
+    """The signed-in identity, resolved at most once per request."""
+    if "identity" in g:
+        return g.identity
+    identity = None
+    uid = session.get("user_id")
+    if uid is not None:
+        config = current_app.config
+        cached = session.get("auth") or (None, False, 0)
+        if (
+            config["AUTH_SESSION_IDENTITY"]
+            and cached[0] == uid
+            and time.time() - cached[2] < config["AUTH_REVALIDATE_SECONDS"]
+        ):
+            identity = Identity(uid, bool(cached[1]))
+        else:
+            identity = _loader(uid)
+            if identity is None:
+                forget_identity()  # account was deleted
+            elif config["AUTH_SESSION_IDENTITY"]:
+                remember_identity(*identity)
+    g.identity = identity
+    return identity
+
+
+def _deny(json: bool):
+    if json:
+        return {"error": "Unauthorized"}, 403
+    flash("Unauthorized", "danger")
+    return redirect(url_for(current_app.config["AUTH_LOGIN_VIEW"]))
+
+
+def _guard(allowed: Callable[[Optional[Identity]], bool]):
+    def decorator(view=None, *, json: bool = False):
+        if view is None:
+            return partial(decorator, json=json)
+
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if not allowed(current_identity()):
+                return _deny(json)
+            return view(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+# Any signed-in account
+login_required = _guard(lambda ident: ident is not None)
+# A signed-in driver; admins manage lots but do not book them
+user_required = _guard(lambda ident: ident is not None and not ident.is_admin)
+# A signed-in administrator
+admin_required = _guard(lambda ident: ident is not None and ident.is_admin)
@@ -0,0 +1,215 @@
+"""Shared cache layer for Vehicle Parking App.
+
+Listings and dashboard aggregates change far less often than they are
+read, so they are cached as plain data (dicts/lists, never ORM objects)
+under a *namespace*. Writers invalidate whole namespaces after they commit::
+
+    lots = cache.get_or_set("lots", "listing", load_lots)
+    ...
+    db.session.commit()
+    cache.invalidate("lots")
+
+Invalidation bumps a per-namespace version that is part of every key, so
+it is O(1) and – with the Redis backend – visible to every worker at once.
+The in-process backend is a TTL + LRU map; with several gunicorn workers
+its entries may lag other workers' writes by up to ``CACHE_DEFAULT_TTL``.
+
+Configuration (read by :meth:`Cache.init_app`):
+
+``CACHE_BACKEND``      ``memory`` (default), ``redis`` or ``null``
+``CACHE_REDIS_URL``    e.g. ``redis://localhost:6379/0``
+``CACHE_DEFAULT_TTL``  seconds, default 30
+``CACHE_MAX_ENTRIES``  LRU bound of the memory backend, default 1024
+"""
+from __future__ import annotations
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+__all__ = ["Cache", "MemoryBackend", "NullBackend", "RedisBackend", "cache"]
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """Thread-safe in-process TTL/LRU store."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def version(self, namespace: str) -> int:
+        with self._lock:
+            return self._versions.get(namespace, 0)
+
+    def bump(self, namespace: str) -> None:
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def size(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+
+class RedisBackend:
+    """Backend for a local Redis (or protocol-compatible) server.
+
+    Requires the optional ``redis`` package. Values are pickled, so only
+    point it at a server this app alone writes to.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "parking:") -> None:
+        try:
+            import redis
+        except ImportError as exc:  # pragma: no cover - optional dependency
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from exc
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self._client.get(self._prefix + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        self._client.setex(self._prefix + key, ttl, pickle.dumps(value))
+
+    def version(self, namespace: str) -> int:
+        raw = self._client.get(f"{self._prefix}ns:{namespace}")
+        return int(raw or 0)
+
+    def bump(self, namespace: str) -> None:
+        self._client.incr(f"{self._prefix}ns:{namespace}")
+
+    def size(self) -> int:
+        return -1
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(f"{self._prefix}*"):
+            self._client.delete(key)
+
+
+class NullBackend:
+    """Caches nothing; every lookup is a miss."""
+
+    name = "null"
+
+    def get(self, key: str) -> Any:
+        return _MISSING
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        pass
+
+    def version(self, namespace: str) -> int:
+        return 0
+
+    def bump(self, namespace: str) -> None:
+        pass
+
+    def size(self) -> int:
+        return 0
+
+    def clear(self) -> None:
+        pass
+
+
+class Cache:
+    """Namespaced cache front-end with hit/miss accounting."""
+
+    def __init__(self, backend=None, default_ttl: int = 30) -> None:
+        self.backend = backend or MemoryBackend()
+        self.default_ttl = default_ttl
+        self._counts = {"hits": 0, "misses": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        kind = config.get("CACHE_BACKEND", "memory")
+        if kind == "redis":
+            self.backend = RedisBackend(config.get("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        elif kind == "null":
+            self.backend = NullBackend()
+        else:
+            self.backend = MemoryBackend(int(config.get("CACHE_MAX_ENTRIES", 1024)))
+        self.default_ttl = int(config.get("CACHE_DEFAULT_TTL", 30))
+        app.extensions["cache"] = self
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{namespace}:{self.backend.version(namespace)}:{key}"
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def get_or_set(
+        self,
+        namespace: str,
+        key: str,
+        loader: Callable[[], Any],
+        ttl: Optional[int] = None,
+    ) -> Any:
+        """Return the cached value, calling ``loader`` to fill a miss."""
+        full_key = self._key(namespace, key)
+        value = self.backend.get(full_key)
+        if value is not _MISSING:
+            self._count("hits")
+            return value
+        self._count("misses")
+        value = loader()
+        self.backend.set(full_key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *namespaces: str) -> None:
+        """Drop every entry of ``namespaces`` (call after committing)."""
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+            self._count("invalidations")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["hits"] + counts["misses"]
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            **counts,
+            "hit_ratio": round(counts["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+# Process-wide instance, configured from the app by ``cache.init_app(app)``
+cache = Cache()
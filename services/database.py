@@ -0,0 +1,108 @@
+"""Engine, connection-pool and SQLite tuning for Vehicle Parking App.
+
+Flask-SQLAlchemy leaves every engine at SQLAlchemy's defaults: five pooled
+connections plus ten overflow, connections kept forever, no liveness check,
+and SQLite in rollback-journal mode, where one writer locks readers out.
+:func:`engine_options` turns the app config into
+``SQLALCHEMY_ENGINE_OPTIONS`` and :func:`init_app` applies SQLite pragmas to
+each new connection and logs the effective pool at startup.
+
+Configuration:
+
+``DB_POOL_SIZE``            persistent connections per worker, default 5
+``DB_MAX_OVERFLOW``         extra connections under load, default 10
+``DB_POOL_TIMEOUT``         seconds to wait for a free connection, default 30
+``DB_POOL_RECYCLE``         reconnect after this many seconds, default 1800
+``DB_POOL_PRE_PING``        test connections on checkout, default on
+``SQLITE_JOURNAL_MODE``     default ``WAL``: readers no longer block on a writer
+``SQLITE_SYNCHRONOUS``      default ``NORMAL``, safe with WAL and far fewer fsyncs
+``SQLITE_BUSY_TIMEOUT_MS``  wait for a write lock instead of failing, default 5000
+``SQLITE_MMAP_SIZE``        bytes of the file read through mmap, default 256 MiB
+
+Size the pool so ``workers * threads`` fit within ``DB_POOL_SIZE +
+DB_MAX_OVERFLOW``, and ``workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` stays
+below the server's connection limit. Pool sizing does not apply to in-memory
+SQLite databases, which share a single connection.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+__all__ = ["engine_options", "init_app"]
+
+
+def _is_sqlite(uri: str) -> bool:
+    return make_url(uri).get_backend_name() == "sqlite"
+
+
+def _is_memory(uri: str) -> bool:
+    return make_url(uri).database in (None, "", ":memory:")
+
+
+def engine_options(config) -> Dict[str, Any]:
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``config["SQLALCHEMY_DATABASE_URI"]``."""
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    options: Dict[str, Any] = {"pool_pre_ping": bool(config.get("DB_POOL_PRE_PING", True))}
+    if _is_sqlite(uri) and _is_memory(uri):
+        return options  # one shared connection (StaticPool); nothing to size
+    options.update(
+        pool_size=int(config.get("DB_POOL_SIZE", 5)),
+        max_overflow=int(config.get("DB_MAX_OVERFLOW", 10)),
+        pool_timeout=float(config.get("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(config.get("DB_POOL_RECYCLE", 1800)),
+    )
+    return options
+
+
+def _sqlite_pragmas(config, memory: bool) -> Dict[str, Any]:
+    pragmas: Dict[str, Any] = {
+        "synchronous": config.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    }
+    if not memory:
+        # In-memory databases have no journal file and nothing to map
+        pragmas["journal_mode"] = config.get("SQLITE_JOURNAL_MODE", "WAL")
+        pragmas["mmap_size"] = int(config.get("SQLITE_MMAP_SIZE", 268_435_456))
+    return pragmas
+
+
+def init_app(app, db) -> None:
+    """Tune ``db``'s engines for ``app``; call before the first query."""
+    with app.app_context():
+        engines = dict(db.engines)
+    for bind, engine in engines.items():
+        summary = _describe_pool(engine.pool)
+        if engine.dialect.name == "sqlite":
+            pragmas = _sqlite_pragmas(app.config, _is_memory(str(engine.url)))
+            event.listen(engine, "connect", _pragma_setter(app, pragmas))
+            summary += ", " + ", ".join(f"{k}={v}" for k, v in pragmas.items())
+        app.logger.info("Database %s: %s (%s)", bind or "default", engine.url.render_as_string(), summary)
+
+
+def _pragma_setter(app, pragmas: Dict[str, Any]):
+    def set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            mode = pragmas.get("journal_mode")
+            if mode:
+                effective = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+                if effective.lower() != str(mode).lower():
+                    # e.g. WAL is refused on network filesystems
+                    app.logger.warning("SQLite journal_mode is %s, not %s", effective, mode)
+        finally:
+            cursor.close()
+
+    return set_pragmas
+
+
+def _describe_pool(pool) -> str:
+    parts = [type(pool).__name__]
+    if hasattr(pool, "size") and hasattr(pool, "_max_overflow"):
+        parts.append(f"size={pool.size()} overflow={pool._max_overflow} timeout={pool._timeout}s")
+    parts.append(f"recycle={pool._recycle}s pre_ping={'on' if pool._pre_ping else 'off'}")
+    return " ".join(parts)
@@ -0,0 +1,161 @@
+"""Lightweight pub/sub for live availability updates.
+
+Writers publish small JSON-able payloads after they commit; every
+``/api/lots/stream`` connection of the worker holds a bounded queue fed by
+the bus. With the default in-process backend an event only reaches
+clients connected to the worker that published it; the ``redis`` backend
+relays events through a local broker so every gunicorn worker sees them.
+
+An open stream holds one of its worker's threads for as long as it lasts.
+So that dashboards cannot take every thread, a worker serves at most
+``EVENTS_MAX_STREAMS`` at once, turning further ones away (the page then
+polls ``/api/lots``), and ends each stream after ``EVENTS_STREAM_SECONDS``;
+the browser reconnects on its own and competes for a slot again.
+
+Configuration (read by :meth:`EventBus.init_app` and the stream route):
+
+``EVENTS_BACKEND``         ``memory`` (default) or ``redis``
+``EVENTS_REDIS_URL``       e.g. ``redis://localhost:6379/0``
+``EVENTS_MAX_STREAMS``     open streams per worker, default 4; keep it
+                           well below ``GUNICORN_THREADS``
+``EVENTS_STREAM_SECONDS``  lifetime of a stream, default 300
+``EVENTS_POLL_SECONDS``    polling interval of pages without a stream,
+                           default 15
+"""
+from __future__ import annotations
+
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Set
+
+__all__ = ["EventBus", "Subscription", "events", "sse_format", "stream"]
+
+CHANNEL = "parking:events"
+
+
+class Subscription:
+    """One listener's bounded inbox; the oldest event is dropped on overflow."""
+
+    def __init__(self, bus: "EventBus", maxsize: int = 256) -> None:
+        self._bus = bus
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize)
+
+    def put(self, event: Dict[str, Any]) -> None:
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Next event, or ``None`` if nothing arrived within ``timeout``."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self._bus.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class EventBus:
+    def __init__(self) -> None:
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener: Optional[threading.Thread] = None
+
+    def init_app(self, app) -> None:
+        if app.config.get("EVENTS_BACKEND", "memory") == "redis":
+            try:
+                import redis
+            except ImportError as exc:  # pragma: no cover - optional dependency
+                raise RuntimeError("EVENTS_BACKEND=redis requires the 'redis' package") from exc
+            self._redis = redis.Redis.from_url(
+                app.config.get("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+            )
+        app.extensions["events"] = self
+
+    # -- publishing --------------------------------------------------------
+    def publish(self, kind: str, data: Dict[str, Any]) -> None:
+        event = {"event": kind, "data": data}
+        if self._redis is not None:
+            self._redis.publish(CHANNEL, json.dumps(event))
+        else:
+            self._fan_out(event)
+
+    def _fan_out(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.put(event)
+
+    # -- subscribing -------------------------------------------------------
+    def subscribe(self, limit: Optional[int] = None) -> Optional[Subscription]:
+        """A new subscription, or ``None`` if ``limit`` are already open."""
+        sub = Subscription(self)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(sub)
+        if self._redis is not None:
+            self._ensure_listener()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def _ensure_listener(self) -> None:
+        """Start the per-process thread relaying broker messages locally."""
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(
+                target=self._relay, name="events-relay", daemon=True
+            )
+            self._listener.start()
+
+    def _relay(self) -> None:  # pragma: no cover - needs a broker
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        for message in pubsub.listen():
+            self._fan_out(json.loads(message["data"]))
+
+
+def sse_format(kind: str, data: Any) -> str:
+    """Serialise one Server-Sent Events frame."""
+    return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(sub: Subscription, keepalive: float = 15.0, lifetime: Optional[float] = None) -> Iterator[str]:
+    """Yield SSE frames from ``sub`` until the client disconnects or ``lifetime`` ends."""
+    deadline = None if lifetime is None else time.monotonic() + lifetime
+    try:
+        while True:
+            remaining = keepalive if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = sub.get(timeout=min(keepalive, remaining))
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield sse_format(event["event"], event["data"])
+    finally:
+        sub.close()
+
+
+# Process-wide bus, configured from the app by ``events.init_app(app)``
+events = EventBus()
@@ -0,0 +1,440 @@
+"""Prometheus metrics for Vehicle Parking App.
+
+Counters and histograms live in memory and are updated where things
+happen: bookings, releases and waitlist joins in the user controllers,
+request counts and latency in a request hook. ``/metrics`` serves them in
+the Prometheus text exposition format together with gauges read at scrape
+time (see ``controllers/metrics.py``)::
+
+    metrics.bookings.inc(lot=lot_id)
+    metrics.request_seconds.observe(0.012, method="GET", route="/user")
+
+Under gunicorn every worker has its own memory, so with ``METRICS_DIR``
+set each process also writes its values to ``<dir>/<pid>.json`` (at most
+every ``METRICS_FLUSH_SECONDS``, and before each scrape). A scrape sums
+counters and histograms over every file, and gauges (e.g. checked out pool
+connections) over the processes still alive. The counters and histograms
+of exited processes are folded into ``<dir>/dead.json`` and their files
+removed – by gunicorn's ``child_exit`` hook, by the next scrape, or by a
+new process that was handed the same pid – so totals never go backwards
+and the directory holds one file per live worker. This is the
+multiprocess mode of the official client, without the dependency. Point
+every worker at the same empty directory; ``gunicorn.conf.py`` empties it
+when the server starts.
+
+Configuration (read by :meth:`Metrics.init_app`):
+
+``METRICS_ENABLED``        serve ``/metrics`` and time requests, default on
+``METRICS_DIR``            shared directory for multiprocess mode, default off
+``METRICS_FLUSH_SECONDS``  how stale another worker's values may be, default 1
+``METRICS_TOKEN``          if set, scrapes need ``Authorization: Bearer <token>``
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flask import has_app_context, request
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX; no multiprocess servers there
+    fcntl = None
+
+__all__ = ["Counter", "Gauge", "Histogram", "Metrics", "clear_directory", "compact", "metrics"]
+
+# Latency buckets of the official client, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+# Summed counters and histograms of every process that has exited
+DEAD_TOTALS = "dead.json"
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], lock: threading.Lock) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._values: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """A total that only goes up; summed over every process that ever ran."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A current value per process; summed over the live processes."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative ``le`` buckets, with sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            # [per-bucket counts..., +Inf count, sum]
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+
+class Metrics:
+    """The app's metrics, plus their multiprocess store and text rendering."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self.enabled = False
+        self.directory: Optional[str] = None
+        self.flush_seconds = 1.0
+        self.token = ""
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        self._pending: Optional[threading.Timer] = None
+        self._flushed_pid: Optional[int] = None
+        self._db = None
+
+        self.bookings = self.counter("parking_bookings_total", "Spots booked.", ["lot"])
+        self.booking_failures = self.counter(
+            "parking_booking_failures_total",
+            "Booking attempts turned away (full, contention, already_active, error).",
+            ["reason"],
+        )
+        self.releases = self.counter("parking_releases_total", "Spots released.", ["lot"])
+        self.waitlist_joins = self.counter("parking_waitlist_joins_total", "Users added to a waitlist.", ["lot"])
+        self.requests = self.counter(
+            "http_requests_total", "HTTP requests served.", ["method", "route", "status"]
+        )
+        self.request_seconds = self.histogram(
+            "http_request_duration_seconds", "Time to produce a response.", ["method", "route"]
+        )
+        self.pool_size = self.gauge("db_pool_size", "Persistent connections the pools may keep.", [])
+        self.pool_checked_out = self.gauge("db_pool_checked_out", "Connections in use.", [])
+        self.pool_overflow = self.gauge("db_pool_overflow", "Connections open beyond the pool size.", [])
+
+    # -- definition --------------------------------------------------------
+    def _add(self, metric: _Metric) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str]) -> Counter:
+        return self._add(Counter(name, documentation, labelnames, self._lock))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str]) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames, self._lock))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, lock=self._lock, buckets=buckets))
+
+    # -- app wiring --------------------------------------------------------
+    def init_app(self, app, db) -> None:
+        config = app.config
+        self.enabled = bool(config.get("METRICS_ENABLED", True))
+        self.directory = config.get("METRICS_DIR") or None
+        self.flush_seconds = float(config.get("METRICS_FLUSH_SECONDS", 1))
+        self.token = config.get("METRICS_TOKEN", "")
+        self._db = db
+        if not self.enabled:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self) -> None:
+        request.environ["metrics.started"] = time.perf_counter()
+
+    def _after_request(self, response):
+        started = request.environ.get("metrics.started")
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            self.requests.inc(method=request.method, route=route, status=response.status_code)
+            self.request_seconds.observe(time.perf_counter() - started, method=request.method, route=route)
+        if self.directory:
+            self._sample_pools()
+            self._schedule_flush()
+        return response
+
+    def _sample_pools(self) -> None:
+        if self._db is None or not has_app_context():
+            return
+        size = checked_out = overflow = 0
+        for engine in self._db.engines.values():
+            pool = engine.pool
+            if hasattr(pool, "size") and hasattr(pool, "overflow"):
+                size += pool.size()
+                overflow += max(pool.overflow(), 0)
+            if hasattr(pool, "checkedout"):
+                checked_out += pool.checkedout()
+        self.pool_size.set(size)
+        self.pool_checked_out.set(checked_out)
+        self.pool_overflow.set(overflow)
+
+    # -- multiprocess store ------------------------------------------------
+    def _snapshot(self) -> Dict[str, Any]:
+        return {name: {"type": m.type, "samples": m.snapshot()} for name, m in self._metrics.items()}
+
+    def _schedule_flush(self) -> None:
+        """Flush within ``METRICS_FLUSH_SECONDS``, batching the updates made meanwhile.
+
+        A timer rather than a check on the next request, so the last
+        updates before a worker goes idle still reach the directory.
+        """
+        with self._flush_lock:
+            if self._pending is not None:
+                return
+            delay = max(0.0, self.flush_seconds - (time.monotonic() - self._flushed_at))
+            self._pending = threading.Timer(delay, self._flush_pending)
+            self._pending.daemon = True
+            self._pending.start()
+
+    def _flush_pending(self) -> None:
+        with self._flush_lock:
+            self._pending = None
+        self.flush()
+
+    def flush(self) -> None:
+        """Write this process's values to ``<METRICS_DIR>/<pid>.json``."""
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            pid = os.getpid()
+            if self._flushed_pid != pid:
+                # A file already there was left by an exited process that had
+                # this pid before us; keep its totals before overwriting it
+                compact(self.directory, pid)
+                self._flushed_pid = pid
+            _write(os.path.join(self.directory, f"{pid}.json"), {"pid": pid, "metrics": self._snapshot()})
+
+    def _snapshots(self) -> List[Tuple[bool, Dict[str, Any]]]:
+        """``(alive, metrics)`` of every process: this one, or all in the directory.
+
+        Exited processes come as one entry, their folded totals.
+        """
+        self._sample_pools()
+        if not self.directory:
+            return [(True, self._snapshot())]
+        self.flush()
+        snapshots = []
+        with _locked(self.directory):
+            for filename in os.listdir(self.directory):
+                path = os.path.join(self.directory, filename)
+                if filename == DEAD_TOTALS or not filename.endswith(".json"):
+                    continue
+                data = _read(path)
+                if data is not None and not _alive(data["pid"]):
+                    _fold_into_dead(self.directory, path, data)
+                elif data is not None:
+                    snapshots.append((True, data["metrics"]))
+            dead = _read(os.path.join(self.directory, DEAD_TOTALS))
+        if dead is not None:
+            snapshots.append((False, dead["metrics"]))
+        return snapshots
+
+    def collect(self) -> Dict[str, Dict[LabelValues, Any]]:
+        """Values of every metric, aggregated over processes."""
+        merged: Dict[str, Dict[LabelValues, Any]] = {name: {} for name in self._metrics}
+        for alive, snapshot in self._snapshots():
+            for name, data in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None or (metric.type == "gauge" and not alive):
+                    continue
+                values = merged[name]
+                for key, value in data["samples"]:
+                    key = tuple(key)
+                    if metric.type == "histogram":
+                        current = values.get(key)
+                        values[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return merged
+
+    # -- exposition --------------------------------------------------------
+    def render(self, extra: Sequence[Tuple[str, str, str, Sequence[str], Dict[LabelValues, float]]] = ()) -> str:
+        """Text exposition of every metric, plus ``extra`` scrape-time gauges.
+
+        ``extra`` items are ``(name, type, help, labelnames, {labels: value})``.
+        """
+        lines: List[str] = []
+        collected = self.collect()
+        families = [(m.name, m.type, m.documentation, m.labelnames, collected[m.name], m) for m in self._metrics.values()]
+        families += [(name, kind, doc, tuple(labelnames), values, None) for name, kind, doc, labelnames, values in extra]
+        for name, kind, documentation, labelnames, values, metric in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values.items()):
+                labels = list(zip(labelnames, key))
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Forget this process's values (tests and benchmarks)."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Sequence[Tuple[str, Any]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None  # removed meanwhile, or never written
+
+
+def _write(path: str, data: Dict[str, Any]) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _locked(directory: str):
+    """Serialise folding files into the dead totals across processes."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, ".lock"), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _fold(totals: Dict[str, Any], snapshot: Dict[str, Any]) -> None:
+    """Add the counters and histograms of ``snapshot`` into ``totals``, both as flushed."""
+    for name, data in snapshot.items():
+        if data["type"] == "gauge":
+            continue
+        family = totals.setdefault(name, {"type": data["type"], "samples": []})
+        samples = {tuple(key): value for key, value in family["samples"]}
+        for key, value in data["samples"]:
+            key = tuple(key)
+            current = samples.get(key)
+            if current is None:
+                samples[key] = value
+            elif data["type"] == "histogram":
+                samples[key] = [a + b for a, b in zip(current, value)]
+            else:
+                samples[key] = current + value
+        family["samples"] = [[list(key), value] for key, value in samples.items()]
+
+
+def _fold_into_dead(directory: str, path: str, data: Dict[str, Any]) -> None:
+    # Callers hold _locked(directory)
+    dead_path = os.path.join(directory, DEAD_TOTALS)
+    dead = _read(dead_path) or {"pid": None, "metrics": {}}
+    _fold(dead["metrics"], data["metrics"])
+    _write(dead_path, dead)
+    os.remove(path)
+
+
+def compact(directory: str, pid: int) -> None:
+    """Fold the file of exited process ``pid`` into the dead-process totals.
+
+    Gunicorn's ``child_exit`` hook calls this for every worker that exits.
+    """
+    path = os.path.join(directory, f"{pid}.json")
+    with _locked(directory):
+        data = _read(path)
+        if data is not None:
+            _fold_into_dead(directory, path, data)
+
+
+def clear_directory(directory: str) -> None:
+    """Remove the per-process files of a previous server run."""
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.endswith((".json", ".tmp")):
+                os.remove(os.path.join(directory, filename))
+
+
+# Process-wide instance, configured by ``metrics.init_app(app, db)``
+metrics = Metrics()
@@ -0,0 +1,262 @@
+"""Versioned schema migrations for Vehicle Parking App.
+
+A small Alembic-style runner. Each file in ``migrations/versions`` is one
+revision::
+
+    revision = "0002"
+    down_revision = "0001"
+
+    def upgrade(op): op.create_index("ix_x", "table", ["col"])
+    def downgrade(op): op.drop_index("ix_x", "table")
+
+The revision a database is at is kept in a one-row ``schema_version``
+table, and every revision is applied in its own transaction together with
+the version bump. Operations are rendered through SQLAlchemy for the
+target dialect, so the same revision runs against SQLite and PostgreSQL,
+and can be turned into a plain SQL script without connecting (*offline*
+mode) for a DBA to review and apply::
+
+    flask db upgrade                            # online, to the newest revision
+    flask db upgrade --sql --dialect postgresql # print the script instead
+    flask db downgrade 0001
+    flask db current / flask db history / flask db stamp head
+
+``flask init-db`` builds a new database straight from the models and
+stamps it with the newest revision; existing databases are upgraded.
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateIndex, DDLElement, DropIndex
+
+__all__ = ["MigrationError", "Migrator", "Operations"]
+
+VERSION_TABLE = sa.Table(
+    "schema_version",
+    sa.MetaData(),
+    sa.Column("version_num", sa.String(32), primary_key=True),
+)
+
+
+class MigrationError(Exception):
+    """Raised for a broken revision chain or an unknown target revision."""
+
+
+class _AddColumn(DDLElement):
+    def __init__(self, column: sa.Column, if_not_exists: bool = False) -> None:
+        self.column = column
+        self.if_not_exists = if_not_exists
+
+
+class _DropColumn(DDLElement):
+    def __init__(self, column: sa.Column) -> None:
+        self.column = column
+
+
+@compiles(_AddColumn)
+def _compile_add_column(element, compiler, **kw):
+    table = compiler.preparer.format_table(element.column.table)
+    exists = " IF NOT EXISTS" if element.if_not_exists else ""
+    return f"ALTER TABLE {table} ADD COLUMN{exists} {compiler.get_column_specification(element.column)}"
+
+
+@compiles(_DropColumn)
+def _compile_drop_column(element, compiler, **kw):
+    table = compiler.preparer.format_table(element.column.table)
+    return f"ALTER TABLE {table} DROP COLUMN {compiler.preparer.format_column(element.column)}"
+
+
+class Operations:
+    """What a revision's ``upgrade``/``downgrade`` may do, for one dialect."""
+
+    def __init__(
+        self,
+        dialect: Dialect,
+        emit: Callable[[sa.sql.ClauseElement], None],
+        connection: Optional[Connection] = None,
+    ) -> None:
+        self.dialect = dialect
+        self._emit = emit
+        # None offline, where the database cannot be looked at
+        self._connection = connection
+
+    @staticmethod
+    def _index(name: str, table: str, columns: Sequence[str], unique: bool, where: Optional[str]) -> sa.Index:
+        # A throwaway table: revisions must not depend on today's models
+        t = sa.Table(table, sa.MetaData(), *(sa.Column(c) for c in columns))
+        kwargs = {}
+        if where is not None:
+            # Partial index; SQLite and PostgreSQL only
+            kwargs = {"sqlite_where": sa.text(where), "postgresql_where": sa.text(where)}
+        return sa.Index(name, *(t.c[c] for c in columns), unique=unique, **kwargs)
+
+    def create_index(
+        self,
+        name: str,
+        table: str,
+        columns: Sequence[str],
+        unique: bool = False,
+        where: Optional[str] = None,
+    ) -> None:
+        """``CREATE INDEX IF NOT EXISTS``, optionally ``UNIQUE`` and/or partial."""
+        self._emit(CreateIndex(self._index(name, table, columns, unique, where), if_not_exists=True))
+
+    def drop_index(self, name: str, table: str) -> None:
+        self._emit(DropIndex(sa.Index(name, _table=sa.Table(table, sa.MetaData())), if_exists=True))
+
+    def add_column(self, table: str, column: sa.Column, if_not_exists: bool = False) -> None:
+        """``ALTER TABLE ... ADD COLUMN``; give it a ``server_default`` if not nullable.
+
+        With ``if_not_exists`` a column the table already has is left alone.
+        SQLite has no ``ADD COLUMN IF NOT EXISTS``, so offline SQLite scripts
+        always add it.
+        """
+        sa.Table(table, sa.MetaData(), column)
+        if if_not_exists and self._connection is not None:
+            if column.name in {c["name"] for c in sa.inspect(self._connection).get_columns(table)}:
+                return
+        self._emit(_AddColumn(column, if_not_exists and self.dialect.name == "postgresql"))
+
+    def drop_column(self, table: str, name: str) -> None:
+        """``ALTER TABLE ... DROP COLUMN``; drop its indexes first (SQLite 3.35+)."""
+        self._emit(_DropColumn(sa.Table(table, sa.MetaData(), sa.Column(name)).c[name]))
+
+    def create_table(self, name: str, *columns: sa.Column) -> None:
+        """``CREATE TABLE IF NOT EXISTS``; ``ForeignKey("table.column")`` targets must exist."""
+        metadata = sa.MetaData()
+        for column in columns:
+            for fk in column.foreign_keys:
+                # Stand-ins, so the constraint can name the tables it references
+                target, _, key = fk.target_fullname.rpartition(".")
+                if target not in metadata.tables:
+                    sa.Table(target, metadata, sa.Column(key, primary_key=True))
+        self._emit(sa.schema.CreateTable(sa.Table(name, metadata, *columns), if_not_exists=True))
+
+    def drop_table(self, name: str) -> None:
+        self._emit(sa.schema.DropTable(sa.Table(name, sa.MetaData()), if_exists=True))
+
+    def execute(self, sql: str) -> None:
+        self._emit(sa.text(sql))
+
+
+class Migrator:
+    """Loads the revision chain from ``directory`` and moves databases along it."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._revisions: Optional[List[ModuleType]] = None
+
+    # -- revision chain ----------------------------------------------------
+    @property
+    def revisions(self) -> List[ModuleType]:
+        """Revisions oldest first."""
+        if self._revisions is None:
+            self._revisions = self._load()
+        return self._revisions
+
+    def _load(self) -> List[ModuleType]:
+        by_parent: Dict[Optional[str], ModuleType] = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".py") or filename.startswith("_"):
+                continue
+            path = os.path.join(self.directory, filename)
+            spec = importlib.util.spec_from_file_location(f"_migration_{filename[:-3]}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            if module.down_revision in by_parent:
+                raise MigrationError(
+                    f"revisions {by_parent[module.down_revision].revision} and "
+                    f"{module.revision} both follow {module.down_revision}"
+                )
+            by_parent[module.down_revision] = module
+        chain, parent = [], None
+        while parent in by_parent:
+            chain.append(by_parent.pop(parent))
+            parent = chain[-1].revision
+        if by_parent:
+            orphans = ", ".join(m.revision for m in by_parent.values())
+            raise MigrationError(f"revisions not connected to the chain: {orphans}")
+        return chain
+
+    @property
+    def head(self) -> Optional[str]:
+        return self.revisions[-1].revision if self.revisions else None
+
+    def _position(self, revision: Optional[str]) -> int:
+        """Number of revisions applied when a database is at ``revision``."""
+        if revision in (None, "base"):
+            return 0
+        if revision == "head":
+            return len(self.revisions)
+        for i, module in enumerate(self.revisions):
+            if module.revision == revision:
+                return i + 1
+        raise MigrationError(f"unknown revision {revision!r}")
+
+    def _steps(self, start: Optional[str], target: str):
+        """``(module, direction)`` pairs leading from ``start`` to ``target``."""
+        here, there = self._position(start), self._position(target)
+        if there >= here:
+            return [(m, "upgrade") for m in self.revisions[here:there]]
+        return [(m, "downgrade") for m in reversed(self.revisions[there:here])]
+
+    # -- online ------------------------------------------------------------
+    def current(self, connection: Connection) -> Optional[str]:
+        if not sa.inspect(connection).has_table(VERSION_TABLE.name):
+            return None
+        return connection.execute(sa.select(VERSION_TABLE.c.version_num)).scalar()
+
+    def _set_version(self, connection: Connection, revision: Optional[str]) -> None:
+        VERSION_TABLE.create(connection, checkfirst=True)
+        connection.execute(VERSION_TABLE.delete())
+        if revision is not None:
+            connection.execute(VERSION_TABLE.insert().values(version_num=revision))
+
+    def migrate(self, engine: sa.Engine, target: str = "head") -> List[str]:
+        """Apply the revisions between the database's version and ``target``.
+
+        Returns the revisions applied (or reverted), in order.
+        """
+        with engine.connect() as connection:
+            start = self.current(connection)
+        done = []
+        for module, direction in self._steps(start, target):
+            with engine.begin() as connection:
+                getattr(module, direction)(Operations(connection.dialect, connection.execute, connection))
+                self._set_version(connection, module.revision if direction == "upgrade" else module.down_revision)
+            done.append(module.revision)
+        return done
+
+    def stamp(self, engine: sa.Engine, revision: str = "head") -> None:
+        """Record ``revision`` without running anything (for ``create_all`` databases)."""
+        position = self._position(revision)
+        with engine.begin() as connection:
+            self._set_version(connection, self.revisions[position - 1].revision if position else None)
+
+    # -- offline -----------------------------------------------------------
+    def script(self, dialect: Dialect, start: Optional[str], target: str = "head") -> str:
+        """The SQL that :meth:`migrate` would run from ``start``, without a database."""
+        lines: List[str] = []
+
+        def emit(element) -> None:
+            lines.append(f"{str(element.compile(dialect=dialect)).strip()};")
+
+        for module, direction in self._steps(start, target):
+            lines.append(f"-- {direction} {module.revision}: {module.__doc__.strip().splitlines()[0]}")
+            getattr(module, direction)(Operations(dialect, emit))
+            revision = module.revision if direction == "upgrade" else module.down_revision
+            emit(VERSION_TABLE.delete())
+            if revision is not None:
+                lines.append(f"INSERT INTO {VERSION_TABLE.name} (version_num) VALUES ('{revision}');")
+            lines.append("")
+        if lines:
+            create = str(sa.schema.CreateTable(VERSION_TABLE, if_not_exists=True).compile(dialect=dialect)).strip()
+            lines.insert(0, f"{create};\n")
+        return "\n".join(lines)
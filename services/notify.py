@@ -0,0 +1,202 @@
+"""Asynchronous notification delivery through a transactional outbox.
+
+Request handlers never write ``Notification`` rows themselves. They add a
+row to the outbox table in the same transaction as the change that caused
+it (a waitlist hold, say), so the message exists if and only if that
+change committed, and the request finishes with a single commit.
+
+A dispatcher then moves outbox rows into notifications in batches:
+
+1. *claim* – one ``UPDATE`` leases up to ``NOTIFY_BATCH_SIZE`` due rows to
+   this dispatcher (a token, ``available_at`` pushed out by the lease, one
+   more attempt) and commits, so parallel dispatchers never share a row;
+2. *deliver* – the claimed rows are bulk-inserted as notifications and
+   deleted from the outbox in one transaction.
+
+A dispatcher that crashes mid-batch leaves its rows to be re-claimed when
+the lease runs out, and a failed delivery is retried with exponential
+backoff until ``NOTIFY_MAX_ATTEMPTS`` – delivery is at-least-once. Rows
+that use up their attempts are logged as an error and left in the outbox,
+with ``last_error`` set, for an operator to inspect and requeue.
+
+``NOTIFY_MODE`` selects who dispatches:
+
+``thread``  (default) a daemon thread per worker, polling every
+            ``NOTIFY_POLL_SECONDS`` and woken at the end of each request
+            that queued something
+``worker``  a separate ``flask notify-worker`` process; requests only enqueue
+``inline``  drained at the end of the request that queued it (tests, debugging)
+
+Call sites need no changes: :meth:`OutboxDispatcher.init_app` watches the
+session for flushed outbox rows and wakes the dispatcher after the request.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+from sqlalchemy import event
+
+__all__ = ["OutboxDispatcher"]
+
+log = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Moves ``outbox`` rows into ``notification`` rows, in batches."""
+
+    def __init__(self, db, outbox, notification, lease_seconds: int = 60) -> None:
+        self.db = db
+        self.outbox = outbox
+        self.notification = notification
+        self.lease_seconds = lease_seconds
+        self._app = None
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self._app = app
+        event.listen(self.db.session, "after_flush", self._on_flush)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions["notify"] = self
+
+    def _config(self, key: str, default):
+        app = self._app or current_app
+        return type(default)(app.config.get(key, default))
+
+    def _on_flush(self, session, flush_context) -> None:
+        if any(isinstance(obj, self.outbox) for obj in session.new):
+            session.info["notify_pending"] = True
+
+    def _before_request(self) -> None:
+        # Restarted or freshly forked workers pick up rows queued meanwhile
+        if self._config("NOTIFY_MODE", "thread") == "thread":
+            self._ensure_thread()
+
+    def _after_request(self, response):
+        if self.db.session.info.pop("notify_pending", False):
+            self.wake()
+        return response
+
+    # -- one batch ---------------------------------------------------------
+    def drain_once(self, now: Optional[datetime] = None) -> int:
+        """Claim and deliver one batch; returns the number delivered."""
+        O = self.outbox
+        session = self.db.session
+        now = now or datetime.utcnow()
+        token = uuid.uuid4().hex
+        max_attempts = self._config("NOTIFY_MAX_ATTEMPTS", 5)
+        due = (
+            self.db.select(O.id)
+            .where(O.available_at <= now, O.attempts < max_attempts)
+            .order_by(O.id)
+            .limit(self._config("NOTIFY_BATCH_SIZE", 100))
+        )
+        claimed = O.query.filter(O.id.in_(due), O.available_at <= now).update(
+            {
+                O.claim_token: token,
+                O.available_at: now + timedelta(seconds=self.lease_seconds),
+                O.attempts: O.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+        session.commit()
+        if not claimed:
+            return 0
+
+        rows = (
+            session.query(O.id, O.user_id, O.lot_id, O.message, O.created_at, O.attempts)
+            .filter_by(claim_token=token)
+            .all()
+        )
+        try:
+            session.execute(
+                self.notification.__table__.insert(),
+                [
+                    {"user_id": r.user_id, "lot_id": r.lot_id, "message": r.message,
+                     "created_at": r.created_at, "read": False}
+                    for r in rows
+                ],
+            )
+            O.query.filter_by(claim_token=token).delete(synchronize_session=False)
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            retry_at = now + timedelta(seconds=min(2 ** max(r.attempts for r in rows), 300))
+            O.query.filter_by(claim_token=token).update(
+                {O.available_at: retry_at, O.claim_token: None, O.last_error: str(exc)[:255]},
+                synchronize_session=False,
+            )
+            session.commit()
+            log.warning("Notification batch of %d failed, retrying at %s: %s", len(rows), retry_at, exc)
+            exhausted = [r.id for r in rows if r.attempts >= max_attempts]
+            if exhausted:
+                log.error(
+                    "Giving up on outbox rows %s after %d attempts; they stay in notification_outbox",
+                    exhausted, max_attempts,
+                )
+            return 0
+        return len(rows)
+
+    def drain(self) -> int:
+        """Deliver batches until the outbox has nothing due."""
+        total = 0
+        while True:
+            delivered = self.drain_once()
+            total += delivered
+            if delivered < self._config("NOTIFY_BATCH_SIZE", 100):
+                return total
+
+    # -- dispatch modes ----------------------------------------------------
+    def wake(self) -> None:
+        """Signal that something was enqueued (call after committing)."""
+        mode = self._config("NOTIFY_MODE", "thread")
+        if mode == "inline":
+            self.drain()
+        elif mode == "thread":
+            self._ensure_thread()
+            self._wake.set()
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            # A forked gunicorn worker inherits the attribute, not the thread
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._app = self._app or current_app._get_current_object()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="notify-dispatcher", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:  # pragma: no cover - background thread
+        poll = self._config("NOTIFY_POLL_SECONDS", 2.0)
+        while True:
+            self._wake.wait(poll)
+            self._wake.clear()
+            with self._app.app_context():
+                try:
+                    self.drain()
+                except Exception:
+                    self.db.session.rollback()
+                    log.exception("Notification dispatch failed")
+
+    def run_forever(self, stop: Optional[threading.Event] = None) -> None:  # pragma: no cover
+        """Drain continuously in the current app context (``flask notify-worker``)."""
+        poll = self._config("NOTIFY_POLL_SECONDS", 2.0)
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                delivered = self.drain()
+            except Exception:
+                self.db.session.rollback()
+                log.exception("Notification dispatch failed")
+                delivered = 0
+            if not delivered:
+                stop.wait(poll)
@@ -0,0 +1,51 @@
+"""Keyset (cursor) pagination for Vehicle Parking App.
+
+History lists are ordered newest first by ``(parked_at, id)``. Instead of
+``OFFSET`` – which makes the database walk every skipped row – each page
+ends with an opaque cursor holding the last row's key, and the next page
+starts strictly after it. With an index on ``(user_id, parked_at, id)``
+fetching page 500 costs the same as fetching page 1.
+"""
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+__all__ = ["encode_cursor", "decode_cursor", "keyset_page"]
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Return ``(ts, id)`` or ``None`` for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(query, ts_col, id_col, cursor: Optional[str], limit: int) -> Tuple[List, Optional[str]]:
+    """Fetch one newest-first page of ``query``.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is ``None`` on the last
+    page. An invalid cursor restarts from the newest row.
+    """
+    key = decode_cursor(cursor)
+    if key is not None:
+        query = query.filter(tuple_(ts_col, id_col) < tuple_(*key))
+    rows = query.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
@@ -0,0 +1,149 @@
+"""Password hashing with configurable cost and off-thread verification.
+
+A single PBKDF2/scrypt verification costs tens to hundreds of milliseconds
+of CPU. Done inline it pins the request's worker for that long. Here
+hashing and verification run in a small bounded pool per app process
+instead, and callers that cannot get a turn within the timeout get
+:class:`HasherBusy` rather than piling up behind a burst of logins.
+
+The default pool is one thread per app process. ``hashlib`` releases the
+GIL while it hashes, so the worker's other threads keep serving requests
+meanwhile, and gunicorn's ``2 x CPUs + 1`` workers then hash at most about
+two passwords per core between them. Every app process starts a pool of
+its own, so keep ``workers x PASSWORD_VERIFY_WORKERS`` near the core count.
+A ``process`` pool is worth opting into only with few app processes on a
+many-core machine, e.g. a single process with one hasher per core.
+
+Configuration (read by :meth:`PasswordHasher.init_app`):
+
+``PASSWORD_HASH_METHOD``      Werkzeug method, e.g. ``pbkdf2:sha256:600000``
+                              (default) or ``scrypt:32768:8:1``
+``PASSWORD_SALT_LENGTH``      default 16
+``PASSWORD_VERIFY_WORKERS``   pool size per app process, default 1; ``0``
+                              hashes inline
+``PASSWORD_VERIFY_EXECUTOR``  ``thread`` (default) or ``process``
+``PASSWORD_VERIFY_QUEUE``     hashes allowed to wait for the pool, default
+                              4 per worker; beyond that :class:`HasherBusy`
+
+Hashes made with other settings keep working; :meth:`needs_rehash` tells
+the login path to upgrade them once the password is known.
+
+As with any process pool, a ``process`` pool's workers re-import the
+``__main__`` module: scripts that hash passwords with one need an
+``if __name__ == "__main__"`` guard.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent import futures
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+__all__ = ["HasherBusy", "PasswordHasher", "passwords"]
+
+
+class HasherBusy(Exception):
+    """Raised when a hash cannot start or finish within ``timeout`` seconds."""
+
+
+def _mp_context():
+    # Workers forked from a small server process neither inherit the app's
+    # threads and locks (unlike "fork") nor pay interpreter start-up each
+    # (unlike "spawn")
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["werkzeug.security"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords with the app's configured method and pool."""
+
+    def __init__(self) -> None:
+        self.method = "pbkdf2:sha256:600000"
+        self.salt_length = 16
+        self.workers = 0
+        self.executor_kind = "thread"
+        self.timeout = 10.0
+        self._prefix: Optional[Tuple[str, int]] = None
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._executor: Optional[Executor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.shutdown()
+        self.method = config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+        self.salt_length = int(config.get("PASSWORD_SALT_LENGTH", 16))
+        self.workers = int(config.get("PASSWORD_VERIFY_WORKERS", 1))
+        self.executor_kind = config.get("PASSWORD_VERIFY_EXECUTOR", "thread")
+        self.timeout = float(config.get("PASSWORD_VERIFY_TIMEOUT", 10))
+        queue = int(config.get("PASSWORD_VERIFY_QUEUE", 4 * max(self.workers, 1)))
+        self._slots = threading.BoundedSemaphore(self.workers + queue) if self.workers else None
+        self._prefix = None
+        app.extensions["passwords"] = self
+
+    def _current_prefix(self) -> Tuple[str, int]:
+        # Werkzeug fills in default parameters ("pbkdf2" -> "pbkdf2:sha256:600000"),
+        # so compare against what it actually writes for this configuration.
+        # That costs a full hash, so it is worked out on first use, not at startup
+        if self._prefix is None:
+            stored_method, salt, _ = generate_password_hash("", self.method, self.salt_length).split("$", 2)
+            self._prefix = (stored_method, len(salt))
+        return self._prefix
+
+    # -- pool --------------------------------------------------------------
+    def _pool(self) -> Executor:
+        with self._lock:
+            # Forked gunicorn workers must not share their parent's pool
+            if self._executor is None or self._pid != os.getpid():
+                if self.executor_kind == "thread":
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="passwords")
+                else:
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=_mp_context())
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy("password verification queue is full")
+        try:
+            future = self._pool().submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            # Not the builtin TimeoutError before Python 3.11
+            except futures.TimeoutError:
+                future.cancel()
+                raise HasherBusy("password verification timed out") from None
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # -- hashing -----------------------------------------------------------
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored: str, password: str) -> bool:
+        return self._run(check_password_hash, stored, password)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """Whether ``stored`` was made with other settings than the current ones."""
+        stored_method, salt, _ = stored.split("$", 2) if stored.count("$") >= 2 else ("", "", "")
+        return (stored_method, len(salt)) != self._current_prefix()
+
+
+# Process-wide hasher, configured from the app by ``passwords.init_app(app)``
+passwords = PasswordHasher()
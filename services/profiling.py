@@ -0,0 +1,206 @@
+"""Opt-in request and SQL instrumentation for Vehicle Parking App.
+
+With ``INSTRUMENT`` on, every request is timed and every statement it runs
+is counted and timed through SQLAlchemy's ``before/after_cursor_execute``
+events. Per route (``"GET /admin"``), this worker keeps request count,
+wall time, statement count and database time, readable as JSON at
+``/admin/instrumentation``. Each response carries a ``Server-Timing`` header
+(``app``, ``db`` with the statement count), which browser dev tools show in
+the network panel. The following are logged as warnings:
+
+* statements slower than ``INSTRUMENT_SLOW_QUERY_MS``,
+* requests slower than ``INSTRUMENT_SLOW_REQUEST_MS``,
+* likely N+1 patterns: one statement text run ``INSTRUMENT_N_PLUS_ONE``
+  times or more within a single request.
+
+``INSTRUMENT_PROFILE_RATE`` of the requests (0.0-1.0) also run under
+cProfile and leave a ``.prof`` file in ``INSTRUMENT_PROFILE_DIR``; read it
+with ``python -m pstats`` or snakeviz. Only one profiler can run per
+process, so a sampled request that overlaps another is not profiled.
+
+When ``INSTRUMENT`` is off (the default) nothing is registered and there
+is no overhead at all.
+"""
+from __future__ import annotations
+
+import cProfile
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+__all__ = ["Instrumentation", "instrumentation"]
+
+
+class Instrumentation:
+    """Per-route timing, SQL accounting, Server-Timing and sampled profiles."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._routes: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+        self._profile_seq = itertools.count(1)
+
+    def init_app(self, app, db) -> None:
+        config = app.config
+        self.enabled = bool(config.get("INSTRUMENT", False))
+        if not self.enabled:
+            return
+        self.logger = app.logger
+        self.slow_query_ms = float(config.get("INSTRUMENT_SLOW_QUERY_MS", 100))
+        self.slow_request_ms = float(config.get("INSTRUMENT_SLOW_REQUEST_MS", 500))
+        self.n_plus_one = int(config.get("INSTRUMENT_N_PLUS_ONE", 5))
+        self.profile_rate = float(config.get("INSTRUMENT_PROFILE_RATE", 0.0))
+        self.profile_dir = config.get("INSTRUMENT_PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+        if self.profile_rate > 0:
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.logger.info(
+            "Instrumentation on: slow query %sms, slow request %sms, N+1 at %s, profiling %.0f%% to %s",
+            self.slow_query_ms, self.slow_request_ms, self.n_plus_one,
+            self.profile_rate * 100, self.profile_dir,
+        )
+
+    # -- SQL ---------------------------------------------------------------
+    @staticmethod
+    def _current():
+        """This request's record, or ``None`` outside an instrumented request."""
+        return g.get("_instrument") if has_app_context() else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # A connection runs one statement at a time
+        conn.info["instrument_started"] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("instrument_started", None)
+        record = self._current()
+        if started is None or record is None:
+            return  # began before this listener was attached, or outside a request
+        elapsed = (time.perf_counter() - started) * 1000
+        record["queries"] += 1
+        record["db_ms"] += elapsed
+        record["statements"][statement] += 1
+        if elapsed >= self.slow_query_ms:
+            self.logger.warning(
+                "Slow query (%.1fms) in %s: %s", elapsed, record["route"], _one_line(statement)
+            )
+
+    # -- requests ----------------------------------------------------------
+    def _before_request(self) -> None:
+        rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+        g._instrument = {
+            "route": f"{request.method} {rule}",
+            "started": time.perf_counter(),
+            "queries": 0,
+            "db_ms": 0.0,
+            "statements": Counter(),
+            "profile": None,
+        }
+        if self.profile_rate > 0 and random.random() < self.profile_rate and self._profiling.acquire(False):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is active in this process
+                self._profiling.release()
+            else:
+                g._instrument["profile"] = profile
+
+    def _after_request(self, response):
+        record = self._current()
+        if record is None:
+            return response
+        wall_ms = (time.perf_counter() - record["started"]) * 1000
+        response.headers.add(
+            "Server-Timing",
+            f'app;dur={wall_ms:.1f}, db;dur={record["db_ms"]:.1f};desc="{record["queries"]} queries"',
+        )
+        record["wall_ms"] = wall_ms
+        return response
+
+    def _teardown_request(self, exc) -> None:
+        record = g.pop("_instrument", None)
+        if record is None:
+            return
+        wall_ms = record.get("wall_ms") or (time.perf_counter() - record["started"]) * 1000
+        profile = record["profile"]
+        if profile is not None:
+            profile.disable()
+            self._profiling.release()
+            self._dump(profile, record["route"])
+
+        route = record["route"]
+        repeated = {sql: n for sql, n in record["statements"].items() if n >= self.n_plus_one}
+        for statement, count in repeated.items():
+            self.logger.warning("Possible N+1 in %s: %d x %s", route, count, _one_line(statement))
+        if wall_ms >= self.slow_request_ms:
+            self.logger.warning(
+                "Slow request %s: %.1fms, %d queries, %.1fms in the database",
+                route, wall_ms, record["queries"], record["db_ms"],
+            )
+
+        with self._lock:
+            stats = self._routes[route]
+            stats["requests"] += 1
+            stats["wall_ms"] += wall_ms
+            stats["max_wall_ms"] = max(stats["max_wall_ms"], wall_ms)
+            stats["queries"] += record["queries"]
+            stats["db_ms"] += record["db_ms"]
+            stats["n_plus_one"] += bool(repeated)
+            stats["errors"] += exc is not None
+
+    def _dump(self, profile: cProfile.Profile, route: str) -> None:
+        name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_")
+        path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._profile_seq)}-{name}.prof")
+        try:
+            profile.dump_stats(path)
+        except OSError:
+            self.logger.exception("Could not write profile %s", path)
+
+    # -- reporting ---------------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        """Per-route totals and means for this worker."""
+        with self._lock:
+            totals = {route: dict(stats) for route, stats in self._routes.items()}
+        routes = {}
+        for route, stats in totals.items():
+            n = int(stats["requests"])
+            routes[route] = {
+                "requests": n,
+                "errors": int(stats["errors"]),
+                "n_plus_one": int(stats["n_plus_one"]),
+                "queries": int(stats["queries"]),
+                "mean_queries": round(stats["queries"] / n, 2),
+                "mean_wall_ms": round(stats["wall_ms"] / n, 2),
+                "max_wall_ms": round(stats["max_wall_ms"], 2),
+                "mean_db_ms": round(stats["db_ms"] / n, 2),
+            }
+        return {"enabled": self.enabled, "routes": routes}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+def _one_line(statement: str, limit: int = 300) -> str:
+    text = " ".join(statement.split())
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+# Process-wide instance, configured by ``instrumentation.init_app(app, db)``
+instrumentation = Instrumentation()
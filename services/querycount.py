@@ -0,0 +1,53 @@
+"""SQL statement counting for per-endpoint query budgets.
+
+Used by ``tests/test_query_budget.py`` so that a change reintroducing an
+N+1 pattern (a lazy load per rendered row) fails loudly::
+
+    with assert_max_queries(db.engine, 5, "/user"):
+        client.get("/user")
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+__all__ = ["QueryCounter", "count_queries", "assert_max_queries"]
+
+
+class QueryCounter:
+    """Statements seen on an engine while a ``count_queries`` block ran."""
+
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine: Engine) -> Iterator[QueryCounter]:
+    counter = QueryCounter()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+
+@contextmanager
+def assert_max_queries(engine: Engine, limit: int, label: str = "") -> Iterator[QueryCounter]:
+    """Raise ``AssertionError`` if the block issues more than ``limit`` statements."""
+    with count_queries(engine) as counter:
+        yield counter
+    if len(counter) > limit:
+        listing = "\n".join(f"  {i + 1}. {sql}" for i, sql in enumerate(counter.statements))
+        raise AssertionError(
+            f"{label or 'block'} issued {len(counter)} queries (budget {limit}):\n{listing}"
+        )
@@ -0,0 +1,152 @@
+"""Incremental usage rollups for Vehicle Parking App.
+
+Every closed reservation is folded into per-lot hourly and daily buckets
+holding bookings, occupied minutes and revenue in paise, so analytics read a few
+thousand pre-aggregated rows instead of the raw reservation history.
+
+A stay is attributed to every bucket it overlaps: occupied minutes and
+revenue are split by the time spent in each bucket, while the booking
+itself is counted once, in the bucket where the stay started. Revenue is
+split from the stay's billed cost in whole paise, so the buckets of a stay
+always add up to exactly what was charged for it.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple, Union
+
+from sqlalchemy import Table
+
+__all__ = ["split_stay", "record_stay", "rebuild_rollups"]
+
+COUNTERS = ("bookings", "occupied_minutes", "revenue_paise")
+
+Bucket = Union[datetime, date]
+
+
+def _floor(ts: datetime, unit: str) -> datetime:
+    if unit == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def split_stay(
+    parked_at: datetime, left_at: datetime, cost_paise: int, unit: str
+) -> Dict[Bucket, List[float]]:
+    """Split one stay into ``{bucket: [bookings, minutes, paise]}``.
+
+    ``unit`` is ``"hour"`` (datetime keys) or ``"day"`` (date keys).
+    ``cost_paise`` is what the stay was billed.
+    """
+    step = timedelta(hours=1) if unit == "hour" else timedelta(days=1)
+    total = max(left_at - parked_at, timedelta(0))
+    out: Dict[Bucket, List[float]] = {}
+    bucket = _floor(parked_at, unit)
+    cursor = parked_at
+    billed = 0
+    first = True
+    while first or cursor < left_at:
+        end = min(bucket + step, left_at)
+        minutes = max((end - cursor).total_seconds(), 0.0) / 60
+        # Paise up to the end of this bucket, rounded down; the last bucket
+        # takes whatever remains, so nothing is lost or added
+        upto = cost_paise if end >= left_at or not total else cost_paise * (end - parked_at) // total
+        key = bucket if unit == "hour" else bucket.date()
+        out[key] = [1 if first else 0, minutes, upto - billed]
+        billed = upto
+        first = False
+        cursor = end
+        bucket += step
+    return out
+
+
+def _upsert(session, table: Table, lot_id: int, buckets: Dict[Bucket, List[float]]) -> None:
+    """Add ``buckets`` onto the existing rollup rows of ``lot_id``."""
+    rows = [
+        {"lot_id": lot_id, "bucket": key, **dict(zip(COUNTERS, values))}
+        for key, values in buckets.items()
+    ]
+    if not rows:
+        return
+
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["lot_id", "bucket"],
+            set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS},
+        )
+        session.execute(stmt, rows)
+        return
+
+    # Portable fallback: increment in place, insert the buckets that were missing
+    for row in rows:
+        updated = session.execute(
+            table.update()
+            .where(table.c.lot_id == row["lot_id"], table.c.bucket == row["bucket"])
+            .values({name: table.c[name] + row[name] for name in COUNTERS})
+        ).rowcount
+        if not updated:
+            session.execute(table.insert(), [row])
+
+
+def record_stay(
+    session,
+    hourly: Table,
+    daily: Table,
+    lot_id: int,
+    parked_at: datetime,
+    left_at: datetime,
+    cost_paise: int,
+) -> None:
+    """Fold one closed reservation into both rollups (caller commits)."""
+    _upsert(session, hourly, lot_id, split_stay(parked_at, left_at, cost_paise, "hour"))
+    _upsert(session, daily, lot_id, split_stay(parked_at, left_at, cost_paise, "day"))
+
+
+def rebuild_rollups(
+    session,
+    hourly: Table,
+    daily: Table,
+    stays: Iterable[Tuple[int, datetime, datetime, int]],
+) -> int:
+    """Recompute both rollups from ``(lot_id, parked_at, left_at, cost_paise)``.
+
+    ``stays`` must be ordered by ``lot_id``; buckets are flushed one lot at
+    a time so memory stays bounded by a single lot's history. Returns the
+    number of stays folded in.
+    """
+    session.execute(hourly.delete())
+    session.execute(daily.delete())
+
+    acc: Dict[str, Dict[Bucket, List[float]]] = {"hour": {}, "day": {}}
+    current = None
+    count = 0
+
+    def flush(lot_id: int) -> None:
+        for unit, table in (("hour", hourly), ("day", daily)):
+            rows = [
+                {"lot_id": lot_id, "bucket": key, **dict(zip(COUNTERS, values))}
+                for key, values in acc[unit].items()
+            ]
+            if rows:
+                session.execute(table.insert(), rows)
+            acc[unit] = {}
+
+    for lot_id, parked_at, left_at, cost_paise in stays:
+        if current is not None and lot_id != current:
+            flush(current)
+        current = lot_id
+        for unit in ("hour", "day"):
+            for key, values in split_stay(parked_at, left_at, cost_paise, unit).items():
+                into = acc[unit].setdefault(key, [0, 0.0, 0])
+                for i, value in enumerate(values):
+                    into[i] += value
+        count += 1
+    if current is not None:
+        flush(current)
+    return count
@@ -0,0 +1,196 @@
+"""Time-of-day and demand-based tariffs for Vehicle Parking App.
+
+A lot's price schedule is a set of *windows*, each with a price per hour
+that applies on some weekdays, between two local times of day, to stays
+booked while the lot was at least ``min_occupancy`` percent full::
+
+    Weekdays 08:00-20:00            ₹60/h   (peak)
+    Weekdays 08:00-20:00, >= 80%    ₹90/h   (peak, lot nearly full)
+    Every day 20:00-08:00           ₹20/h   (night; runs past midnight)
+
+Time not covered by any window is charged at the lot's ``price_per_hour``.
+Where windows overlap, the one with the higher ``min_occupancy`` wins, then
+the one added last. The occupancy a stay was booked at is stored on the
+reservation, so the tier of a stay is fixed when the driver parks.
+
+Pricing happens on every release, so schedules are not interpreted per
+request. A lot's windows are compiled once into a weekly, piecewise
+constant rate curve per occupancy tier, with the running cost up to every
+change of rate. The cost of any stay, however many windows and weeks it
+spans, is the difference of that running cost at its two ends: two
+binary searches and integer arithmetic, rounded half up to the paisa once.
+
+Compiled schedules are kept per process by :class:`TariffBook` and keyed by
+the lot's ``tariff_version``, which every change to its windows bumps in
+the same transaction, so all workers pick up a new schedule on the next
+stay they price without any messaging between them.
+
+Configuration (``app.config``):
+
+==========================  ==================================================
+``TARIFF_UTC_OFFSET``       Minutes local time is ahead of UTC, for the time
+                            of day windows (``330`` for IST). Default ``0``.
+==========================  ==================================================
+"""
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from flask import current_app
+
+from services.billing import to_paise
+
+__all__ = ["DAYS", "Window", "Curve", "Schedule", "compile_schedule", "TariffBook"]
+
+DAY = 24 * 60
+WEEK = 7 * DAY
+# Weekday bits, Monday first, as ``datetime.weekday()`` numbers them
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+EVERY_DAY = (1 << len(DAYS)) - 1
+
+_MICROS_PER_MINUTE = 60 * 10**6
+_MICROS_PER_HOUR = 60 * _MICROS_PER_MINUTE
+_MONDAY = datetime(2001, 1, 1)
+
+
+class Window(NamedTuple):
+    days: int  # bitmask, Monday = 1 ... Sunday = 64
+    start_minute: int  # after local midnight
+    end_minute: int  # at or before the start: runs past midnight
+    min_occupancy: int  # percent
+    price_paise: int  # per hour
+
+    def intervals(self) -> Iterable[Tuple[int, int]]:
+        """``[start, end)`` minutes of the week covered, split at the week's end."""
+        length = (self.end_minute - self.start_minute) % DAY or DAY
+        for day in range(len(DAYS)):
+            if self.days & (1 << day):
+                start = day * DAY + self.start_minute
+                end = start + length
+                yield start, min(end, WEEK)
+                if end > WEEK:
+                    yield 0, end - WEEK
+
+
+class Curve:
+    """One week of rates: ``rates[i]`` paise/hour from minute ``starts[i]`` on."""
+
+    __slots__ = ("starts", "rates", "running", "week")
+
+    def __init__(self, minute_rates: List[int]) -> None:
+        self.starts: List[int] = []
+        self.rates: List[int] = []
+        for minute, rate in enumerate(minute_rates):
+            if not self.rates or rate != self.rates[-1]:
+                self.starts.append(minute)
+                self.rates.append(rate)
+        # running[i]: cost of the week up to starts[i], in paise-per-hour minutes
+        self.running: List[int] = [0]
+        ends = self.starts[1:] + [WEEK]
+        for start, end, rate in zip(self.starts, ends, self.rates):
+            self.running.append(self.running[-1] + rate * (end - start))
+        self.week = self.running.pop()
+
+    def rate_at(self, minute: int) -> int:
+        return self.rates[bisect_right(self.starts, minute % WEEK) - 1]
+
+    def _cumulative(self, micros: int) -> int:
+        """Cost from the epoch Monday to ``micros`` after it, in paise-per-hour micros."""
+        weeks, into = divmod(micros, WEEK * _MICROS_PER_MINUTE)
+        i = bisect_right(self.starts, into // _MICROS_PER_MINUTE) - 1
+        return (
+            (weeks * self.week + self.running[i]) * _MICROS_PER_MINUTE
+            + self.rates[i] * (into - self.starts[i] * _MICROS_PER_MINUTE)
+        )
+
+    def cost(self, start: int, end: int) -> int:
+        """Paise from ``start`` to ``end`` micros after the epoch Monday, half up."""
+        amount = max(self._cumulative(end) - self._cumulative(start), 0)
+        return (2 * amount + _MICROS_PER_HOUR) // (2 * _MICROS_PER_HOUR)
+
+
+class Schedule:
+    """A lot's compiled tariff: one :class:`Curve` per occupancy tier."""
+
+    __slots__ = ("tiers", "curves", "offset")
+
+    def __init__(self, tiers: List[int], curves: List[Curve], utc_offset: int) -> None:
+        self.tiers = tiers
+        self.curves = curves
+        self.offset = timedelta(minutes=utc_offset)
+
+    def curve(self, occupancy: Optional[int]) -> Curve:
+        return self.curves[max(bisect_right(self.tiers, occupancy or 0) - 1, 0)]
+
+    def _micros(self, ts: datetime) -> int:
+        delta = ts + self.offset - _MONDAY
+        return (delta.days * 86_400 + delta.seconds) * 10**6 + delta.microseconds
+
+    def rate_at(self, ts: datetime, occupancy: Optional[int] = None) -> int:
+        """Paise per hour charged at UTC time ``ts``."""
+        return self.curve(occupancy).rate_at(self._micros(ts) // _MICROS_PER_MINUTE)
+
+    def price(self, parked_at: datetime, left_at: datetime, occupancy: Optional[int] = None) -> int:
+        """Paise owed for a stay booked at ``occupancy`` percent."""
+        return self.curve(occupancy).cost(self._micros(parked_at), self._micros(left_at))
+
+
+def compile_schedule(base_price: float, windows: Iterable[Window], utc_offset: int = 0) -> Schedule:
+    """Compile ``windows`` (oldest first) over a lot's ``price_per_hour``."""
+    ranked = sorted(enumerate(windows), key=lambda item: (item[1].min_occupancy, item[0]))
+    tiers = sorted({0, *(w.min_occupancy for _, w in ranked)})
+    curves = []
+    for tier in tiers:
+        minutes = [to_paise(base_price)] * WEEK
+        # Later (higher-priority) windows paint over earlier ones
+        for _, window in ranked:
+            if window.min_occupancy > tier:
+                break
+            for start, end in window.intervals():
+                minutes[start:end] = [window.price_paise] * (end - start)
+        curves.append(Curve(minutes))
+    return Schedule(tiers, curves, utc_offset)
+
+
+class TariffBook:
+    """Compiled schedules of every lot, bound to the ``lot``/``tariff`` models."""
+
+    def __init__(self, db, lot, tariff) -> None:
+        self.db = db
+        self.lot = lot
+        self.tariff = tariff
+        self._compiled: Dict[int, Tuple[tuple, Schedule]] = {}
+
+    @property
+    def utc_offset(self) -> int:
+        return int(current_app.config.get("TARIFF_UTC_OFFSET", 0))
+
+    def schedule(self, lot) -> Schedule:
+        """``lot``'s compiled schedule; one query when it changed since last use."""
+        key = (lot.tariff_version, lot.price_per_hour, self.utc_offset)
+        entry = self._compiled.get(lot.id)
+        if entry is None or entry[0] != key:
+            T = self.tariff
+            windows = [
+                Window(*row)
+                for row in self.db.session.query(
+                    T.days, T.start_minute, T.end_minute, T.min_occupancy, T.price_paise
+                ).filter_by(lot_id=lot.id).order_by(T.id)
+            ]
+            entry = (key, compile_schedule(lot.price_per_hour, windows, key[2]))
+            self._compiled[lot.id] = entry
+        return entry[1]
+
+    def price(self, lot, parked_at: datetime, left_at: datetime, occupancy: Optional[int] = None) -> int:
+        """Paise owed for a stay in ``lot`` booked at ``occupancy`` percent."""
+        return self.schedule(lot).price(parked_at, left_at, occupancy)
+
+    def changed(self, lot_id: int) -> None:
+        """Bump ``lot_id``'s version after editing its windows (caller commits)."""
+        L = self.lot
+        L.query.filter_by(id=lot_id).update(
+            {L.tariff_version: L.tariff_version + 1}, synchronize_session=False
+        )
+        self._compiled.pop(lot_id, None)
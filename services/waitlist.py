@@ -0,0 +1,208 @@
+"""Per-lot waitlist queue with time-limited spot holds.
+
+When a reservation ends in a lot with people waiting, the vacated spot is
+not returned to the free list. It is *held* (spot status ``H``) for the
+waiter at the head of that lot's queue, who gets a notification and
+``WAITLIST_HOLD_SECONDS`` to book it. A hold that runs out passes the spot
+to the next waiter, and only when the queue is empty does the spot become
+free (``A``) again. A held spot counts as occupied in the lot counters.
+
+The head of a queue is read from the ``(lot_id, notified, created_at, id)``
+index and expired holds from the ``hold_expires_at`` index, so a release
+costs the same whether ten or ten thousand people are waiting. Every state
+change is a conditional ``UPDATE``/``DELETE`` checked by rowcount, so two
+workers racing for the same queue row cannot both win it.
+
+The engine is bound to a set of model classes; callers commit, then hand
+the returned ``(lot_id, spot_id)`` pairs back to the free-spot allocator.
+Waiter notifications go to the outbox in the same transaction.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+__all__ = ["WaitlistEngine"]
+
+Freed = List[Tuple[int, int]]
+
+
+class WaitlistEngine:
+    """Queue, hold and cascade logic over ``lot``/``spot``/``waitlist``/``outbox`` models."""
+
+    def __init__(self, db, lot, spot, waitlist, outbox, max_attempts: int = 5) -> None:
+        self.db = db
+        self.lot = lot
+        self.spot = spot
+        self.waitlist = waitlist
+        self.outbox = outbox
+        self.max_attempts = max_attempts
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    @property
+    def hold_seconds(self) -> int:
+        return int(current_app.config.get("WAITLIST_HOLD_SECONDS", 600))
+
+    # -- queue -------------------------------------------------------------
+    def join(self, lot_id: int, user_id: int) -> bool:
+        """Queue ``user_id`` for ``lot_id``; ``False`` if already queued."""
+        W = self.waitlist
+        queued = (
+            self.db.session.query(W.id)
+            .filter_by(lot_id=lot_id, user_id=user_id)
+            .first()
+        )
+        if queued is not None:
+            return False
+        self.db.session.add(W(lot_id=lot_id, user_id=user_id))
+        return True
+
+    def holds_for(self, user_id: int, now: Optional[datetime] = None) -> Dict[int, datetime]:
+        """Live holds of ``user_id`` as ``{lot_id: expires_at}``."""
+        W = self.waitlist
+        now = now or datetime.utcnow()
+        rows = self.db.session.query(W.lot_id, W.hold_expires_at).filter(
+            W.user_id == user_id, W.held_spot_id.isnot(None), W.hold_expires_at > now
+        )
+        return dict(rows)
+
+    # -- spot hand-over ----------------------------------------------------
+    def offer(self, lot_id: int, spot_id: int, lot_name: str, now: Optional[datetime] = None) -> Optional[int]:
+        """Hold ``spot_id`` for the head of ``lot_id``'s queue.
+
+        Returns the waiter's user id, or ``None`` if nobody is waiting.
+        """
+        W = self.waitlist
+        session = self.db.session
+        now = now or datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.hold_seconds)
+        for _ in range(self.max_attempts):
+            head = (
+                session.query(W.id, W.user_id)
+                .filter_by(lot_id=lot_id, notified=False)
+                .order_by(W.created_at, W.id)
+                .first()
+            )
+            if head is None:
+                return None
+            won = (
+                W.query.filter_by(id=head.id, notified=False)
+                .update(
+                    {W.notified: True, W.held_spot_id: spot_id, W.hold_expires_at: expires_at},
+                    synchronize_session=False,
+                )
+            )
+            if not won:
+                continue  # another release took this waiter, try the next one
+            self.spot.query.filter_by(id=spot_id).update(
+                {self.spot.status: "H"}, synchronize_session=False
+            )
+            # Queued in this transaction, delivered by services.notify
+            session.add(
+                self.outbox(
+                    user_id=head.user_id,
+                    lot_id=lot_id,
+                    message=(
+                        f"A spot is being held for you at {lot_name} until "
+                        f"{expires_at.strftime('%H:%M')} UTC. Book it before then!"
+                    ),
+                )
+            )
+            return head.user_id
+        return None
+
+    def release(self, lot_id: int, spot_id: int, lot_name: str, now: Optional[datetime] = None) -> bool:
+        """Pass on a spot whose occupant left.
+
+        The spot is held for the next waiter (``True``) or, with an empty
+        queue, marked free and the lot counters adjusted (``False`` – the
+        caller should push it back to the allocator after committing).
+        """
+        if self.offer(lot_id, spot_id, lot_name, now) is not None:
+            return True
+        self.spot.query.filter_by(id=spot_id).update(
+            {self.spot.status: "A"}, synchronize_session=False
+        )
+        self.lot.shift_occupancy(lot_id, -1)
+        return False
+
+    def claim(self, lot_id: int, user_id: int, now: Optional[datetime] = None) -> Optional[int]:
+        """Turn the user's live hold in ``lot_id`` into an occupied spot.
+
+        Returns the spot id, or ``None`` without a live hold. The spot was
+        already counted as occupied, so the lot counters do not change.
+        """
+        W = self.waitlist
+        now = now or datetime.utcnow()
+        hold = (
+            self.db.session.query(W.id, W.held_spot_id)
+            .filter(
+                W.lot_id == lot_id,
+                W.user_id == user_id,
+                W.held_spot_id.isnot(None),
+                W.hold_expires_at > now,
+            )
+            .first()
+        )
+        if hold is None:
+            return None
+        # Deleting the queue row is the claim; an expiry sweep racing us
+        # deletes the same row, and only one of the two can see rowcount 1
+        if not W.query.filter_by(id=hold.id, held_spot_id=hold.held_spot_id).delete(synchronize_session=False):
+            return None
+        taken = self.spot.query.filter_by(id=hold.held_spot_id, status="H").update(
+            {self.spot.status: "O"}, synchronize_session=False
+        )
+        return hold.held_spot_id if taken else None
+
+    # -- expiry and cleanup ------------------------------------------------
+    def _pass_on(self, rows, now: datetime) -> Freed:
+        """Drop the given holding rows and cascade their spots."""
+        W = self.waitlist
+        freed: Freed = []
+        for row_id, lot_id, spot_id, lot_name in rows:
+            if not W.query.filter_by(id=row_id, held_spot_id=spot_id).delete(synchronize_session=False):
+                continue  # claimed or expired by someone else meanwhile
+            if not self.release(lot_id, spot_id, lot_name, now):
+                freed.append((lot_id, spot_id))
+        return freed
+
+    def _holding(self):
+        W = self.waitlist
+        return (
+            self.db.session.query(W.id, W.lot_id, W.held_spot_id, self.lot.name)
+            .join(self.lot, self.lot.id == W.lot_id)
+            .filter(W.held_spot_id.isnot(None))
+        )
+
+    def expire(self, now: Optional[datetime] = None, limit: Optional[int] = 500) -> Freed:
+        """Cascade up to ``limit`` (``None``: all) expired holds to the next waiters."""
+        W = self.waitlist
+        now = now or datetime.utcnow()
+        query = self._holding().filter(W.hold_expires_at <= now).order_by(W.hold_expires_at)
+        if limit is not None:
+            query = query.limit(limit)
+        return self._pass_on(query.all(), now)
+
+    def maybe_expire(self, interval: float) -> Freed:
+        """:meth:`expire`, at most once per ``interval`` seconds per process."""
+        with self._sweep_lock:
+            if time.monotonic() - self._last_sweep < interval:
+                return []
+            self._last_sweep = time.monotonic()
+        return self.expire()
+
+    def withdraw(self, user_id: int, now: Optional[datetime] = None) -> Freed:
+        """Take ``user_id`` out of every queue, passing on any spots it held.
+
+        Called once the user has a reservation (or is being deleted).
+        """
+        W = self.waitlist
+        now = now or datetime.utcnow()
+        W.query.filter_by(user_id=user_id, held_spot_id=None).delete(synchronize_session=False)
+        return self._pass_on(self._holding().filter(W.user_id == user_id).all(), now)
@@ -0,0 +1,88 @@
+"""Shared fixtures: an app on its own SQLite file, and signed-in clients."""
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import models as m  # noqa: E402
+from app import create_app  # noqa: E402
+from services.allocator import free_spots  # noqa: E402
+from services.cache import cache  # noqa: E402
+
+TEST_CONFIG = {
+    "TESTING": True,
+    # Queued notifications stay in the outbox; no dispatcher thread
+    "NOTIFY_MODE": "worker",
+    # Cheap, inline hashes
+    "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    "PASSWORD_VERIFY_WORKERS": 0,
+    "METRICS_ENABLED": False,
+    "CACHE_BACKEND": "memory",
+}
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'parking.db'}"
+
+
+@pytest.fixture
+def make_app(db_url):
+    """Build an app on the test database, with ``overrides`` on top."""
+
+    def make(**overrides):
+        return create_app({**TEST_CONFIG, "SQLALCHEMY_DATABASE_URI": db_url, **overrides})
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    """An app with every table created, inside its app context."""
+    app = make_app()
+    with app.app_context():
+        m.db.create_all()
+        # Process-wide state left by the previous test's database
+        cache.clear()
+        free_spots.clear()
+        yield app
+        m.db.session.remove()
+        m.db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def sign_in(client, user_id: int, is_admin: bool = False) -> None:
+    """Put ``client`` in a signed-in session, as ``services.auth`` leaves one."""
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["auth"] = [user_id, is_admin, int(time.time())]
+
+
+def add_lot(spots: int = 3, price: float = 20.0, name: str = "Lot") -> "m.ParkingLot":
+    """A lot with ``spots`` free spots, committed."""
+    lot = m.ParkingLot(
+        name=name, address="Test Rd", pincode="000000", price_per_hour=price,
+        max_spots=spots, available_spots=spots, occupied_spots=0,
+    )
+    m.db.session.add(lot)
+    m.db.session.flush()
+    m.db.session.add_all(m.ParkingSpot(lot_id=lot.id, status="A") for _ in range(spots))
+    m.db.session.commit()
+    return lot
+
+
+def add_user(username: str = "driver", is_admin: bool = False) -> "m.User":
+    user = m.User(username=username, password_hash="x", is_admin=is_admin)
+    m.db.session.add(user)
+    m.db.session.commit()
+    return user
@@ -0,0 +1,214 @@
+"""Admin lot creation, resizing and deletion, and user deletion: counters and holds kept right."""
+from __future__ import annotations
+
+from datetime import date, datetime
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+from services.allocator import free_spots
+
+# (child model, column, parent model) for every reference a purge must clear
+REFERENCES = [
+    (m.ParkingSpot, "lot_id", m.ParkingLot),
+    (m.Reservation, "spot_id", m.ParkingSpot),
+    (m.Reservation, "user_id", m.User),
+    (m.Waitlist, "lot_id", m.ParkingLot),
+    (m.Waitlist, "user_id", m.User),
+    (m.Waitlist, "held_spot_id", m.ParkingSpot),
+    (m.Notification, "lot_id", m.ParkingLot),
+    (m.Notification, "user_id", m.User),
+    (m.NotificationOutbox, "lot_id", m.ParkingLot),
+    (m.NotificationOutbox, "user_id", m.User),
+    (m.LotUsageHourly, "lot_id", m.ParkingLot),
+    (m.LotUsageDaily, "lot_id", m.ParkingLot),
+    (m.Tariff, "lot_id", m.ParkingLot),
+]
+
+
+def orphans() -> dict:
+    """Rows whose foreign key points at a row that no longer exists."""
+    found = {}
+    for child, column, parent in REFERENCES:
+        ref = getattr(child, column)
+        count = (
+            child.query.filter(ref.isnot(None), ~ref.in_(m.db.select(parent.id))).count()
+        )
+        if count:
+            found[f"{child.__tablename__}.{column}"] = count
+    return found
+
+
+def counters(lot_id: int):
+    lot = m.db.session.get(m.ParkingLot, lot_id)
+    m.db.session.refresh(lot)
+    return lot.occupied_spots, lot.available_spots
+
+
+def spot_status(spot_id: int) -> str:
+    spot = m.db.session.get(m.ParkingSpot, spot_id)
+    m.db.session.refresh(spot)
+    return spot.status
+
+
+def as_user(client, uid: int, is_admin: bool = False):
+    sign_in(client, uid, is_admin)
+    return client
+
+
+@pytest.fixture
+def admin(app):
+    return add_user("admin", is_admin=True).id
+
+
+def book(client, uid: int, lot_id: int) -> "m.Reservation":
+    as_user(client, uid).get(f"/user/book/{lot_id}")
+    return m.Reservation.query.filter_by(user_id=uid, left_at=None).one()
+
+
+def test_delete_lot_removes_everything_hanging_off_it(client, admin):
+    doomed, kept = add_lot(2, name="Doomed").id, add_lot(2, name="Kept").id
+    parker, past, waiter, other = (add_user(n).id for n in ("parker", "past", "waiter", "other"))
+    stay = book(client, past, doomed)
+    as_user(client, past).get(f"/user/release/{stay.id}")
+    book(client, parker, doomed)
+    book(client, other, kept)
+    m.db.session.add_all([
+        m.Waitlist(lot_id=doomed, user_id=waiter),
+        m.Notification(user_id=waiter, lot_id=doomed, message="hi"),
+        m.NotificationOutbox(user_id=waiter, lot_id=doomed, message="hi"),
+        m.LotUsageHourly(lot_id=doomed, bucket=datetime(2026, 1, 1, 9), bookings=1),
+        m.LotUsageDaily(lot_id=doomed, bucket=date(2026, 1, 1), bookings=1),
+        m.Tariff(lot_id=doomed, start_minute=0, end_minute=0, price_paise=100),
+    ])
+    m.db.session.commit()
+
+    resp = as_user(client, admin, True).post(f"/admin/lots/delete/{doomed}", follow_redirects=True)
+    assert b"Parking lot deleted successfully" in resp.data
+    m.db.session.expire_all()
+    assert m.db.session.get(m.ParkingLot, doomed) is None
+    assert orphans() == {}
+    for model in (m.ParkingSpot, m.Waitlist, m.Notification, m.NotificationOutbox,
+                  m.LotUsageHourly, m.LotUsageDaily, m.Tariff):
+        assert model.query.filter_by(lot_id=doomed).count() == 0
+    assert m.Reservation.query.filter(m.Reservation.user_id.in_([parker, past])).count() == 0
+    # The other lot and its stay are untouched
+    assert counters(kept) == (1, 1)
+    assert m.Reservation.query.filter_by(user_id=other, left_at=None).count() == 1
+    assert free_spots.pop(doomed) is None
+
+
+def test_delete_user_frees_their_spot(client, admin):
+    lot_id = add_lot(2).id
+    parker = add_user("parker").id
+    spot_id = book(client, parker, lot_id).spot_id
+    m.db.session.add(m.Notification(user_id=parker, lot_id=lot_id, message="hi"))
+    m.db.session.commit()
+    assert counters(lot_id) == (1, 1)
+
+    resp = as_user(client, admin, True).post(f"/admin/users/delete/{parker}", follow_redirects=True)
+    assert b"User deleted successfully" in resp.data
+    m.db.session.expire_all()
+    assert m.db.session.get(m.User, parker) is None
+    assert orphans() == {}
+    assert spot_status(spot_id) == "A"
+    assert counters(lot_id) == (0, 2)
+
+
+def test_delete_parked_user_holds_their_spot_for_the_next_waiter(client, admin):
+    lot_id = add_lot(1).id
+    parker, waiter = add_user("parker").id, add_user("waiter").id
+    spot_id = book(client, parker, lot_id).spot_id
+    as_user(client, waiter).get(f"/user/waitlist/{lot_id}")
+
+    as_user(client, admin, True).post(f"/admin/users/delete/{parker}")
+    m.db.session.expire_all()
+    assert orphans() == {}
+    assert spot_status(spot_id) == "H"
+    assert m.Waitlist.query.filter_by(user_id=waiter).one().held_spot_id == spot_id
+    assert counters(lot_id) == (1, 0)
+
+
+def test_deleted_users_hold_passes_to_the_next_waiter(client, admin):
+    lot_id = add_lot(1).id
+    parker, first, second = (add_user(n).id for n in ("parker", "first", "second"))
+    stay = book(client, parker, lot_id)
+    as_user(client, first).get(f"/user/waitlist/{lot_id}")
+    as_user(client, second).get(f"/user/waitlist/{lot_id}")
+    as_user(client, parker).get(f"/user/release/{stay.id}")
+    m.db.session.expire_all()
+    assert m.Waitlist.query.filter_by(user_id=first).one().held_spot_id == stay.spot_id
+
+    as_user(client, admin, True).post(f"/admin/users/delete/{first}")
+    m.db.session.expire_all()
+    assert orphans() == {}
+    assert m.Waitlist.query.filter_by(user_id=first).count() == 0
+    assert m.NotificationOutbox.query.filter_by(user_id=first).count() == 0
+    assert m.Waitlist.query.filter_by(user_id=second).one().held_spot_id == stay.spot_id
+    assert m.NotificationOutbox.query.filter_by(user_id=second).count() == 1
+    assert spot_status(stay.spot_id) == "H"
+    assert counters(lot_id) == (1, 0)
+
+
+def test_deleting_the_last_waiter_frees_the_held_spot(client, admin):
+    lot_id = add_lot(1).id
+    parker, waiter = add_user("parker").id, add_user("waiter").id
+    stay = book(client, parker, lot_id)
+    as_user(client, waiter).get(f"/user/waitlist/{lot_id}")
+    as_user(client, parker).get(f"/user/release/{stay.id}")
+
+    as_user(client, admin, True).post(f"/admin/users/delete/{waiter}")
+    m.db.session.expire_all()
+    assert orphans() == {}
+    assert spot_status(stay.spot_id) == "A"
+    assert counters(lot_id) == (0, 1)
+    assert free_spots.pop(lot_id) == stay.spot_id
+
+
+def test_admins_cannot_be_deleted(client, admin):
+    resp = as_user(client, admin, True).post(f"/admin/users/delete/{admin}", follow_redirects=True)
+    assert b"Cannot delete an admin user" in resp.data
+    assert m.db.session.get(m.User, admin) is not None
+
+
+def statuses(lot_id: int) -> list:
+    m.db.session.expire_all()
+    return [s.status for s in m.ParkingSpot.query.filter_by(lot_id=lot_id).order_by(m.ParkingSpot.id)]
+
+
+def test_new_lot_gets_its_spots_in_one_go(client, admin):
+    form = {"name": "New", "address": "Rd", "pincode": "000000", "price_per_hour": "30", "max_spots": "40"}
+    resp = as_user(client, admin, True).post("/admin/add", data=form, follow_redirects=True)
+    assert b"Parking lot created successfully" in resp.data
+    lot = m.ParkingLot.query.filter_by(name="New").one()
+    assert statuses(lot.id) == ["A"] * 40
+    assert counters(lot.id) == (0, 40)
+
+
+def resize(client, admin: int, lot_id: int, spots: int):
+    return as_user(client, admin, True).post(
+        f"/admin/lots/{lot_id}/resize", data={"max_spots": spots}, follow_redirects=True
+    )
+
+
+def test_resize_retires_free_spots_and_reactivates_them(client, admin):
+    lot_id = add_lot(5).id
+    # The highest-numbered spot is taken: shrinking must go around it
+    top = m.ParkingSpot.query.filter_by(lot_id=lot_id).order_by(m.ParkingSpot.id.desc()).first()
+    top.status = "O"
+    m.ParkingLot.shift_occupancy(lot_id, 1)
+    m.db.session.commit()
+
+    assert b"now has 2 spots" in resize(client, admin, lot_id, 2).data
+    assert statuses(lot_id) == ["A", "R", "R", "R", "O"]
+    assert counters(lot_id) == (1, 1)
+
+    assert b"Cannot resize lot" in resize(client, admin, lot_id, 0).data
+    assert statuses(lot_id) == ["A", "R", "R", "R", "O"]
+    assert counters(lot_id) == (1, 1)
+
+    assert b"now has 7 spots" in resize(client, admin, lot_id, 7).data
+    assert statuses(lot_id) == ["A", "A", "A", "A", "O", "A", "A"]
+    assert counters(lot_id) == (1, 6)
+    assert m.db.session.get(m.ParkingLot, lot_id).max_spots == 7
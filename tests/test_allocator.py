@@ -0,0 +1,74 @@
+"""The free-spot allocator: lost claims, window refills and full reloads."""
+from __future__ import annotations
+
+import pytest
+
+from services.allocator import AllocationContention, FreeSpotIndex
+
+
+class Lot:
+    """Free spot ids of one lot in a fake database, recording every read."""
+
+    def __init__(self, free):
+        self.free = set(free)
+        self.reads = []
+
+    def load(self, lot_id, after=None, limit=None):
+        self.reads.append((after, limit))
+        ids = sorted(i for i in self.free if after is None or i > after)
+        return ids[:limit] if limit is not None else ids
+
+    def claim(self, spot_id):
+        if spot_id in self.free:
+            self.free.remove(spot_id)
+            return spot_id
+        return None
+
+
+def test_empty_heap_is_loaded_in_full_once():
+    index, lot = FreeSpotIndex(), Lot(range(1, 101))
+    assert index.allocate(1, lot.load, lot.claim) == 1
+    assert index.allocate(1, lot.load, lot.claim) == 2
+    assert lot.reads == [(None, None)]
+
+
+def test_full_lot_returns_none():
+    index, lot = FreeSpotIndex(), Lot([])
+    assert index.allocate(1, lot.load, lot.claim) is None
+    assert lot.reads == [(None, None)]
+
+
+def test_lost_claim_tries_the_next_id_without_reading():
+    index, lot = FreeSpotIndex(), Lot(range(1, 101))
+    index.load(1, lot.load(1))
+    lot.reads.clear()
+    lot.free -= {1, 2}  # taken by other workers
+    assert index.allocate(1, lot.load, lot.claim) == 3
+    assert lot.reads == []
+
+
+def test_exhausted_heap_after_a_loss_reads_a_window_above_it():
+    index, lot = FreeSpotIndex(), Lot(range(1, 1001))
+    index.load(1, [1, 2])
+    lot.free -= {1, 2, 3}
+    assert index.allocate(1, lot.load, lot.claim, window=8) == 4
+    assert lot.reads == [(2, 8)]
+    # The rest of the window stays on the heap for the next booking
+    assert index.allocate(1, lot.load, lot.claim) == 5
+    assert lot.reads == [(2, 8)]
+
+
+def test_empty_window_falls_back_to_a_full_reload():
+    index, lot = FreeSpotIndex(), Lot([1, 2, 3])
+    index.load(1, [3])
+    lot.free -= {3}  # only ids below the lost one are left
+    assert index.allocate(1, lot.load, lot.claim) == 1
+    assert lot.reads == [(3, 32), (None, None)]
+
+
+def test_too_many_lost_claims_raise():
+    index, lot = FreeSpotIndex(), Lot([])
+    index.load(1, range(1, 10))
+    with pytest.raises(AllocationContention):
+        index.allocate(1, lot.load, lot.claim, max_attempts=3)
+    assert lot.reads == []
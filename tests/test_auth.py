@@ -0,0 +1,109 @@
+"""Registration and sign-in, including a saturated password hashing pool."""
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+import models as m
+from services.passwords import HasherBusy, passwords
+
+FORM = {"username": "driver", "password": "secret", "full_name": "D", "address": "Rd", "pincode": "000000"}
+
+
+def busy(*args):
+    raise HasherBusy("pool saturated")
+
+
+def test_register_then_log_in(client):
+    resp = client.post("/register", data=FORM)
+    assert resp.status_code == 302 and resp.location.endswith("/")
+    resp = client.post("/login", data={"username": "driver", "password": "secret"})
+    assert resp.location.endswith("/user")
+
+
+def test_wrong_password_is_refused(client):
+    client.post("/register", data=FORM)
+    resp = client.post("/login", data={"username": "driver", "password": "nope"}, follow_redirects=True)
+    assert b"Invalid credentials" in resp.data
+
+
+def test_register_with_a_busy_hasher_asks_to_retry(client, monkeypatch):
+    monkeypatch.setattr(passwords, "hash", busy)
+    resp = client.post("/register", data=FORM, follow_redirects=True)
+    assert resp.status_code == 200
+    assert b"Too many sign-ups right now" in resp.data
+    assert m.User.query.count() == 0
+
+
+def test_login_with_a_busy_hasher_asks_to_retry(client, monkeypatch):
+    client.post("/register", data=FORM)
+    monkeypatch.setattr(passwords, "verify", busy)
+    resp = client.post("/login", data={"username": "driver", "password": "secret"}, follow_redirects=True)
+    assert b"Too many sign-ins right now" in resp.data
+
+
+def test_default_hashing_pool_is_one_thread_per_process(monkeypatch):
+    from app import _load_env_config
+
+    monkeypatch.delenv("PASSWORD_VERIFY_WORKERS", raising=False)
+    monkeypatch.delenv("PASSWORD_VERIFY_EXECUTOR", raising=False)
+    config = {}
+    _load_env_config(config)
+    assert (config["PASSWORD_VERIFY_WORKERS"], config["PASSWORD_VERIFY_EXECUTOR"]) == (1, "thread")
+
+
+def test_register_and_log_in_through_the_thread_pool(make_app):
+    app = make_app(PASSWORD_VERIFY_WORKERS=1, PASSWORD_VERIFY_EXECUTOR="thread")
+    try:
+        with app.app_context():
+            m.db.create_all()
+            client = app.test_client()
+            client.post("/register", data=FORM)
+            resp = client.post("/login", data={"username": "driver", "password": "secret"})
+            assert resp.location.endswith("/user")
+            m.db.session.remove()
+            m.db.engine.dispose()
+    finally:
+        passwords.shutdown()
+
+
+def test_login_upgrades_a_hash_made_with_old_settings(app, client):
+    client.post("/register", data=FORM)
+    old = m.User.query.one().password_hash
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:2000"
+    passwords.init_app(app)
+    assert passwords.needs_rehash(old)
+
+    resp = client.post("/login", data={"username": "driver", "password": "secret"})
+    assert resp.location.endswith("/user")
+    m.db.session.expire_all()
+    new = m.User.query.one().password_hash
+    assert new != old and new.startswith("pbkdf2:sha256:2000$")
+    assert not passwords.needs_rehash(new)
+
+
+def test_busy_hasher_during_rehash_still_signs_in(app, client, monkeypatch):
+    client.post("/register", data=FORM)
+    old = m.User.query.one().password_hash
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:2000"
+    passwords.init_app(app)
+    monkeypatch.setattr(passwords, "hash", busy)
+
+    resp = client.post("/login", data={"username": "driver", "password": "secret"})
+    assert resp.location.endswith("/user")
+    with client.session_transaction() as sess:
+        assert sess["auth"][0] == m.User.query.one().id
+    m.db.session.expire_all()
+    assert m.User.query.one().password_hash == old
+
+
+def test_slow_verification_raises_hasher_busy(make_app):
+    make_app(PASSWORD_VERIFY_WORKERS=1, PASSWORD_VERIFY_TIMEOUT=0.05)
+    release = threading.Event()
+    try:
+        with pytest.raises(HasherBusy):
+            passwords._run(release.wait, 5)
+    finally:
+        release.set()
+        passwords.shutdown()
@@ -0,0 +1,62 @@
+"""Exact billing arithmetic: rupee/paise conversion and stay costs."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+import models as m
+from services.billing import revenue, stay_cost, to_paise, to_rupees
+
+START = datetime(2024, 1, 1, 9)
+
+
+@pytest.mark.parametrize("amount, paise", [
+    (12.35, 1235),  # binary 12.3499999... is still 1235
+    (0.1, 10),
+    (1.005, 101),  # half up, not the float's 100.49999...
+    (2.675, 268),
+    ("19.994", 1999),
+    ("19.995", 2000),
+    (Decimal("0.015"), 2),
+    (20, 2000),
+    (0, 0),
+])
+def test_to_paise_rounds_half_up(amount, paise):
+    assert to_paise(amount) == paise
+
+
+def test_to_rupees_keeps_two_decimals():
+    assert to_rupees(1230) == Decimal("12.30")
+    assert str(to_rupees(5)) == "0.05"
+    assert to_paise(to_rupees(98765)) == 98765
+
+
+@pytest.mark.parametrize("duration, price, paise", [
+    (timedelta(hours=1), 20.0, 2000),
+    (timedelta(minutes=45), 20.0, 1500),
+    (timedelta(minutes=1), 10.0, 17),  # 16.67 -> 17
+    (timedelta(seconds=54), 1.0, 2),  # exactly 1.5 paise -> 2
+    (timedelta(seconds=54) - timedelta(microseconds=1), 1.0, 1),
+    (timedelta(days=365), 12.35, 365 * 24 * 1235),
+    (timedelta(0), 20.0, 0),
+])
+def test_stay_cost(duration, price, paise):
+    assert stay_cost(START, START + duration, price) == paise
+
+
+def test_stay_cost_of_negative_duration_is_zero():
+    assert stay_cost(START, START - timedelta(hours=1), 20.0) == 0
+
+
+def test_each_stay_is_rounded_on_its_own():
+    # Three 20-minute stays at 0.10/h are 3.33 paise each
+    parts = [stay_cost(START, START + timedelta(minutes=20), 0.1) for _ in range(3)]
+    assert parts == [3, 3, 3]
+    assert stay_cost(START, START + timedelta(hours=1), 0.1) == 10
+
+
+def test_revenue_rejects_unknown_grouping():
+    with pytest.raises(ValueError):
+        revenue(None, m.Reservation.__table__, m.ParkingSpot.__table__, by="week")
@@ -0,0 +1,57 @@
+"""Concurrent bookings never share a spot and never give a user two stays."""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+
+SPOTS, USERS, THREADS, CLICKS = 12, 30, 8, 2
+
+
+def doubled(column) -> int:
+    """Values of ``column`` shared by more than one active reservation."""
+    return (
+        m.db.session.query(column)
+        .filter(m.Reservation.left_at.is_(None))
+        .group_by(column)
+        .having(func.count(m.Reservation.id) > 1)
+        .count()
+    )
+
+
+def test_parallel_bookings_stay_consistent(app):
+    lot_id = add_lot(SPOTS).id
+    user_ids = [add_user(f"driver{i}").id for i in range(USERS)]
+    m.db.session.remove()
+
+    def book(uid: int) -> int:
+        client = app.test_client()
+        sign_in(client, uid)
+        return client.get(f"/user/book/{lot_id}").status_code
+
+    # Repeated clicks sit next to each other, so they race one another
+    clicks = [uid for uid in user_ids for _ in range(CLICKS)]
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        assert set(pool.map(book, clicks)) == {302}
+
+    bookings = m.Reservation.query.filter(m.Reservation.left_at.is_(None)).count()
+    lot = m.db.session.get(m.ParkingLot, lot_id)
+    assert doubled(m.Reservation.spot_id) == 0
+    assert doubled(m.Reservation.user_id) == 0
+    assert 0 < bookings <= SPOTS
+    assert m.ParkingSpot.query.filter_by(status="O").count() == bookings
+    assert (lot.occupied_spots, lot.available_spots) == (bookings, SPOTS - bookings)
+
+
+def test_second_booking_is_turned_away(app, client):
+    lot_id = add_lot(2).id
+    uid = add_user().id
+    sign_in(client, uid)
+    client.get(f"/user/book/{lot_id}")
+    resp = client.get(f"/user/book/{lot_id}", follow_redirects=True)
+    assert b"already have an active reservation" in resp.data
+    assert m.Reservation.query.filter_by(user_id=uid).count() == 1
+    assert m.ParkingSpot.query.filter_by(status="A").count() == 1
@@ -0,0 +1,66 @@
+"""Live availability streams: per-worker cap, bounded lifetime and their slots."""
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from conftest import add_lot, add_user, sign_in
+from services.events import events, stream
+
+
+@pytest.fixture
+def viewer(make_app):
+    """A signed-in client of an app serving at most one stream per worker."""
+    import models as m
+
+    app = make_app(EVENTS_MAX_STREAMS=1, EVENTS_STREAM_SECONDS=0.2)
+    with app.app_context():
+        m.db.create_all()
+        add_lot(2)
+        uid = add_user().id
+        client = app.test_client()
+        sign_in(client, uid)
+        yield client
+        m.db.session.remove()
+        m.db.engine.dispose()
+
+
+def test_streams_beyond_the_cap_are_turned_away(viewer):
+    first = viewer.get("/api/lots/stream", buffered=False)
+    assert first.status_code == 200
+    assert first.mimetype == "text/event-stream"
+
+    refused = viewer.get("/api/lots/stream")
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"] == "15"
+
+    # Closing the first stream frees its slot
+    first.close()
+    again = viewer.get("/api/lots/stream", buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+def test_stream_ends_after_its_lifetime(viewer):
+    started = time.monotonic()
+    body = viewer.get("/api/lots/stream").get_data(as_text=True)
+    assert time.monotonic() - started < 5
+    assert body.startswith("retry: ")
+    assert "event: snapshot" in body
+    # The slot was given back when the stream ended
+    again = viewer.get("/api/lots/stream", buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+def test_stream_relays_events_until_the_deadline():
+    sub = events.subscribe()
+    events.publish("availability", {"lot_id": 1})
+    frames = list(stream(sub, keepalive=0.05, lifetime=0.2))
+    assert frames[0] == 'event: availability\ndata: {"lot_id": 1}\n\n'
+    assert set(frames[1:]) <= {": keepalive\n\n"}
+    # Closed on the way out
+    again = events.subscribe(limit=1)
+    assert again is not None
+    again.close()
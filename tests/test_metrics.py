@@ -0,0 +1,143 @@
+"""``/metrics`` exposition and auth, and totals summed across worker processes."""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from services.metrics import DEAD_TOTALS, Metrics, compact, metrics
+
+
+def dead_pid() -> int:
+    """The pid of a process that has already exited."""
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    return child.pid
+
+
+def write_snapshot(directory, pid: int, bookings: int, latencies=()) -> None:
+    """What worker ``pid`` flushes after ``bookings`` bookings in lot 1."""
+    worker = Metrics()
+    worker.bookings.inc(bookings, lot=1)
+    for seconds in latencies:
+        worker.request_seconds.observe(seconds, method="GET", route="/user")
+    with open(os.path.join(directory, f"{pid}.json"), "w") as fh:
+        json.dump({"pid": pid, "metrics": worker._snapshot()}, fh)
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A scraping process's metrics over an empty shared directory."""
+    scraper = Metrics()
+    scraper.directory = str(tmp_path)
+    return scraper
+
+
+def totals(scraper: Metrics):
+    collected = scraper.collect()
+    return (
+        collected["parking_bookings_total"].get(("1",)),
+        collected["http_request_duration_seconds"].get(("GET", "/user")),
+    )
+
+
+def test_counters_and_histograms_are_summed_over_processes(store, tmp_path):
+    write_snapshot(tmp_path, os.getppid(), 2, [0.003, 0.2])
+    write_snapshot(tmp_path, dead_pid(), 3, [0.2, 20.0])
+
+    bookings, latency = totals(store)
+    assert bookings == 5
+    buckets, inf, total = latency[:-2], latency[-2], latency[-1]
+    assert sum(buckets) == 3 and inf == 1 and buckets[0] == 1
+    assert total == pytest.approx(20.403)
+    text = store.render()
+    assert 'parking_bookings_total{lot="1"} 5' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/user",le="0.25"} 3' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/user"} 4' in text
+
+
+def test_exited_processes_are_folded_into_the_dead_totals(store, tmp_path):
+    first, second = dead_pid(), dead_pid()
+    write_snapshot(tmp_path, first, 2, [0.1])
+    write_snapshot(tmp_path, second, 3)
+
+    assert totals(store)[0] == 5
+    assert not os.path.exists(tmp_path / f"{first}.json")
+    assert not os.path.exists(tmp_path / f"{second}.json")
+    assert os.path.exists(tmp_path / DEAD_TOTALS)
+    # Folded once: later scrapes see the same totals
+    assert totals(store)[0] == 5
+    assert totals(store)[1][-1] == pytest.approx(0.1)
+
+
+def test_child_exit_compacts_the_workers_file(tmp_path):
+    pid = dead_pid()
+    write_snapshot(tmp_path, pid, 4)
+    compact(str(tmp_path), pid)
+    compact(str(tmp_path), pid)
+    assert not os.path.exists(tmp_path / f"{pid}.json")
+    with open(tmp_path / DEAD_TOTALS) as fh:
+        dead = json.load(fh)["metrics"]
+    assert dead["parking_bookings_total"]["samples"] == [[["1"], 4]]
+
+
+def test_a_reused_pid_keeps_the_previous_holders_totals(store, tmp_path):
+    # An exited worker had our pid; its file must not be overwritten
+    write_snapshot(tmp_path, os.getpid(), 7)
+    store.bookings.inc(1, lot=1)
+    store.flush()
+    assert totals(store)[0] == 8
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{os.getpid()}.json", DEAD_TOTALS, ".lock"])
+
+
+def test_gauges_count_live_processes_only(store, tmp_path):
+    worker = Metrics()
+    worker.pool_checked_out.set(3)
+    for pid in (os.getppid(), dead_pid()):
+        with open(tmp_path / f"{pid}.json", "w") as fh:
+            json.dump({"pid": pid, "metrics": worker._snapshot()}, fh)
+    store.pool_checked_out.set(1)
+    assert store.collect()["db_pool_checked_out"][()] == 4
+
+
+@pytest.fixture
+def metered(make_app):
+    def make(**overrides):
+        app = make_app(METRICS_ENABLED=True, **overrides)
+        with app.app_context():
+            from models import db
+
+            db.create_all()
+        metrics.reset()
+        return app
+
+    yield make
+    metrics.reset()
+
+
+def test_scrape_exposes_requests_and_lot_gauges(metered):
+    client = metered().test_client()
+    client.get("/")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/plain"
+    text = resp.get_data(as_text=True)
+    assert "# TYPE http_requests_total counter" in text
+    assert 'http_requests_total{method="GET",route="/",status="200"} 1' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/"} 1' in text
+    assert "# TYPE parking_spots_available gauge" in text
+
+
+def test_scrape_needs_the_bearer_token_when_set(metered):
+    client = metered(METRICS_TOKEN="s3cret").test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    resp = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+
+
+def test_scrape_is_not_served_when_disabled(make_app):
+    assert make_app().test_client().get("/metrics").status_code == 404
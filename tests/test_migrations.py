@@ -0,0 +1,134 @@
+"""Upgrading databases created by the original app to the newest revision."""
+from __future__ import annotations
+
+import sqlalchemy as sa
+import pytest
+
+import models as m
+from app import init_db, migrator
+
+# The schema ``db.create_all()`` gave the original single-file app on SQLite
+BASELINE = [
+    """CREATE TABLE user (
+        id INTEGER NOT NULL, username VARCHAR(80) NOT NULL, password_hash VARCHAR(120) NOT NULL,
+        full_name VARCHAR(120), address VARCHAR(255), pincode VARCHAR(10), is_admin BOOLEAN,
+        PRIMARY KEY (id), UNIQUE (username))""",
+    """CREATE TABLE parking_lot (
+        id INTEGER NOT NULL, name VARCHAR(120) NOT NULL, price_per_hour FLOAT NOT NULL,
+        address VARCHAR(200) NOT NULL, pincode VARCHAR(10) NOT NULL, max_spots INTEGER NOT NULL,
+        PRIMARY KEY (id))""",
+    """CREATE TABLE parking_spot (
+        id INTEGER NOT NULL, lot_id INTEGER NOT NULL, status VARCHAR(1),
+        PRIMARY KEY (id), FOREIGN KEY(lot_id) REFERENCES parking_lot (id))""",
+    """CREATE TABLE waitlist (
+        id INTEGER NOT NULL, lot_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        created_at DATETIME, notified BOOLEAN,
+        PRIMARY KEY (id), FOREIGN KEY(lot_id) REFERENCES parking_lot (id),
+        FOREIGN KEY(user_id) REFERENCES user (id))""",
+    """CREATE TABLE reservation (
+        id INTEGER NOT NULL, spot_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+        parked_at DATETIME, left_at DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(spot_id) REFERENCES parking_spot (id),
+        FOREIGN KEY(user_id) REFERENCES user (id))""",
+    """CREATE TABLE notification (
+        id INTEGER NOT NULL, user_id INTEGER NOT NULL, lot_id INTEGER,
+        message VARCHAR(255) NOT NULL, created_at DATETIME, read BOOLEAN,
+        PRIMARY KEY (id), FOREIGN KEY(user_id) REFERENCES user (id),
+        FOREIGN KEY(lot_id) REFERENCES parking_lot (id))""",
+]
+
+SEED = [
+    "INSERT INTO user VALUES (1, 'driver', 'x', NULL, NULL, NULL, 0)",
+    "INSERT INTO parking_lot VALUES (1, 'Old Lot', 20.0, 'Old Rd', '000000', 4)",
+    "INSERT INTO parking_spot VALUES (1, 1, 'A'), (2, 1, 'O'), (3, 1, 'A'), (4, 1, 'A')",
+    "INSERT INTO reservation VALUES (1, 2, 1, '2024-01-01 08:00:00.000000', NULL)",
+    "INSERT INTO waitlist VALUES (1, 1, 1, '2024-01-01 09:00:00.000000', 0)",
+]
+
+
+def build_baseline(db_url, *extra):
+    engine = sa.create_engine(db_url)
+    with engine.begin() as connection:
+        for statement in [*BASELINE, *SEED, *extra]:
+            connection.execute(sa.text(statement))
+    engine.dispose()
+
+
+def columns(table):
+    return {c["name"] for c in sa.inspect(m.db.engine).get_columns(table)}
+
+
+def assert_at_head():
+    with m.db.engine.connect() as connection:
+        assert migrator.current(connection) == migrator.head
+    lot = m.db.session.get(m.ParkingLot, 1)
+    assert (lot.available_spots, lot.occupied_spots) == (3, 1)
+    assert {"held_spot_id", "hold_expires_at"} <= columns("waitlist")
+    assert m.Waitlist.query.filter(m.Waitlist.hold_expires_at.is_(None)).count() == 1
+    assert m.NotificationOutbox.query.count() == 0
+    assert m.LotUsageHourly.query.count() == m.LotUsageDaily.query.count() == 0
+
+
+def test_init_db_upgrades_baseline_database(db_url, make_app):
+    build_baseline(db_url)
+    with make_app().app_context():
+        init_db()
+        assert_at_head()
+        assert m.User.query.filter_by(is_admin=True).count() == 1
+        m.db.engine.dispose()
+
+
+def test_cli_upgrade_then_downgrade_to_base(db_url, make_app):
+    build_baseline(db_url)
+    app = make_app()
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["db", "upgrade"])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert_at_head()
+        m.db.session.remove()
+
+    result = runner.invoke(args=["db", "downgrade", "base"])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert "available_spots" not in columns("parking_lot")
+        assert "notification_outbox" not in sa.inspect(m.db.engine).get_table_names()
+        m.db.engine.dispose()
+
+
+def test_upgrade_keeps_columns_created_before_migrations(db_url, make_app):
+    # A database from an app version that created the counters itself
+    build_baseline(db_url, "ALTER TABLE parking_lot ADD COLUMN available_spots INTEGER NOT NULL DEFAULT 0")
+    with make_app().app_context():
+        assert migrator.migrate(m.db.engine)[0] == "0000"
+        assert_at_head()
+        m.db.session.remove()
+        m.db.engine.dispose()
+
+
+@pytest.mark.parametrize("dialect", ["sqlite", "postgresql"])
+def test_offline_script_covers_the_whole_chain(dialect):
+    engine_dialect = sa.engine.make_url(f"{dialect}://").get_dialect()()
+    script = migrator.script(engine_dialect, None)
+    assert "ADD COLUMN" in script and "hold_expires_at" in script
+    assert script.rstrip().endswith(f"VALUES ('{migrator.head}');")
+
+
+def test_rollup_revenue_is_converted_to_paise_and_back(db_url, make_app):
+    build_baseline(db_url)
+    with make_app().app_context():
+        engine = m.db.engine
+        migrator.migrate(engine, "0004")
+        with engine.begin() as connection:
+            connection.execute(sa.text(
+                "INSERT INTO lot_usage_daily VALUES (1, '2024-01-01', 2, 90.0, 12.35)"
+            ))
+        migrator.migrate(engine, "0005")
+        assert "revenue" not in columns("lot_usage_daily")
+        assert m.db.session.query(m.LotUsageDaily.revenue_paise).scalar() == 1235
+
+        migrator.migrate(engine, "0004")
+        with engine.connect() as connection:
+            assert connection.execute(sa.text("SELECT revenue FROM lot_usage_daily")).scalar() == 12.35
+        m.db.session.remove()
+        engine.dispose()
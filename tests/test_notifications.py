@@ -0,0 +1,77 @@
+"""Notification feed unread counter and bulk mark-as-read."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import models as m
+from conftest import add_user, sign_in
+
+T0 = datetime(2026, 3, 1, 9, 0)
+
+
+@pytest.fixture
+def inbox(client):
+    """``me`` with notifications at T0, T0+1h and T0+2h; ``other`` with two of their own."""
+    me, other = add_user("me").id, add_user("other").id
+    mine = [m.Notification(user_id=me, message=f"n{i}", created_at=T0 + timedelta(hours=i)) for i in range(3)]
+    theirs = [m.Notification(user_id=other, message=f"o{i}", created_at=T0) for i in range(2)]
+    m.db.session.add_all(mine + theirs)
+    m.db.session.commit()
+    sign_in(client, me)
+    return {"me": me, "other": other, "mine": [n.id for n in mine], "theirs": [n.id for n in theirs]}
+
+
+def unread(user_id: int) -> set:
+    m.db.session.expire_all()
+    return {n.id for n in m.Notification.query.filter_by(user_id=user_id, read=False)}
+
+
+def test_feed_reports_the_unread_count(client, inbox):
+    body = client.get("/api/notifications").get_json()
+    assert body["unread"] == 3
+    assert [n["id"] for n in body["notifications"]] == inbox["mine"][::-1]
+
+
+def test_mark_read_by_ids(client, inbox):
+    resp = client.post("/api/notifications/read", json={"ids": inbox["mine"][:2]})
+    assert resp.get_json() == {"updated": 2, "unread": 1}
+    assert unread(inbox["me"]) == {inbox["mine"][2]}
+    assert client.get("/api/notifications").get_json()["unread"] == 1
+    # Already read: nothing left to flip
+    resp = client.post("/api/notifications/read", json={"ids": inbox["mine"][:2]})
+    assert resp.get_json() == {"updated": 0, "unread": 1}
+
+
+def test_mark_read_before_a_timestamp(client, inbox):
+    before = (T0 + timedelta(hours=1)).isoformat()
+    resp = client.post("/api/notifications/read", json={"before": before})
+    assert resp.get_json() == {"updated": 2, "unread": 1}
+    assert unread(inbox["me"]) == {inbox["mine"][2]}
+
+
+def test_timezone_aware_before_is_compared_in_utc(client, inbox):
+    # 14:30 in UTC+5:30 is 09:00 UTC: only the first notification
+    resp = client.post("/api/notifications/read", json={"before": "2026-03-01T14:30:00+05:30"})
+    assert resp.get_json()["updated"] == 1
+
+
+def test_only_the_callers_rows_flip(client, inbox):
+    resp = client.post("/api/notifications/read", json={"ids": inbox["theirs"] + inbox["mine"][:1]})
+    assert resp.get_json()["updated"] == 1
+    client.post("/api/notifications/read", json={"before": (T0 + timedelta(days=1)).isoformat()})
+    assert unread(inbox["me"]) == set()
+    assert unread(inbox["other"]) == set(inbox["theirs"])
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {"ids": "1,2"},
+    {"ids": [1, "2"]},
+    {"ids": list(range(501))},
+    {"before": "yesterday"},
+])
+def test_bad_requests_change_nothing(client, inbox, payload):
+    assert client.post("/api/notifications/read", json=payload).status_code == 400
+    assert unread(inbox["me"]) == set(inbox["mine"])
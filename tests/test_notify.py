@@ -0,0 +1,95 @@
+"""Outbox dispatch: inline delivery after commit, backoff on failure, the attempt cap."""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+from controllers.user import notifier
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(NOTIFY_MODE="inline", NOTIFY_MAX_ATTEMPTS=3)
+    with app.app_context():
+        m.db.create_all()
+        yield app
+        m.db.session.remove()
+        m.db.engine.dispose()
+
+
+def enqueue(user_id: int, message: str = "hello") -> int:
+    row = m.NotificationOutbox(user_id=user_id, message=message)
+    m.db.session.add(row)
+    m.db.session.commit()
+    return row.id
+
+
+def test_inline_mode_delivers_after_the_request_commits(client):
+    lot_id = add_lot(1).id
+    parker, waiter = add_user("parker").id, add_user("waiter").id
+    sign_in(client, parker)
+    client.get(f"/user/book/{lot_id}")
+    sign_in(client, waiter)
+    client.get(f"/user/waitlist/{lot_id}")
+    reservation = m.Reservation.query.filter_by(user_id=parker).one()
+    sign_in(client, parker)
+    client.get(f"/user/release/{reservation.id}")
+
+    m.db.session.expire_all()
+    assert m.NotificationOutbox.query.count() == 0
+    delivered = m.Notification.query.filter_by(user_id=waiter).one()
+    assert delivered.lot_id == lot_id and not delivered.read
+
+
+def test_a_crashed_dispatchers_lease_runs_out_before_redelivery(app):
+    uid = add_user().id
+    row_id = enqueue(uid)
+    now = datetime.utcnow() + timedelta(seconds=1)
+    # What a dispatcher that claimed the row and died leaves behind
+    m.NotificationOutbox.query.filter_by(id=row_id).update(
+        {"claim_token": "dead", "attempts": 1, "available_at": now + timedelta(seconds=notifier.lease_seconds)}
+    )
+    m.db.session.commit()
+
+    assert notifier.drain_once(now) == 0
+    assert notifier.drain_once(now + timedelta(seconds=notifier.lease_seconds)) == 1
+    assert m.NotificationOutbox.query.count() == 0
+    assert m.Notification.query.filter_by(user_id=uid).count() == 1
+
+
+def test_failed_batch_is_rescheduled_with_its_error(app):
+    uid = add_user().id
+    row_id = enqueue(uid)
+    m.Notification.__table__.drop(m.db.engine)
+    now = datetime.utcnow() + timedelta(seconds=1)
+
+    assert notifier.drain_once(now) == 0
+    row = m.db.session.get(m.NotificationOutbox, row_id)
+    m.db.session.refresh(row)
+    assert row.attempts == 1 and row.claim_token is None
+    assert row.available_at == now + timedelta(seconds=2)
+    assert "notification" in row.last_error
+    # Not due again until the backoff runs out
+    assert notifier.drain_once(now + timedelta(seconds=1)) == 0
+    assert m.db.session.get(m.NotificationOutbox, row_id).attempts == 1
+
+
+def test_rows_at_the_attempt_cap_are_logged_and_kept(app, caplog):
+    uid = add_user().id
+    row_id = enqueue(uid)
+    m.Notification.__table__.drop(m.db.engine)
+    now = datetime.utcnow() + timedelta(seconds=1)
+
+    with caplog.at_level(logging.WARNING, logger="services.notify"):
+        for _ in range(4):
+            notifier.drain_once(now)
+            now += timedelta(minutes=10)
+    row = m.db.session.get(m.NotificationOutbox, row_id)
+    m.db.session.refresh(row)
+    assert row.attempts == 3 and row.claim_token is None and row.last_error
+    errors = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert len(errors) == 1 and str(row_id) in errors[0].getMessage()
@@ -0,0 +1,80 @@
+"""Keyset cursors: round trips, ties on the timestamp and tampered cursors."""
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user
+from services.pagination import decode_cursor, encode_cursor, keyset_page
+
+TS = datetime(2024, 1, 1, 9, 30, 15, 250)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(TS, 42)) == (TS, 42)
+    assert decode_cursor(encode_cursor(datetime(2024, 1, 1), 1)) == (datetime(2024, 1, 1), 1)
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(TS, 10**12)
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+
+
+@pytest.mark.parametrize("cursor", [
+    None,
+    "",
+    "not base64 at all!",
+    encode_cursor(TS, 42)[:-3],  # truncated
+    base64.urlsafe_b64encode(b"2024-01-01T09:30|x").decode(),  # id is not a number
+    base64.urlsafe_b64encode(b"yesterday|42").decode(),  # not a timestamp
+    base64.urlsafe_b64encode(b"2024-01-01T09:30").decode(),  # no id
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),  # not UTF-8
+])
+def test_tampered_cursor_is_ignored(cursor):
+    assert decode_cursor(cursor) is None
+
+
+@pytest.fixture
+def history(app):
+    """A driver's ten stays; ids 3-7 all parked at the same instant."""
+    lot = add_lot(1)
+    uid = add_user().id
+    times = [datetime(2024, 1, d) for d in (1, 2)] + [TS] * 5 + [datetime(2024, 1, d) for d in (3, 4, 5)]
+    m.db.session.add_all(m.Reservation(spot_id=lot.spots[0].id, user_id=uid, parked_at=ts, left_at=ts)
+                         for ts in times)
+    m.db.session.commit()
+    return m.Reservation.query.filter_by(user_id=uid)
+
+
+def pages(query, size: int, cursor=None):
+    R = m.Reservation
+    while True:
+        rows, cursor = keyset_page(query, R.parked_at, R.id, cursor, size)
+        yield [row.id for row in rows]
+        if cursor is None:
+            return
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 10, 11])
+def test_pages_with_tied_timestamps_cover_every_row_once(history, size):
+    expected = [r.id for r in history.order_by(m.Reservation.parked_at.desc(), m.Reservation.id.desc())]
+    walked = [row_id for page in pages(history, size) for row_id in page]
+    assert walked == expected
+    assert len(walked) == 10
+
+
+def test_cursor_between_tied_rows_resumes_after_the_right_one(history):
+    rows, cursor = keyset_page(history, m.Reservation.parked_at, m.Reservation.id, None, 5)
+    # January 5, 4, 3 and 2, then the first of the five ties
+    assert [r.id for r in rows] == [10, 9, 8, 2, 7]
+    assert decode_cursor(cursor) == (TS, 7)
+    rows, _ = keyset_page(history, m.Reservation.parked_at, m.Reservation.id, cursor, 5)
+    assert [r.id for r in rows] == [6, 5, 4, 3, 1]
+
+
+def test_tampered_cursor_restarts_from_the_newest_row(history):
+    rows, _ = keyset_page(history, m.Reservation.parked_at, m.Reservation.id, "garbage!", 3)
+    assert [r.id for r in rows] == [10, 9, 8]
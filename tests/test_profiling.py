@@ -0,0 +1,78 @@
+"""Request and SQL instrumentation: Server-Timing, per-route totals, N+1 warnings, profiles."""
+from __future__ import annotations
+
+import logging
+import os
+import pstats
+from types import SimpleNamespace
+
+import pytest
+from flask import request
+from sqlalchemy import text
+
+import models as m
+from services.profiling import instrumentation
+
+
+@pytest.fixture
+def instrumented(make_app, tmp_path):
+    """An instrumented app with a route that runs ``SELECT 1`` ``?n=`` times."""
+
+    def make(**overrides):
+        app = make_app(INSTRUMENT=True, INSTRUMENT_PROFILE_DIR=str(tmp_path / "profiles"), **overrides)
+
+        @app.route("/_selects")
+        def selects():
+            for _ in range(request.args.get("n", 1, type=int)):
+                m.db.session.execute(text("SELECT 1"))
+            return "ok"
+
+        return app.test_client()
+
+    instrumentation.reset()
+    yield make
+    instrumentation.reset()
+    instrumentation.enabled = False
+
+
+def test_server_timing_reports_app_and_db_time(instrumented):
+    resp = instrumented().get("/_selects?n=3")
+    timing = resp.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    assert 'db;dur=' in timing and 'desc="3 queries"' in timing
+
+
+def test_per_route_query_counts_and_db_time(instrumented):
+    client = instrumented()
+    client.get("/_selects?n=2")
+    client.get("/_selects?n=4")
+    route = instrumentation.stats()["routes"]["GET /_selects"]
+    assert route["requests"] == 2
+    assert route["queries"] == 6 and route["mean_queries"] == 3
+    assert route["mean_db_ms"] >= 0 and route["max_wall_ms"] >= route["mean_wall_ms"]
+    assert route["n_plus_one"] == 0
+
+
+def test_repeated_statement_is_flagged_as_n_plus_one(instrumented, caplog):
+    client = instrumented(INSTRUMENT_N_PLUS_ONE=3)
+    with caplog.at_level(logging.WARNING):
+        client.get("/_selects?n=2")
+        assert not [r for r in caplog.records if "Possible N+1" in r.getMessage()]
+        client.get("/_selects?n=3")
+    warnings = [r.getMessage() for r in caplog.records if "Possible N+1" in r.getMessage()]
+    assert warnings == ["Possible N+1 in GET /_selects: 3 x SELECT 1"]
+    assert instrumentation.stats()["routes"]["GET /_selects"]["n_plus_one"] == 1
+
+
+def test_sampled_request_leaves_a_profile(instrumented, tmp_path):
+    instrumented(INSTRUMENT_PROFILE_RATE=1).get("/_selects")
+    files = os.listdir(tmp_path / "profiles")
+    assert len(files) == 1 and files[0].endswith("GET_selects.prof")
+    assert pstats.Stats(str(tmp_path / "profiles" / files[0])).total_calls > 0
+
+
+def test_statement_started_without_the_listener_is_ignored(instrumented):
+    instrumented()
+    conn = SimpleNamespace(info={})
+    instrumentation._after_cursor_execute(conn, None, "SELECT 1", (), None, False)
+    assert conn.info == {}
@@ -0,0 +1,75 @@
+"""Per-endpoint SQL query budgets for the dashboard and history views.
+
+Each page is rendered for a user with a short and a long reservation
+history; it fails if a page exceeds its budget or if its query count grows
+with the number of rows rendered (the signature of an N+1 regression).
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+from services.cache import cache
+from services.querycount import assert_max_queries
+
+# endpoint -> maximum statements per request
+BUDGETS = {
+    "/user": 5,
+    "/admin": 4,
+    "/admin/users": 2,
+    "/admin/users/{uid}/history": 2,
+}
+
+
+def add_stays(user_id: int, count: int, start: datetime) -> None:
+    """``count`` finished 45-minute stays, one an hour from ``start``."""
+    m.db.session.execute(
+        m.Reservation.__table__.insert(),
+        [
+            {
+                "spot_id": i % 30 + 1,
+                "user_id": user_id,
+                "parked_at": start + timedelta(hours=i),
+                "left_at": start + timedelta(hours=i, minutes=45),
+            }
+            for i in range(count)
+        ],
+    )
+    m.db.session.commit()
+
+
+@pytest.fixture
+def users(app):
+    """Ids of an admin and of a driver with five finished stays, in three lots."""
+    admin, user = add_user("admin", is_admin=True), add_user("driver")
+    for i in range(3):
+        add_lot(10, name=f"Lot {i}")
+    add_stays(user.id, 5, datetime(2024, 1, 1))
+    return {"admin": admin.id, "driver": user.id}
+
+
+def queries(client, users, endpoint: str) -> int:
+    as_admin = endpoint.startswith("/admin")
+    sign_in(client, users["admin" if as_admin else "driver"], as_admin)
+    url = endpoint.format(uid=users["driver"])
+    # Budgets cover the cold path, not a cache hit
+    cache.clear()
+    with assert_max_queries(m.db.engine, BUDGETS[endpoint], url) as counter:
+        resp = client.get(url)
+    assert resp.status_code == 200, (url, resp.status_code)
+    return len(counter)
+
+
+@pytest.mark.parametrize("endpoint", BUDGETS)
+def test_within_budget(client, users, endpoint):
+    queries(client, users, endpoint)
+
+
+@pytest.mark.parametrize("endpoint", BUDGETS)
+def test_queries_do_not_grow_with_rows(client, users, endpoint):
+    short = queries(client, users, endpoint)
+    add_stays(users["driver"], 495, datetime(2023, 1, 1))
+    assert queries(client, users, endpoint) == short
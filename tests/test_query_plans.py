@@ -0,0 +1,203 @@
+"""EXPLAIN the hot-path queries and assert each one uses its index.
+
+A database is seeded with a long, mostly finished reservation history, its
+migrations are run down to the base revision and back up to head (so the
+indexes checked are the ones the migrations create), planner statistics
+are gathered and the planner is asked how it would run the queries behind
+booking, the dashboards, revenue, the waitlist and the notification
+outbox. Set ``PLANS_DATABASE_URL`` to check against a scratch database, e.g.
+``postgresql://localhost/parking_plans``; its tables are dropped and
+reseeded. Sequential scans are disabled
+there, as the seed is small enough that a scan would otherwise be cheaper
+than any index.
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+import models as m
+from app import create_app, migrator
+from conftest import TEST_CONFIG
+
+LOTS, SPOTS_PER_LOT, USERS, HISTORY_PER_USER = 20, 50, 200, 100
+NOW = datetime(2024, 1, 1, 3)
+
+db, R, W, O = m.db, m.Reservation, m.Waitlist, m.NotificationOutbox
+
+
+class Explain(Executable, ClauseElement):
+    """``EXPLAIN`` (``EXPLAIN QUERY PLAN`` on SQLite) of a statement."""
+
+    inherit_cache = False
+
+    def __init__(self, statement) -> None:
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    prefix = "EXPLAIN QUERY PLAN " if compiler.dialect.name == "sqlite" else "EXPLAIN "
+    return prefix + compiler.process(element.statement, **kw)
+
+
+def seed() -> None:
+    db.session.execute(m.User.__table__.insert(), [
+        {"id": i, "username": f"driver{i}", "password_hash": "x"} for i in range(1, USERS + 1)
+    ])
+    db.session.execute(m.ParkingLot.__table__.insert(), [
+        {
+            "id": i, "name": f"Lot {i}", "address": "Plan Rd", "pincode": "000000", "price_per_hour": 20.0,
+            "max_spots": SPOTS_PER_LOT, "available_spots": SPOTS_PER_LOT, "occupied_spots": 0,
+        }
+        for i in range(1, LOTS + 1)
+    ])
+    spots = LOTS * SPOTS_PER_LOT
+    db.session.execute(m.ParkingSpot.__table__.insert(), [
+        {"id": i, "lot_id": (i - 1) // SPOTS_PER_LOT + 1, "status": "A"} for i in range(1, spots + 1)
+    ])
+    start = datetime(2024, 1, 1)
+    # Every user has a long finished history; one in ten is parked right now,
+    # each in a spot of their own
+    db.session.execute(m.Reservation.__table__.insert(), [
+        {
+            "spot_id": u if active else (u * HISTORY_PER_USER + h) % spots + 1,
+            "user_id": u,
+            "parked_at": start + timedelta(hours=h),
+            "left_at": None if active else start + timedelta(hours=h, minutes=40),
+        }
+        for u in range(1, USERS + 1)
+        for h in range(HISTORY_PER_USER)
+        for active in [u % 10 == 0 and h == HISTORY_PER_USER - 1]
+    ])
+    db.session.execute(m.Waitlist.__table__.insert(), [
+        {
+            "lot_id": u % LOTS + 1, "user_id": u, "notified": u % 7 == 0, "created_at": start,
+            "held_spot_id": u if u % 7 == 0 else None,
+            "hold_expires_at": start + timedelta(minutes=u) if u % 7 == 0 else None,
+        }
+        for u in range(1, USERS + 1)
+    ])
+    db.session.execute(m.Notification.__table__.insert(), [
+        {"user_id": u, "lot_id": 1, "message": "Spot free", "read": n > 2, "created_at": start + timedelta(minutes=n)}
+        for u in range(1, USERS + 1)
+        for n in range(20)
+    ])
+    db.session.execute(m.NotificationOutbox.__table__.insert(), [
+        {"user_id": u, "lot_id": 1, "message": "Spot free", "created_at": start, "available_at": start,
+         "attempts": 0, "claim_token": f"{u:032x}" if u % 2 else None}
+        for u in range(1, USERS + 1)
+    ])
+    db.session.commit()
+
+
+def _reservations_with_lot():
+    from controllers.api import reservations_with_lot
+
+    return reservations_with_lot()
+
+
+def _spot_lots():
+    return db.session.query(m.ParkingSpot.lot_id).join(m.ParkingSpot, R.spot_id == m.ParkingSpot.id)
+
+
+# name -> (expected index, statement built inside the app context)
+CHECKS = {
+    "free spots of a lot": (
+        "ix_parking_spot_lot_status",
+        lambda: db.session.query(m.ParkingSpot.id).filter_by(lot_id=3, status="A").statement,
+    ),
+    "active reservation of a user": (
+        "uq_reservation_active_user",
+        lambda: _reservations_with_lot().filter_by(user_id=10, left_at=None).limit(1).statement,
+    ),
+    "history page of a user": (
+        "ix_reservation_user_parked",
+        lambda: _reservations_with_lot().filter_by(user_id=10)
+        .order_by(R.parked_at.desc(), R.id.desc()).limit(20).statement,
+    ),
+    "active reservations per lot": (
+        "uq_reservation_active_spot",
+        lambda: _spot_lots().add_columns(db.func.count(R.id))
+        .filter(R.left_at.is_(None)).group_by(m.ParkingSpot.lot_id).statement,
+    ),
+    "revenue per lot over a range": (
+        "ix_reservation_billed",
+        lambda: _spot_lots().add_columns(db.func.sum(R.cost_paise))
+        .filter(R.left_at >= NOW - timedelta(days=7), R.left_at < NOW)
+        .group_by(m.ParkingSpot.lot_id).statement,
+    ),
+    "reservations of a deleted lot": (
+        "ix_reservation_spot",
+        lambda: db.delete(R).where(
+            R.spot_id.in_(db.select(m.ParkingSpot.id).where(m.ParkingSpot.lot_id == 3))
+        ),
+    ),
+    "waitlist head of a lot": (
+        "ix_waitlist_lot_queue",
+        lambda: db.session.query(W.id, W.user_id).filter_by(lot_id=3, notified=False)
+        .order_by(W.created_at, W.id).limit(1).statement,
+    ),
+    "waitlist entries of a user": (
+        "ix_waitlist_user",
+        lambda: db.session.query(W.id).filter(W.lot_id == 3, W.user_id == 10).statement,
+    ),
+    "expired waitlist holds": (
+        "ix_waitlist_hold_expires",
+        lambda: db.session.query(W.id).filter(W.held_spot_id.isnot(None), W.hold_expires_at <= NOW)
+        .order_by(W.hold_expires_at).limit(500).statement,
+    ),
+    "unread notifications of a user": (
+        "ix_notification_user_read",
+        lambda: db.session.query(db.func.count(m.Notification.id))
+        .filter_by(user_id=10, read=False).statement,
+    ),
+    "due outbox rows": (
+        "ix_notification_outbox_due",
+        lambda: db.select(O.id).where(O.available_at <= NOW).order_by(O.available_at, O.id).limit(100),
+    ),
+    "outbox rows of a claim": (
+        "ix_notification_outbox_claim",
+        lambda: db.session.query(O.user_id, O.message).filter_by(claim_token="0" * 31 + "1").statement,
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def explain(tmp_path_factory):
+    """Planner output for a statement, on the seeded, migrated database."""
+    url = os.getenv("PLANS_DATABASE_URL") or f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    app = create_app({**TEST_CONFIG, "SQLALCHEMY_DATABASE_URI": url})
+    with app.app_context():
+        m.db.drop_all()
+        m.db.create_all()
+        seed()
+        engine = m.db.engine
+        # Indexes as the migrations build them, not as create_all() did
+        migrator.stamp(engine, "head")
+        migrator.migrate(engine, "0000")
+        migrator.migrate(engine, "head")
+        with engine.connect() as connection:
+            connection.exec_driver_sql("ANALYZE")
+            if engine.dialect.name == "postgresql":
+                connection.exec_driver_sql("SET enable_seqscan = off")
+
+            def plan(statement) -> str:
+                return " | ".join(str(row[-1]) for row in connection.execute(Explain(statement), {}))
+
+            yield plan
+            connection.rollback()
+        m.db.session.remove()
+        m.db.drop_all()
+        m.db.engine.dispose()
+
+
+@pytest.mark.parametrize("name", CHECKS)
+def test_query_uses_index(explain, name):
+    index, build = CHECKS[name]
+    plan = explain(build())
+    assert index in plan, f"{name}: expected {index}, planned {plan}"
@@ -0,0 +1,74 @@
+"""Splitting stays into hourly and daily rollup buckets."""
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+from services.rollups import split_stay
+
+
+def paise(buckets) -> int:
+    return sum(revenue for _, _, revenue in buckets.values())
+
+
+def test_stay_inside_one_hour():
+    parked = datetime(2024, 1, 1, 9, 10)
+    buckets = split_stay(parked, parked + timedelta(minutes=30), 1000, "hour")
+    assert buckets == {datetime(2024, 1, 1, 9): [1, 30.0, 1000]}
+
+
+def test_stay_across_hours_is_split_by_time_in_each():
+    buckets = split_stay(datetime(2024, 1, 1, 9, 45), datetime(2024, 1, 1, 11, 15), 900, "hour")
+    assert list(buckets) == [datetime(2024, 1, 1, h) for h in (9, 10, 11)]
+    assert [b[0] for b in buckets.values()] == [1, 0, 0]  # booked once, where it started
+    assert [b[1] for b in buckets.values()] == [15.0, 60.0, 15.0]
+    assert [b[2] for b in buckets.values()] == [150, 600, 150]
+
+
+def test_stay_ending_on_an_hour_boundary_does_not_open_the_next_bucket():
+    buckets = split_stay(datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 11), 200, "hour")
+    assert list(buckets) == [datetime(2024, 1, 1, 9), datetime(2024, 1, 1, 10)]
+
+
+def test_stay_across_midnight_by_day():
+    buckets = split_stay(datetime(2024, 1, 31, 18), datetime(2024, 2, 1, 6), 1200, "day")
+    assert buckets == {date(2024, 1, 31): [1, 360.0, 600], date(2024, 2, 1): [0, 360.0, 600]}
+
+
+def test_zero_length_stay_is_still_one_booking():
+    parked = datetime(2024, 1, 1, 9, 30)
+    assert split_stay(parked, parked, 0, "hour") == {datetime(2024, 1, 1, 9): [1, 0.0, 0]}
+
+
+@pytest.mark.parametrize("unit", ["hour", "day"])
+@pytest.mark.parametrize("cost", [0, 1, 7, 1001, 123457])
+def test_buckets_add_up_to_the_billed_cost(unit, cost):
+    parked = datetime(2024, 1, 1, 23, 7, 13)
+    buckets = split_stay(parked, parked + timedelta(days=2, minutes=19), cost, unit)
+    assert paise(buckets) == cost
+    assert all(isinstance(b[2], int) for b in buckets.values())
+    assert sum(b[1] for b in buckets.values()) == pytest.approx(2 * 24 * 60 + 19)
+    # Rounded down to the end of each bucket: no bucket is ever negative
+    assert all(b[2] >= 0 for b in buckets.values())
+
+
+def test_release_folds_the_billed_paise_into_the_rollups(client):
+    lot_id = add_lot(1, price=12.35).id
+    uid = add_user().id
+    sign_in(client, uid)
+    client.get(f"/user/book/{lot_id}")
+    stay = m.Reservation.query.filter_by(user_id=uid).one()
+    stay.parked_at -= timedelta(hours=2, minutes=30)
+    m.db.session.commit()
+    client.get(f"/user/release/{stay.id}")
+    m.db.session.expire_all()
+
+    cost = m.db.session.get(m.Reservation, stay.id).cost_paise
+    assert cost == pytest.approx(2.5 * 1235, abs=1)
+    daily = m.db.session.query(m.db.func.sum(m.LotUsageDaily.revenue_paise)).scalar()
+    hourly = m.db.session.query(m.db.func.sum(m.LotUsageHourly.revenue_paise)).scalar()
+    assert daily == hourly == cost
+    assert client.get("/api/stats").get_json()["revenue"] == cost / 100
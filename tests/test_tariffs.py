@@ -0,0 +1,160 @@
+"""Compiled tariff schedules, and the admin form that adds their windows."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+from services.tariffs import DAY, EVERY_DAY, WEEK, Curve, Window, compile_schedule
+
+BASE = 20.0  # 2000 paise an hour
+MON, SUN = 1, 64
+WEEKDAYS = 0b0011111
+MONDAY = datetime(2024, 1, 1)  # a Monday
+
+
+def at(day: int, hh: int, mm: int = 0) -> datetime:
+    return MONDAY + timedelta(days=day, hours=hh, minutes=mm)
+
+
+def hhmm(hh: int, mm: int = 0) -> int:
+    return hh * 60 + mm
+
+
+PEAK = Window(WEEKDAYS, hhmm(8), hhmm(20), 0, 6000)
+NIGHT = Window(EVERY_DAY, hhmm(22), hhmm(6), 0, 1000)
+SURGE = Window(WEEKDAYS, hhmm(8), hhmm(20), 80, 9000)
+
+
+def test_no_windows_charges_the_base_price():
+    schedule = compile_schedule(BASE, [])
+    assert schedule.price(at(0, 9), at(0, 10)) == 2000
+    assert schedule.price(at(0, 9), at(7, 9)) == 7 * 24 * 2000
+
+
+@pytest.mark.parametrize("ts, rate", [
+    (at(0, 7, 59), 2000),
+    (at(0, 8), 6000),  # start is inclusive
+    (at(0, 19, 59), 6000),
+    (at(0, 20), 2000),  # end is exclusive
+    (at(5, 12), 2000),  # Saturday: not a weekday window
+])
+def test_band_edges(ts, rate):
+    assert compile_schedule(BASE, [PEAK]).rate_at(ts) == rate
+
+
+def test_stay_across_a_band_edge_is_split_there():
+    schedule = compile_schedule(BASE, [PEAK])
+    # 07:30-08:30: half an hour at each rate
+    assert schedule.price(at(0, 7, 30), at(0, 8, 30)) == 1000 + 3000
+
+
+def test_window_past_midnight_wraps_into_the_next_day():
+    schedule = compile_schedule(BASE, [NIGHT])
+    assert schedule.rate_at(at(0, 23)) == 1000
+    assert schedule.rate_at(at(1, 5, 59)) == 1000
+    assert schedule.rate_at(at(1, 6)) == 2000
+    assert schedule.price(at(0, 21), at(1, 7)) == 2000 + 8 * 1000 + 2000
+
+
+def test_sunday_night_wraps_into_monday_morning():
+    schedule = compile_schedule(BASE, [Window(SUN, hhmm(22), hhmm(2), 0, 500)])
+    assert schedule.rate_at(at(6, 23)) == 500
+    assert schedule.rate_at(at(7, 1, 59)) == 500  # the next Monday
+    assert schedule.rate_at(at(0, 1)) == 500  # and the first one
+    assert schedule.rate_at(at(7, 2)) == 2000
+    assert schedule.price(at(6, 21), at(7, 3)) == 2000 + 4 * 500 + 2000
+
+
+def test_whole_day_window():
+    window = Window(MON, hhmm(6), hhmm(6), 0, 100)
+    assert list(window.intervals()) == [(hhmm(6), DAY + hhmm(6))]
+
+
+def test_stays_spanning_weeks_repeat_the_week():
+    schedule = compile_schedule(BASE, [PEAK, NIGHT])
+    week = schedule.price(at(0, 0), at(7, 0))
+    assert schedule.price(at(2, 13), at(2 + 21, 13)) == 3 * week
+    assert schedule.price(at(3, 9), at(3, 9)) == 0
+
+
+@pytest.mark.parametrize("occupancy, rate", [(None, 6000), (0, 6000), (79, 6000), (80, 9000), (100, 9000)])
+def test_occupancy_surcharge_tiers(occupancy, rate):
+    schedule = compile_schedule(BASE, [PEAK, SURGE])
+    assert schedule.rate_at(at(1, 12), occupancy) == rate
+    # Outside the surge window every tier pays what the lower tiers pay
+    assert schedule.rate_at(at(1, 21), occupancy) == 2000
+
+
+def test_higher_tier_wins_over_a_newer_lower_one():
+    schedule = compile_schedule(BASE, [SURGE, PEAK])
+    assert schedule.rate_at(at(1, 12), 90) == 9000
+    assert schedule.rate_at(at(1, 12), 10) == 6000
+
+
+def test_newer_window_wins_within_a_tier():
+    lunch = Window(WEEKDAYS, hhmm(12), hhmm(14), 0, 4000)
+    schedule = compile_schedule(BASE, [PEAK, lunch])
+    assert schedule.rate_at(at(0, 13)) == 4000
+    assert compile_schedule(BASE, [lunch, PEAK]).rate_at(at(0, 13)) == 6000
+
+
+def test_utc_offset_shifts_the_local_day():
+    # 330 minutes ahead: 02:30 UTC is 08:00 local
+    schedule = compile_schedule(BASE, [PEAK], utc_offset=330)
+    assert schedule.rate_at(at(0, 2, 29)) == 2000
+    assert schedule.rate_at(at(0, 2, 30)) == 6000
+
+
+def test_curve_cost_rounds_half_up_once():
+    curve = Curve([3] * WEEK)  # 3 paise an hour
+    half_hour = 30 * 60 * 10**6
+    assert curve.cost(0, half_hour) == 2  # 1.5 -> 2
+    assert curve.cost(0, half_hour - 1) == 1
+    assert curve.cost(half_hour, 0) == 0
+
+
+VALID = {"days": ["0", "4"], "start": "08:00", "end": "20:30", "min_occupancy": "50", "price_per_hour": "45.50"}
+
+
+@pytest.fixture
+def admin_client(client):
+    add_lot(1)
+    admin = add_user("admin", is_admin=True)
+    sign_in(client, admin.id, is_admin=True)
+    return client
+
+
+def test_admin_adds_a_tariff(admin_client):
+    resp = admin_client.post("/admin/lots/1/tariffs", data=VALID, follow_redirects=True)
+    assert b"Tariff added." in resp.data
+    tariff = m.Tariff.query.one()
+    assert (tariff.days, tariff.start_minute, tariff.end_minute) == (0b10001, 480, 1230)
+    assert (tariff.min_occupancy, tariff.price_paise) == (50, 4550)
+    assert m.db.session.get(m.ParkingLot, 1).tariff_version == 1
+
+
+@pytest.mark.parametrize("field, value", [
+    ("days", ["7"]),
+    ("days", ["-1"]),
+    ("days", ["mon"]),
+    ("days", []),
+    ("start", "12:75"),
+    ("start", "24:00"),
+    ("start", "25:00"),
+    ("start", "8"),
+    ("end", "08:5"),
+    ("end", ""),
+    ("min_occupancy", "101"),
+    ("min_occupancy", "half"),
+    ("price_per_hour", "-1"),
+    ("price_per_hour", "inf"),
+    ("price_per_hour", "free"),
+])
+def test_invalid_tariff_is_not_saved(admin_client, field, value):
+    resp = admin_client.post("/admin/lots/1/tariffs", data={**VALID, field: value}, follow_redirects=True)
+    assert b"Cannot add tariff" in resp.data
+    assert m.Tariff.query.count() == 0
+    assert m.db.session.get(m.ParkingLot, 1).tariff_version == 0
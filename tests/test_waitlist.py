@@ -0,0 +1,106 @@
+"""Waitlist holds: claimed by the waiter, cascaded on expiry, passed on when booking elsewhere."""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import models as m
+from conftest import add_lot, add_user, sign_in
+from controllers.user import waitlist_queue
+
+
+def as_user(client, uid: int):
+    sign_in(client, uid)
+    return client
+
+
+def spot_status(spot_id: int) -> str:
+    return m.db.session.get(m.ParkingSpot, spot_id).status
+
+
+def counters(lot_id: int):
+    lot = m.db.session.get(m.ParkingLot, lot_id)
+    m.db.session.refresh(lot)
+    return lot.occupied_spots, lot.available_spots
+
+
+def waiter(uid: int):
+    return m.Waitlist.query.filter_by(user_id=uid).one_or_none()
+
+
+@pytest.fixture
+def held(app, client):
+    """A one-spot lot whose spot was just released with two users waiting.
+
+    The spot is held for ``first``, who queued before ``second``.
+    """
+    lot_id = add_lot(1).id
+    parker, first, second = (add_user(name).id for name in ("parker", "first", "second"))
+    as_user(client, parker).get(f"/user/book/{lot_id}")
+    as_user(client, first).get(f"/user/waitlist/{lot_id}")
+    as_user(client, second).get(f"/user/waitlist/{lot_id}")
+    reservation = m.Reservation.query.filter_by(user_id=parker).one()
+    as_user(client, parker).get(f"/user/release/{reservation.id}")
+    m.db.session.expire_all()
+    return {"lot": lot_id, "spot": reservation.spot_id, "first": first, "second": second}
+
+
+def test_release_holds_the_spot_for_the_head_of_the_queue(held):
+    assert spot_status(held["spot"]) == "H"
+    assert waiter(held["first"]).held_spot_id == held["spot"]
+    assert waiter(held["second"]).held_spot_id is None
+    assert counters(held["lot"]) == (1, 0)
+    assert m.NotificationOutbox.query.filter_by(user_id=held["first"]).count() == 1
+
+
+def test_hold_then_claim(held, client):
+    as_user(client, held["first"]).get(f"/user/book/{held['lot']}")
+    m.db.session.expire_all()
+    stay = m.Reservation.query.filter_by(user_id=held["first"], left_at=None).one()
+    assert stay.spot_id == held["spot"]
+    assert spot_status(held["spot"]) == "O"
+    assert waiter(held["first"]) is None
+    # The held spot already counted as occupied
+    assert counters(held["lot"]) == (1, 0)
+
+
+def test_hold_expires_and_cascades_to_the_next_waiter(held, client):
+    later = datetime.utcnow() + timedelta(days=1)
+    assert waitlist_queue.expire(later) == []
+    m.db.session.commit()
+    assert waiter(held["first"]) is None
+    assert waiter(held["second"]).held_spot_id == held["spot"]
+    assert spot_status(held["spot"]) == "H"
+
+    # The lapsed waiter cannot take the spot held for the next one
+    resp = as_user(client, held["first"]).get(f"/user/book/{held['lot']}", follow_redirects=True)
+    assert b"No available spots" in resp.data
+
+    # The last hold lapses with nobody left: the spot is free again
+    assert waitlist_queue.expire(later + timedelta(days=1)) == [(held["lot"], held["spot"])]
+    m.db.session.commit()
+    assert waiter(held["second"]) is None
+    assert spot_status(held["spot"]) == "A"
+    assert counters(held["lot"]) == (0, 1)
+
+
+def test_booking_elsewhere_passes_the_hold_on(held, client):
+    other = add_lot(1, name="Other").id
+    as_user(client, held["first"]).get(f"/user/book/{other}")
+    m.db.session.expire_all()
+    assert m.Reservation.query.filter_by(user_id=held["first"], left_at=None).one().spot.lot_id == other
+    assert waiter(held["first"]) is None
+    assert waiter(held["second"]).held_spot_id == held["spot"]
+    assert spot_status(held["spot"]) == "H"
+    assert counters(held["lot"]) == (1, 0)
+
+
+def test_booking_elsewhere_leaves_other_queues(app, client):
+    full, free = add_lot(0, name="Full").id, add_lot(1, name="Free").id
+    uid = add_user().id
+    as_user(client, uid).get(f"/user/waitlist/{full}")
+    assert waiter(uid) is not None
+    client.get(f"/user/book/{free}")
+    m.db.session.expire_all()
+    assert waiter(uid) is None